@@ -0,0 +1,279 @@
+#! /usr/bin/env python3
+# -*- coding: utf-8 -*-
+#
+# SPDX-License-Identifier: BSD-2-Clause
+
+"""
+Time the dependency diagram engine on synthetic frameworks
+
+For each size given with --sizes, dot and yaml files like the ones written by
+kapidox-depdiagram-prepare are generated for that many frameworks, with
+--targets CMake targets each, depending on Qt, on external libraries and on
+the targets of other frameworks. Then each operation of kapidox.depdiagram is
+timed on them:
+
+- preprocess: preprocess() of every dot file;
+- populate: FrameworkDb.populate(), without the cache;
+- filter: FrameworkDb.filtered() for every framework;
+- tier order: FrameworkCmp.sort() of every tier, like DotWriter.write();
+- write, write detailed, write simplified: DotWriter.write() of all the
+  frameworks, with --detailed, and with --simplify;
+- generate per framework: generate() of the simplified diagram of every
+  framework, like kapidox-generate does.
+
+The growth exponent between two sizes is log(t2 / t1) / log(n2 / n1): 1 for
+linear code, 2 for quadratic code. Parsing is expected to grow linearly. The
+other operations need the frameworks each framework depends on, directly or
+not; since frameworks of higher tiers depend on most frameworks of lower
+tiers, these sets grow with the number of frameworks, and the operations are
+expected to grow quadratically. An exponent above the expected one by more
+than --tolerance is reported, and makes the script exit with status 1 if
+--check is set.
+
+The results are printed as JSON, or written to the file given by --output.
+"""
+
+import argparse
+import io
+import itertools
+import json
+import logging
+import math
+import os
+import random
+import shutil
+import sys
+import tempfile
+import timeit
+
+BENCHMARK_DIR = os.path.dirname(os.path.abspath(__file__))
+sys.path.insert(0, os.path.dirname(BENCHMARK_DIR))
+
+from kapidox.depdiagram.generate import DotWriter, FrameworkCmp, generate  # noqa: E402
+from kapidox.depdiagram.frameworkdb import FrameworkDb, preprocess  # noqa: E402
+
+QT_TARGETS = ('Qt5::Core', 'Qt5::Gui', 'Qt5::Widgets', 'Qt5::Network', 'Qt5::DBus', 'Qt5::Xml')
+
+EXTERNAL_TARGETS = ('ZLIB::ZLIB', 'm', 'pthread', 'LibGit2', 'Gettext')
+
+# Shapes CMake uses for libraries, plugins, executables and static libraries
+TARGET_SHAPES = ('polygon', 'octagon', 'house', 'diamond')
+
+TIERS = 4
+
+# Growth exponent expected for each benchmark
+EXPECTED_EXPONENTS = {
+    'preprocess': 1,
+    'populate': 1,
+    'filter': 2,
+    'tier order': 2,
+    'write': 2,
+    'write detailed': 2,
+    'write simplified': 2,
+    'generate per framework': 2,
+}
+
+
+def framework_name(index):
+    return f'kfw{index}'
+
+
+def _target_name(index, target):
+    return f'Kfw{index}' + ('Core' if target == 0 else f'Part{target}')
+
+
+def write_fixtures(dot_dir, frameworks, targets, seed=0):
+    """Write the dot and yaml files of `frameworks` synthetic frameworks with
+    `targets` targets each to `dot_dir`, and return the list of dot files"""
+    rnd = random.Random(seed)
+    os.makedirs(dot_dir, exist_ok=True)
+    dot_files = []
+    for index in range(frameworks):
+        name = framework_name(index)
+        tier = 1 + index * TIERS // frameworks
+        # Depend on a few frameworks generated before, mostly close ones
+        candidates = list(range(max(0, index - 50), index))
+        deps = rnd.sample(candidates, min(len(candidates), rnd.randint(0, 4)))
+
+        nodes = {}
+        lines = [f'digraph "{name}" {{', 'node [', '  fontsize = "12"', '];']
+
+        def node(label, shape):
+            if label not in nodes:
+                nodes[label] = f'node{len(nodes)}'
+                lines.append(f'    "{nodes[label]}" [ label = "{label}", shape = {shape} ];')
+            return nodes[label]
+
+        def edge(tail, head):
+            lines.append(f'    "{tail}" -> "{head}" [ style = solid ] // {tail} -> {head}')
+
+        for target in range(targets):
+            shape = 'polygon' if target == 0 else rnd.choice(TARGET_SHAPES)
+            own = node('KF5' + _target_name(index, target), shape)
+            if target == 0:
+                # CMake also lists the alias of the library
+                node('KF5::' + _target_name(index, target), 'ellipse')
+            else:
+                edge(own, nodes['KF5' + _target_name(index, 0)])
+            for qt in rnd.sample(QT_TARGETS, rnd.randint(1, 3)):
+                edge(own, node(qt, 'ellipse'))
+            if rnd.random() < 0.3:
+                edge(own, node(rnd.choice(EXTERNAL_TARGETS), 'ellipse'))
+            for dep in deps:
+                dep_target = _target_name(dep, rnd.randrange(min(targets, 3)))
+                edge(own, node('KF5::' + dep_target, 'ellipse'))
+        # Test targets are ignored
+        test = node(f'{name}test', 'house')
+        edge(test, nodes['KF5' + _target_name(index, 0)])
+        lines.append('}')
+
+        dot_path = os.path.join(dot_dir, name + '.dot')
+        with open(dot_path, 'w') as f:
+            f.write('\n'.join(lines) + '\n')
+        with open(os.path.join(dot_dir, name + '.yaml'), 'w') as f:
+            f.write(f'tier: {tier}\n')
+            if deps and rnd.random() < 0.1:
+                f.write(f'framework-dependencies:\n  - {framework_name(rnd.choice(deps))}\n')
+        dot_files.append(dot_path)
+    return dot_files
+
+
+def _timed(fct, repeat):
+    """Returns the shortest duration of a call of `fct`
+
+    Like the timeit module, `fct` is called enough times in a row to take at
+    least 0.2 seconds, and this is repeated `repeat` times.
+    """
+    timer = timeit.Timer(fct)
+    number, _ = timer.autorange()
+    return min(timer.repeat(repeat, number)) / number
+
+
+def _populated(dot_files):
+    db = FrameworkDb()
+    db.populate(dot_files, use_cache=False)
+    return db
+
+
+def _filter_all(db):
+    for fw in db:
+        db.filtered(fw)
+
+
+def _tier_order(db):
+    fw_cmp = FrameworkCmp(db)
+    lst = sorted(db, key=lambda x: x.tier)
+    for _, frameworks in itertools.groupby(lst, lambda x: x.tier):
+        fw_cmp.sort(frameworks)
+
+
+def _write(db, **kwargs):
+    DotWriter(db, io.StringIO(), **kwargs).write()
+
+
+def _generate_all(db):
+    for fw in db:
+        generate(io.StringIO(), None, framework=fw.name, db=db, simplify=True)
+
+
+def run_benchmarks(dot_files, repeat):
+    """Returns a dict of benchmark name => duration in seconds"""
+    db = _populated(dot_files)
+    benchmarks = {
+        'preprocess': lambda: [preprocess(x) for x in dot_files],
+        'populate': lambda: _populated(dot_files),
+        'filter': lambda: _filter_all(db),
+        'tier order': lambda: _tier_order(db),
+        'write': lambda: _write(db),
+        'write detailed': lambda: _write(db, detailed=True),
+        'write simplified': lambda: _write(db, simplify=True),
+        'generate per framework': lambda: _generate_all(db),
+    }
+    results = {}
+    for name, fct in benchmarks.items():
+        results[name] = round(_timed(fct, repeat), 6)
+        logging.info(f'{len(dot_files)} frameworks: {name}: {results[name]:.3f}s')
+    return results
+
+
+def growth(sizes, runs, tolerance):
+    """Returns the growth exponents of each benchmark between consecutive
+    sizes, and the list of benchmarks growing faster than expected"""
+    exponents = {}
+    superlinear = []
+    for name, expected in EXPECTED_EXPONENTS.items():
+        values = []
+        for (n1, run1), (n2, run2) in zip(zip(sizes, runs), zip(sizes[1:], runs[1:])):
+            t1, t2 = run1[name], run2[name]
+            if t1 <= 0 or t2 <= 0:
+                values.append(None)
+                continue
+            values.append(round(math.log(t2 / t1) / math.log(n2 / n1), 2))
+        exponents[name] = values
+        if any(x is not None and x > expected + tolerance for x in values):
+            superlinear.append(name)
+    return exponents, superlinear
+
+
+def main():
+    logging.basicConfig(format='%(asctime)s %(levelname)s %(message)s', datefmt='%H:%M:%S',
+                        level=logging.INFO)
+    parser = argparse.ArgumentParser(
+        description='Time the dependency diagram engine on synthetic frameworks.')
+    parser.add_argument('--sizes', type=lambda x: sorted(int(y) for y in x.split(',')),
+                        default=[100, 200, 400],
+                        help='Comma-separated numbers of frameworks (default: 100,200,400)')
+    parser.add_argument('--targets', type=int, default=10,
+                        help='Number of targets per framework (default: 10)')
+    parser.add_argument('--repeat', type=int, default=3,
+                        help='Number of times each benchmark runs, the fastest run '
+                             'is kept (default: 3)')
+    parser.add_argument('--seed', type=int, default=0,
+                        help='Seed of the random generator (default: 0)')
+    parser.add_argument('--tolerance', type=float, default=0.5,
+                        help='How much a growth exponent may exceed the expected one '
+                             '(default: 0.5)')
+    parser.add_argument('--check', action='store_true',
+                        help='Exit with status 1 if a benchmark grows faster than expected')
+    parser.add_argument('--fixtures-dir',
+                        help='Where to write the fixtures (default: a temporary directory, '
+                             'removed at the end)')
+    parser.add_argument('-o', '--output',
+                        help='Write the results to this file instead of the standard output')
+    args = parser.parse_args()
+
+    fixtures_dir = args.fixtures_dir or tempfile.mkdtemp(prefix='kapidox-depdiagram-')
+    runs = []
+    try:
+        for size in args.sizes:
+            dot_files = write_fixtures(os.path.join(fixtures_dir, str(size)), size, args.targets,
+                                       args.seed)
+            runs.append(run_benchmarks(dot_files, args.repeat))
+    finally:
+        if not args.fixtures_dir:
+            shutil.rmtree(fixtures_dir)
+
+    exponents, superlinear = growth(args.sizes, runs, args.tolerance)
+    for name in superlinear:
+        logging.warning(f'{name} grows faster than expected: exponents {exponents[name]}, '
+                        f'expected {EXPECTED_EXPONENTS[name]}')
+    result = {
+        'targets': args.targets,
+        'sizes': args.sizes,
+        'seconds': {name: [run[name] for run in runs] for name in EXPECTED_EXPONENTS},
+        'exponents': exponents,
+        'superlinear': superlinear,
+    }
+    if args.output:
+        with open(args.output, 'w') as f:
+            json.dump(result, f, indent=2)
+            f.write('\n')
+    else:
+        json.dump(result, sys.stdout, indent=2)
+        sys.stdout.write('\n')
+    if args.check and superlinear:
+        sys.exit(1)
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,181 @@
+#! /usr/bin/env python3
+# -*- coding: utf-8 -*-
+#
+# SPDX-License-Identifier: BSD-2-Clause
+
+"""
+Time the stages of kapidox-generate on a synthetic source tree
+
+A tree is generated with synthetic_tree.py, then kapidox-generate is run on
+it once with an empty cache ("cold" run), and `--warm-runs` times more with
+the cache filled by the previous runs ("warm" runs). Each run happens in a
+new process, with HOME pointing to a directory of the benchmark so that the
+cache of the user is neither used nor modified, and without network access
+(see offline_generate.py).
+
+The duration of each stage is read from the trace written by
+kapidox-generate --trace. The result is printed as JSON, or written to the
+file given by --output.
+
+Unknown arguments are passed to kapidox-generate, for example
+--doxygen /path/to/doxygen or --jobs 4. With --stub-tools, the stand-ins of
+stubtools.py are used instead of doxygen, qdoc and qhelpgenerator, so that
+only the Python stages are measured.
+"""
+
+import argparse
+import json
+import logging
+import os
+import platform
+import shutil
+import site
+import statistics
+import subprocess
+import sys
+import tempfile
+import time
+
+from synthetic_tree import add_tree_arguments, generate_tree, tree_arguments
+
+BENCHMARK_DIR = os.path.dirname(os.path.abspath(__file__))
+SOURCE_DIR = os.path.dirname(BENCHMARK_DIR)
+STUBS_DIR = os.path.join(BENCHMARK_DIR, 'stubs')
+
+
+def _kapidox_version(kapidox_dir):
+    """Returns a description of the kapidox checkout in `kapidox_dir`"""
+    try:
+        return subprocess.check_output(['git', 'describe', '--always', '--dirty'],
+                                       cwd=kapidox_dir, stderr=subprocess.DEVNULL,
+                                       universal_newlines=True).strip()
+    except (OSError, subprocess.CalledProcessError):
+        return None
+
+
+def read_trace(path):
+    """Returns the total duration of each stage, and of each traced function,
+    in seconds, from the trace written by kapidox-generate --trace"""
+    with open(path) as f:
+        events = json.load(f)['traceEvents']
+    stages = {}
+    functions = {}
+    for event in events:
+        if event['cat'] == 'stage':
+            totals = stages
+        elif event['cat'] == 'generator':
+            totals = functions
+        else:
+            continue
+        totals[event['name']] = totals.get(event['name'], 0.) + event['dur'] / 1e6
+    return stages, functions
+
+
+def run_kapidox(name, work_dir, home_dir, kapidox_dir, kapidox_args):
+    """Run kapidox-generate in a new directory of `work_dir` and returns the
+    timings of the run"""
+    out_dir = os.path.join(work_dir, name)
+    os.makedirs(out_dir)
+    trace_path = os.path.join(work_dir, name + '.trace.json')
+    log_path = os.path.join(work_dir, name + '.log')
+
+    env = dict(os.environ)
+    env['HOME'] = home_dir
+    # Keep the packages installed with pip --user importable
+    env['PYTHONUSERBASE'] = site.getuserbase()
+    env['PYTHONPATH'] = os.pathsep.join(
+        [kapidox_dir] + [x for x in [os.environ.get('PYTHONPATH')] if x])
+    cmd = [sys.executable, os.path.join(BENCHMARK_DIR, 'offline_generate.py'),
+           '--trace', trace_path] + kapidox_args
+
+    logging.info(f'Running {name}, log in {log_path}')
+    start = time.perf_counter()
+    with open(log_path, 'w') as log:
+        ret = subprocess.call(cmd, cwd=out_dir, env=env, stdout=log, stderr=subprocess.STDOUT)
+    wall = time.perf_counter() - start
+    if ret != 0:
+        raise RuntimeError(f'{name} failed with status {ret}, see {log_path}')
+
+    stages, functions = read_trace(trace_path)
+    return {
+        'name': name,
+        'wall': round(wall, 3),
+        'stages': {k: round(v, 3) for k, v in stages.items()},
+        'functions': {k: round(v, 3) for k, v in sorted(functions.items())},
+    }
+
+
+def _median_stages(runs):
+    names = sorted({x for run in runs for x in run['stages']})
+    return {x: round(statistics.median(run['stages'].get(x, 0.) for run in runs), 3) for x in names}
+
+
+def main():
+    logging.basicConfig(format='%(asctime)s %(levelname)s %(message)s', datefmt='%H:%M:%S',
+                        level=logging.INFO)
+    parser = argparse.ArgumentParser(
+        description='Time the stages of kapidox-generate on a synthetic source tree.',
+        epilog='Other arguments are passed to kapidox-generate.')
+    parser.add_argument('--warm-runs', type=int, default=2,
+                        help='Number of runs after the cold one (default: 2)')
+    parser.add_argument('--kapidox', default=SOURCE_DIR,
+                        help='Source directory of the kapidox to benchmark (default: %(default)s)')
+    parser.add_argument('--work-dir',
+                        help='Where to generate the tree and the documentation '
+                             '(default: a temporary directory, removed at the end)')
+    parser.add_argument('--stub-tools', action='store_true',
+                        help='Use the stand-ins of stubtools.py instead of doxygen, qdoc '
+                             'and qhelpgenerator')
+    parser.add_argument('-o', '--output',
+                        help='Write the results to this file instead of the standard output')
+    add_tree_arguments(parser)
+    args, kapidox_args = parser.parse_known_args()
+    if args.stub_tools:
+        kapidox_args = [
+            '--doxygen', os.path.join(STUBS_DIR, 'doxygen'),
+            '--qdoc', os.path.join(STUBS_DIR, 'qdoc'),
+            '--qhelpgenerator', os.path.join(STUBS_DIR, 'qhelpgenerator'),
+        ] + kapidox_args
+
+    work_dir = args.work_dir or tempfile.mkdtemp(prefix='kapidox-bench-')
+    kapidox_dir = os.path.abspath(args.kapidox)
+    try:
+        src_dir = os.path.join(work_dir, 'src')
+        home_dir = os.path.join(work_dir, 'home')
+        os.makedirs(home_dir)
+        logging.info(f'Generating a synthetic tree in {src_dir}')
+        tree = generate_tree(src_dir, **tree_arguments(args))
+        cmd_args = kapidox_args + ['--accountsfile', os.path.join(src_dir, 'accounts'), src_dir]
+
+        cold = run_kapidox('cold', work_dir, home_dir, kapidox_dir, cmd_args)
+        warm = [run_kapidox(f'warm{x + 1}', work_dir, home_dir, kapidox_dir, cmd_args)
+                for x in range(args.warm_runs)]
+    finally:
+        if not args.work_dir:
+            shutil.rmtree(work_dir)
+
+    result = {
+        'kapidox': {'path': kapidox_dir, 'version': _kapidox_version(kapidox_dir)},
+        'python': platform.python_version(),
+        'stub_tools': args.stub_tools,
+        'cpus': os.cpu_count(),
+        'arguments': kapidox_args,
+        'tree': tree,
+        'cold': cold,
+        'warm': warm,
+        'warm_median': {
+            'wall': round(statistics.median(x['wall'] for x in warm), 3) if warm else None,
+            'stages': _median_stages(warm),
+        },
+    }
+    if args.output:
+        with open(args.output, 'w') as f:
+            json.dump(result, f, indent=2)
+            f.write('\n')
+    else:
+        json.dump(result, sys.stdout, indent=2)
+        sys.stdout.write('\n')
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,338 @@
+#! /usr/bin/env python3
+# -*- coding: utf-8 -*-
+#
+# SPDX-License-Identifier: BSD-2-Clause
+
+"""
+Measure the size of the search indexes and how fast they answer queries
+
+The indexes are built from the searchdata.json files written by the indexer
+for each library of a site generated by kapidox-generate, given as argument.
+Without argument, a site is generated from a synthetic tree with the stub
+tools (see bench_pipeline.py).
+
+For each index format, the script reports:
+
+- its size, raw and compressed like a web server would send it, for the
+  whole site and for each product when each product has its own file;
+- the time taken to build and to load (parse) it;
+- the latency of each query of a fixed set, run --rounds times, with the p50
+  and p99 of all of them, and the number of results, to compare the formats.
+
+Two formats exist:
+
+- json: the searchdata.json files of the products and of the whole site,
+  merged by generator.create_product_index() and create_global_index(), and
+  searched by search.js in the browser. The matching logic of search.js
+  (case-insensitive regular expression on the name and the text of each
+  entry) is ported to Python, and run on the global index, like the search
+  page of the top-level index does;
+- sqlite: the FTS5 database queried by kapidox-search-serve.
+
+A new format can be evaluated by adding a class with the same methods to
+FORMATS.
+
+The results are printed as JSON, or written to the file given by --output.
+"""
+
+import argparse
+import gzip
+import json
+import logging
+import math
+import os
+import re
+import shutil
+import statistics
+import sys
+import tempfile
+import time
+import types
+
+try:
+    import brotli
+except ImportError:
+    brotli = None
+
+BENCHMARK_DIR = os.path.dirname(os.path.abspath(__file__))
+sys.path.insert(0, os.path.dirname(BENCHMARK_DIR))
+
+from kapidox import generator, search_serve  # noqa: E402
+
+from bench_pipeline import SOURCE_DIR, STUBS_DIR, run_kapidox  # noqa: E402
+from synthetic_tree import add_tree_arguments, generate_tree, tree_arguments  # noqa: E402
+
+GLOBAL_INDEX = 'searchdata.json'
+
+# Queries like the ones typed in the search box: class names, function names,
+# words of the documentation, and a query without results
+QUERIES = (
+    'KJob', 'QString', 'model', 'Dialog', 'setText', 'load', 'watcher', 'network',
+    'kio', 'config', 'view item', 'Core', 'xyzzy',
+)
+
+
+def compressed_sizes(data):
+    """Returns a dict of compression => size of `data` compressed with it"""
+    sizes = {'raw': len(data), 'gzip': len(gzip.compress(data, compresslevel=6))}
+    if brotli is not None:
+        sizes['brotli'] = len(brotli.compress(data))
+    return sizes
+
+
+def search_json_global(index, query):
+    """Port of search_json_global() of search.js
+
+    Returns the entries whose name matches `query`, and the entries whose
+    text matches it. Like in the browser, the query is a case-insensitive
+    regular expression; an invalid one matches nothing (search.js throws).
+    """
+    try:
+        rx = re.compile(query, re.IGNORECASE)
+    except re.error:
+        return [], []
+    results_name = []
+    results_text = []
+    for product in index['all']:
+        for lib in product['libraries']:
+            for entry in lib['docfields']:
+                if 'name' in entry and rx.search(entry['name']):
+                    results_name.append(entry)
+                if 'text' in entry and rx.search(entry['text']):
+                    results_text.append(entry)
+    return results_name, results_text
+
+
+class JsonFormat(object):
+    """The searchdata.json files of the products and of the whole site"""
+    name = 'json'
+
+    def __init__(self, site_dir, products, work_dir):
+        self.work_dir = work_dir
+        self.index = None
+        # Products writing their index to work_dir, from the indexes of their
+        # libraries in site_dir
+        self.products = []
+        for product in products:
+            with open(os.path.join(site_dir, product.outputdir, GLOBAL_INDEX)) as f:
+                prodindex = json.load(f)
+            libraries = []
+            for lib in prodindex['libraries']:
+                grouped = os.path.isdir(os.path.join(site_dir, product.outputdir, lib['name'].lower()))
+                outputdir = os.path.join(product.outputdir, lib['name']) if grouped else product.outputdir
+                libraries.append(types.SimpleNamespace(
+                    name=lib['name'], outputdir=os.path.join(site_dir, outputdir.lower()),
+                    part_of_group=grouped))
+            self.products.append(types.SimpleNamespace(
+                name=product.name, fancyname=product.fancyname, metainfo=product.metainfo,
+                outputdir=os.path.join(work_dir, product.name), libraries=libraries))
+
+    def build(self):
+        cwd = os.getcwd()
+        os.chdir(self.work_dir)
+        try:
+            for product in self.products:
+                os.makedirs(product.outputdir, exist_ok=True)
+                generator.create_product_index(product)
+            generator.create_global_index(self.products)
+        finally:
+            os.chdir(cwd)
+
+    def sizes(self):
+        """Returns the sizes of the index of the whole site, and of the index
+        of each product"""
+        per_product = {}
+        for product in self.products:
+            with open(os.path.join(product.outputdir, GLOBAL_INDEX), 'rb') as f:
+                per_product[product.name] = compressed_sizes(f.read())
+        with open(os.path.join(self.work_dir, GLOBAL_INDEX), 'rb') as f:
+            return compressed_sizes(f.read()), per_product
+
+    def load(self):
+        with open(os.path.join(self.work_dir, GLOBAL_INDEX)) as f:
+            self.index = json.load(f)
+
+    def search(self, query):
+        results_name, results_text = search_json_global(self.index, query)
+        return len(results_name) + len(results_text)
+
+    def close(self):
+        self.index = None
+
+
+class SqliteFormat(object):
+    """The FTS5 database served by kapidox-search-serve"""
+    name = 'sqlite'
+
+    def __init__(self, site_dir, products, work_dir):
+        self.site_dir = site_dir
+        self.products = products
+        self.path = os.path.join(work_dir, generator.SEARCH_DATABASE)
+        self.database = None
+
+    def build(self):
+        cwd = os.getcwd()
+        os.chdir(self.site_dir)
+        try:
+            if not generator.create_search_database(self.products, self.path):
+                raise RuntimeError('The SQLite library does not support FTS5')
+        finally:
+            os.chdir(cwd)
+
+    def sizes(self):
+        with open(self.path, 'rb') as f:
+            return compressed_sizes(f.read()), {}
+
+    def load(self):
+        self.database = search_serve.SearchDatabase(self.path)
+        self.database._connection().execute('SELECT count(*) FROM docs').fetchone()
+
+    def search(self, query):
+        return self.database.search(query)['total']
+
+    def close(self):
+        if self.database is not None:
+            self.database._connection().close()
+        self.database = None
+
+
+FORMATS = {x.name: x for x in (JsonFormat, SqliteFormat)}
+
+
+def read_products(site_dir):
+    """Returns the products of the global index of `site_dir`, with the
+    attributes generator.create_search_database() uses, and the number of
+    entries of the index"""
+    with open(os.path.join(site_dir, GLOBAL_INDEX)) as f:
+        index = json.load(f)
+    products = [types.SimpleNamespace(name=x['name'], fancyname=x['fancyname'], outputdir=x['name'],
+                                      metainfo={'qdoc': False})
+                for x in index['all']]
+    entries = sum(len(lib['docfields']) for x in index['all'] for lib in x['libraries'])
+    return products, entries
+
+
+def percentile(values, percent):
+    """Returns the `percent` percentile of `values`, with the nearest-rank
+    method"""
+    values = sorted(values)
+    rank = max(1, math.ceil(percent / 100 * len(values)))
+    return values[rank - 1]
+
+
+def bench_format(fmt, queries, rounds):
+    start = time.perf_counter()
+    fmt.build()
+    build = time.perf_counter() - start
+    total, per_product = fmt.sizes()
+
+    start = time.perf_counter()
+    fmt.load()
+    load = time.perf_counter() - start
+
+    latencies = []
+    per_query = {}
+    for query in queries:
+        durations = []
+        for _ in range(rounds):
+            start = time.perf_counter()
+            count = fmt.search(query)
+            durations.append(time.perf_counter() - start)
+        latencies.extend(durations)
+        per_query[query] = {'results': count, 'median_ms': round(statistics.median(durations) * 1000, 3)}
+    fmt.close()
+
+    logging.info(f'{fmt.name}: {total["raw"]} bytes, load {load:.3f}s, '
+                 f'p50 {percentile(latencies, 50) * 1000:.2f}ms, p99 {percentile(latencies, 99) * 1000:.2f}ms')
+    return {
+        'bytes': total,
+        'bytes_per_product': per_product,
+        'build_seconds': round(build, 6),
+        'load_seconds': round(load, 6),
+        'latency_ms': {
+            'p50': round(percentile(latencies, 50) * 1000, 3),
+            'p99': round(percentile(latencies, 99) * 1000, 3),
+        },
+        'queries': per_query,
+    }
+
+
+def generate_site(work_dir, args):
+    """Generate a site from a synthetic tree with the stub tools, and return
+    its directory"""
+    src_dir = os.path.join(work_dir, 'src')
+    home_dir = os.path.join(work_dir, 'home')
+    os.makedirs(home_dir)
+    logging.info(f'Generating a synthetic site in {work_dir}')
+    generate_tree(src_dir, **tree_arguments(args))
+    run_kapidox('site', work_dir, home_dir, SOURCE_DIR, [
+        '--doxygen', os.path.join(STUBS_DIR, 'doxygen'),
+        '--qdoc', os.path.join(STUBS_DIR, 'qdoc'),
+        '--qhelpgenerator', os.path.join(STUBS_DIR, 'qhelpgenerator'),
+        '--accountsfile', os.path.join(src_dir, 'accounts'),
+        src_dir])
+    return os.path.join(work_dir, 'site')
+
+
+def main():
+    logging.basicConfig(format='%(asctime)s %(levelname)s %(message)s', datefmt='%H:%M:%S',
+                        level=logging.INFO)
+    parser = argparse.ArgumentParser(
+        description='Measure the size of the search indexes and how fast they answer queries.')
+    parser.add_argument('site', nargs='?',
+                        help='Directory generated by kapidox-generate (default: generate '
+                             'one from a synthetic tree)')
+    parser.add_argument('--formats', type=lambda x: x.split(','), default=list(FORMATS),
+                        help=f'Comma-separated formats to measure (default: {",".join(FORMATS)})')
+    parser.add_argument('--queries', metavar='FILE',
+                        help='File with one query per line (default: a built-in set)')
+    parser.add_argument('--rounds', type=int, default=20,
+                        help='Number of times each query runs (default: 20)')
+    parser.add_argument('--work-dir',
+                        help='Where to build the indexes, and the synthetic site (default: '
+                             'a temporary directory, removed at the end)')
+    parser.add_argument('-o', '--output',
+                        help='Write the results to this file instead of the standard output')
+    add_tree_arguments(parser)
+    args = parser.parse_args()
+
+    unknown = [x for x in args.formats if x not in FORMATS]
+    if unknown:
+        parser.error(f'unknown formats: {", ".join(unknown)}')
+    queries = QUERIES
+    if args.queries:
+        with open(args.queries) as f:
+            queries = [x.strip() for x in f if x.strip()]
+
+    work_dir = args.work_dir or tempfile.mkdtemp(prefix='kapidox-search-')
+    try:
+        site_dir = os.path.abspath(args.site) if args.site else generate_site(work_dir, args)
+        products, entries = read_products(site_dir)
+        formats = {}
+        for name in args.formats:
+            fmt_dir = os.path.join(work_dir, name)
+            os.makedirs(fmt_dir, exist_ok=True)
+            formats[name] = bench_format(FORMATS[name](site_dir, products, fmt_dir), queries, args.rounds)
+    finally:
+        if not args.work_dir:
+            shutil.rmtree(work_dir)
+
+    result = {
+        'site': args.site,
+        'tree': None if args.site else tree_arguments(args),
+        'products': len(products),
+        'entries': entries,
+        'rounds': args.rounds,
+        'formats': formats,
+    }
+    if args.output:
+        with open(args.output, 'w') as f:
+            json.dump(result, f, indent=2)
+            f.write('\n')
+    else:
+        json.dump(result, sys.stdout, indent=2)
+        sys.stdout.write('\n')
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,492 @@
+#! /usr/bin/env python3
+# -*- coding: utf-8 -*-
+#
+# SPDX-License-Identifier: BSD-2-Clause
+
+"""
+Fast stand-ins for doxygen, qdoc and qhelpgenerator
+
+They produce the files kapidox reads, with the same structure as the real
+tools, in a fraction of their time, so that the Python stages of kapidox can
+be tested and benchmarked without the real tools:
+
+- doxygen reads the Doxyfile and writes HTML pages with the key/value block of
+  HTML_HEADER, the tag file, searchdata.xml and, if GENERATE_QHP is set,
+  index.qhp. A page is written for each class declared in the headers of
+  INPUT, and for each Markdown page.
+- qdoc reads the .qdocconf file and writes an HTML page for each class of
+  its headerdirs, and the tag file if `tagfile` is set.
+- qhelpgenerator writes a .qch file (an SQLite database, like the real one)
+  listing the files of the .qhp file.
+
+The tool is chosen from the name the script is run as: benchmarks/stubs
+contains links named after each of them, to pass to kapidox-generate:
+
+    kapidox-generate --doxygen benchmarks/stubs/doxygen \\
+        --qdoc benchmarks/stubs/qdoc \\
+        --qhelpgenerator benchmarks/stubs/qhelpgenerator ...
+
+The size of the output is set with environment variables:
+
+KAPIDOX_STUB_SCALE
+    Number of classes generated for each class found (default: 1). Use 10 to
+    get the size of a tree ten times larger.
+KAPIDOX_STUB_MEMBERS
+    Minimum number of members of each class (default: 10). Members are added
+    when the header declares fewer.
+KAPIDOX_STUB_PAGE_KB
+    Minimum size of each HTML page in kB (default: 8).
+KAPIDOX_STUB_DELAY
+    Seconds each run waits before exiting, to simulate the time taken by the
+    real tool (default: 0).
+"""
+
+import datetime
+import glob
+import hashlib
+import html
+import os
+import re
+import shlex
+import sqlite3
+import sys
+import time
+import xml.etree.ElementTree as ET
+
+VERSION = '1.9.8-stub'
+
+HEADER_EXTENSIONS = ('.h', '.hpp', '.hxx')
+PAGE_EXTENSIONS = ('.md', '.dox')
+
+_NAMESPACE_RX = re.compile(r'^\s*namespace\s+(\w+)', re.MULTILINE)
+# Class definitions, not forward declarations
+_CLASS_RX = re.compile(r'^\s*class\s+(?:\w+_EXPORT\s+)?(\w+)\s*(?:final\s*)?(?::[^;{]*)?\{', re.MULTILINE)
+_METHOD_RX = re.compile(r'^ {4}(?!//|/\*|\*)[\w:<>,&* ~]*?\b(~?\w+)\s*\([^;{]*\)[^;{]*;', re.MULTILINE)
+_PAGE_LABEL_RX = re.compile(r'^#\s*(.*?)\s*\{#(\w+)\}', re.MULTILINE)
+_TOKEN_RX = re.compile(r'\w+')
+
+
+def _env_int(name, default):
+    try:
+        return int(os.environ.get(name, default))
+    except ValueError:
+        return default
+
+
+def _settings():
+    return {
+        'scale': max(1, _env_int('KAPIDOX_STUB_SCALE', 1)),
+        'members': max(0, _env_int('KAPIDOX_STUB_MEMBERS', 10)),
+        'page_size': max(0, _env_int('KAPIDOX_STUB_PAGE_KB', 8)) * 1024,
+        'delay': float(os.environ.get('KAPIDOX_STUB_DELAY', 0) or 0),
+    }
+
+
+def _write(path, txt):
+    os.makedirs(os.path.dirname(path) or '.', exist_ok=True)
+    with open(path, 'w', encoding='utf-8') as f:
+        f.write(txt)
+
+
+def _anchor(*parts):
+    return 'a' + hashlib.md5('|'.join(parts).encode()).hexdigest()
+
+
+def read_config(path, expand=False):
+    """Parse a Doxyfile or a .qdocconf file into a dict of key => list of
+    words
+
+    Later assignments override earlier ones, `+=` appends. Lines ending with a
+    backslash continue on the next one. If `expand` is True, environment
+    variables like $VAR are expanded, as qdoc does.
+    """
+    config = {}
+    with open(path, encoding='utf-8', errors='replace') as f:
+        txt = f.read().replace('\\\n', ' ')
+    for line in txt.splitlines():
+        line = line.strip()
+        if not line or line.startswith('#'):
+            continue
+        match = re.match(r'([\w.]+)\s*(\+?=)\s*(.*)', line)
+        if not match:
+            continue
+        key, op, value = match.groups()
+        if expand:
+            value = os.path.expandvars(value)
+        try:
+            words = shlex.split(value, comments=False)
+        except ValueError:
+            words = value.split()
+        if op == '+=':
+            config.setdefault(key, []).extend(words)
+        else:
+            config[key] = words
+    return config
+
+
+def _value(config, key, default=None):
+    words = config.get(key)
+    return ' '.join(words) if words else default
+
+
+def _input_files(paths, extensions):
+    """Returns the files of `paths` (files or directories, searched
+    recursively) with one of `extensions`"""
+    files = []
+    for path in paths:
+        if os.path.isfile(path):
+            if path.endswith(extensions):
+                files.append(path)
+            continue
+        for dirpath, dirs, names in os.walk(path):
+            dirs.sort()
+            files.extend(os.path.join(dirpath, x) for x in sorted(names) if x.endswith(extensions))
+    return files
+
+
+class Compound(object):
+    """A class found in a header, with its members"""
+    def __init__(self, namespace, name, header, members):
+        self.namespace = namespace
+        self.name = name
+        self.header = header
+        self.members = members
+
+    @property
+    def qualified_name(self):
+        return f'{self.namespace}::{self.name}' if self.namespace else self.name
+
+    @property
+    def filename(self):
+        return 'class' + self.qualified_name.replace('::', '_1_1') + '.html'
+
+
+def scan_headers(headers, settings):
+    """Returns the list of Compounds declared in `headers`, multiplied by the
+    KAPIDOX_STUB_SCALE setting"""
+    compounds = []
+    for header in headers:
+        with open(header, encoding='utf-8', errors='replace') as f:
+            txt = f.read()
+        namespace = _NAMESPACE_RX.search(txt)
+        namespace = namespace.group(1) if namespace else None
+        for match in _CLASS_RX.finditer(txt):
+            cls = match.group(1)
+            members = []
+            for method in _METHOD_RX.findall(txt, match.end()):
+                if method not in members and method.lstrip('~') != cls:
+                    members.append(method)
+            members += [f'member{x}' for x in range(len(members), settings['members'])]
+            for copy in range(settings['scale']):
+                name = cls if copy == 0 else f'{cls}{copy + 1}'
+                compounds.append(Compound(namespace, name, header, members))
+    return compounds
+
+
+def scan_pages(paths):
+    """Returns a list of (label, title, path) for the Markdown and .dox pages
+    of `paths`. The main page has the label 'index'."""
+    pages = []
+    for path in paths:
+        with open(path, encoding='utf-8', errors='replace') as f:
+            txt = f.read()
+        match = _PAGE_LABEL_RX.search(txt)
+        if match:
+            title, label = match.groups()
+        else:
+            title = os.path.splitext(os.path.basename(path))[0]
+            label = 'md_' + re.sub(r'\W', '_', os.path.splitext(path)[0]).strip('_')
+        if label == 'mainpage':
+            label = 'index'
+        pages.append((label, title, path))
+    return pages
+
+
+def _padding(size):
+    """Returns filler paragraphs of about `size` bytes"""
+    paragraph = ('<p>Lorem ipsum dolor sit amet, consectetur adipiscing elit, sed do '
+                 'eiusmod tempor incididunt ut labore et dolore magna aliqua.</p>\n')
+    return paragraph * (size // len(paragraph))
+
+
+class HtmlWriter(object):
+    """Writes pages wrapped in the HTML_HEADER and HTML_FOOTER of a
+    Doxyfile"""
+    def __init__(self, htmldir, projectname, header_path, footer_path, page_size):
+        self.htmldir = htmldir
+        self.projectname = projectname
+        self.page_size = page_size
+        self.header = self._read(header_path, '<html>\n<head>\n<title>$title</title>\n</head>\n<body>\n')
+        self.footer = self._read(footer_path, '</body>\n</html>\n')
+        self.datetime = datetime.datetime.now().strftime('%a %b %d %Y %H:%M:%S')
+        self.files = []
+
+    @staticmethod
+    def _read(path, default):
+        if path and os.path.isfile(path):
+            with open(path, encoding='utf-8') as f:
+                return f.read()
+        return default
+
+    def _substitute(self, txt, title):
+        variables = {
+            'projectname': self.projectname,
+            'title': title,
+            'doxygenversion': VERSION,
+            'datetime': self.datetime,
+            'date': self.datetime,
+            'year': str(datetime.date.today().year),
+            'relpath^': '',
+            'relpath$': '',
+        }
+        return re.sub(r'\$(relpath[\^$]|\w+)', lambda m: variables.get(m.group(1), ''), txt)
+
+    def write(self, name, title, body):
+        content = (self._substitute(self.header, title)
+                   + f'<div class="header"><div class="headertitle"><div class="title">'
+                   + f'{html.escape(title)}</div></div></div>\n'
+                   + f'<div class="contents">\n{body}\n'
+                   + _padding(self.page_size - len(body))
+                   + '</div>\n'
+                   + self._substitute(self.footer, title))
+        _write(os.path.join(self.htmldir, name), content)
+        self.files.append(name)
+
+
+def _class_body(compound):
+    rows = ''.join(
+        f'<tr><td class="memItemLeft">bool</td><td class="memItemRight">'
+        f'<a class="el" href="{compound.filename}#{_anchor(compound.qualified_name, x)}">{x}</a>'
+        f' (const QString &amp;value)</td></tr>\n'
+        for x in compound.members)
+    details = ''.join(
+        f'<a id="{_anchor(compound.qualified_name, x)}"></a>\n'
+        f'<h2 class="memtitle">{x}()</h2>\n'
+        f'<div class="memitem"><div class="memdoc"><p>Documentation of {x}.</p></div></div>\n'
+        for x in compound.members)
+    return (f'<p><code>#include &lt;{os.path.basename(compound.header)}&gt;</code></p>\n'
+            f'<table class="memberdecls">\n{rows}</table>\n'
+            f'<a name="details" id="details"></a><h2 class="groupheader">Detailed Description</h2>\n'
+            f'<div class="textblock"><p>The {compound.name} class.</p></div>\n{details}')
+
+
+def _list_body(compounds):
+    items = ''.join(f'<li><a class="el" href="{x.filename}">{x.qualified_name}</a></li>\n'
+                    for x in compounds)
+    return f'<ul>\n{items}</ul>\n'
+
+
+def write_tagfile(path, compounds, pages):
+    root = ET.Element('tagfile', {'doxygen_version': VERSION})
+    namespaces = {}
+    for compound in compounds:
+        if compound.namespace:
+            namespaces.setdefault(compound.namespace, []).append(compound)
+        elem = ET.SubElement(root, 'compound', {'kind': 'class'})
+        ET.SubElement(elem, 'name').text = compound.qualified_name
+        ET.SubElement(elem, 'filename').text = compound.filename
+        for member in compound.members:
+            member_elem = ET.SubElement(elem, 'member', {'kind': 'function'})
+            ET.SubElement(member_elem, 'type').text = 'bool'
+            ET.SubElement(member_elem, 'name').text = member
+            ET.SubElement(member_elem, 'anchorfile').text = compound.filename
+            ET.SubElement(member_elem, 'anchor').text = _anchor(compound.qualified_name, member)
+            ET.SubElement(member_elem, 'arglist').text = '(const QString &value)'
+    for namespace, classes in sorted(namespaces.items()):
+        elem = ET.SubElement(root, 'compound', {'kind': 'namespace'})
+        ET.SubElement(elem, 'name').text = namespace
+        ET.SubElement(elem, 'filename').text = f'namespace{namespace}.html'
+        for compound in classes:
+            ET.SubElement(elem, 'class', {'kind': 'class'}).text = compound.qualified_name
+    for label, title, _ in pages:
+        elem = ET.SubElement(root, 'compound', {'kind': 'page'})
+        ET.SubElement(elem, 'name').text = label
+        ET.SubElement(elem, 'title').text = title
+        ET.SubElement(elem, 'filename').text = label + '.html'
+    os.makedirs(os.path.dirname(path) or '.', exist_ok=True)
+    ET.ElementTree(root).write(path, encoding='UTF-8', xml_declaration=True)
+
+
+def write_searchdata(path, compounds, pages, headers):
+    """Write the searchdata.xml file of doxygen's external search"""
+    root = ET.Element('add')
+
+    def add(type_, name, url, keywords, text):
+        doc = ET.SubElement(root, 'doc')
+        for key, value in (('type', type_), ('name', name), ('args', ''), ('url', url),
+                           ('keywords', keywords), ('text', text)):
+            ET.SubElement(doc, 'field', {'name': key}).text = value
+
+    for header in headers:
+        with open(header, encoding='utf-8', errors='replace') as f:
+            text = ' '.join(_TOKEN_RX.findall(f.read()))
+        name = os.path.basename(header)
+        add('source', name, name.replace('.', '_8') + '_source.html', '', text)
+    for label, title, _ in pages:
+        add('page', title, label + '.html', '', f'{title} documentation')
+    for compound in compounds:
+        add('class', compound.qualified_name, compound.filename, compound.qualified_name,
+            f'The {compound.name} class.')
+        for member in compound.members:
+            add('function', member, f'{compound.filename}#{_anchor(compound.qualified_name, member)}',
+                f'{compound.qualified_name}::{member}', f'Documentation of {member}.')
+    os.makedirs(os.path.dirname(path) or '.', exist_ok=True)
+    ET.ElementTree(root).write(path, encoding='UTF-8', xml_declaration=True)
+
+
+def write_qhp(path, namespace, virtual_folder, projectname, compounds, files):
+    root = ET.Element('QtHelpProject', {'version': '1.0'})
+    ET.SubElement(root, 'namespace').text = namespace
+    ET.SubElement(root, 'virtualFolder').text = virtual_folder
+    section = ET.SubElement(root, 'filterSection')
+    toc = ET.SubElement(section, 'toc')
+    main = ET.SubElement(toc, 'section', {'title': projectname, 'ref': 'index.html'})
+    keywords = ET.SubElement(section, 'keywords')
+    for compound in compounds:
+        ET.SubElement(main, 'section', {'title': compound.qualified_name, 'ref': compound.filename})
+        ET.SubElement(keywords, 'keyword', {'name': compound.name, 'id': compound.qualified_name,
+                                            'ref': compound.filename})
+        for member in compound.members:
+            ET.SubElement(keywords, 'keyword', {
+                'name': member,
+                'id': f'{compound.qualified_name}::{member}',
+                'ref': f'{compound.filename}#{_anchor(compound.qualified_name, member)}'})
+    files_elem = ET.SubElement(section, 'files')
+    for name in files:
+        ET.SubElement(files_elem, 'file').text = name
+    ET.ElementTree(root).write(path, encoding='UTF-8', xml_declaration=True)
+
+
+def doxygen(argv, settings):
+    if len(argv) != 1:
+        sys.stderr.write('usage: doxygen Doxyfile\n')
+        return 1
+    config = read_config(argv[0])
+    projectname = _value(config, 'PROJECT_NAME', 'Project')
+    outputdir = _value(config, 'OUTPUT_DIRECTORY', '.')
+    htmldir = os.path.join(outputdir, _value(config, 'HTML_OUTPUT', 'html'))
+    inputs = config.get('INPUT', ['.'])
+
+    headers = _input_files(inputs, HEADER_EXTENSIONS)
+    pages = scan_pages(_input_files(inputs, PAGE_EXTENSIONS))
+    compounds = scan_headers(headers, settings)
+
+    writer = HtmlWriter(htmldir, projectname, _value(config, 'HTML_HEADER'),
+                        _value(config, 'HTML_FOOTER'), settings['page_size'])
+    if not any(label == 'index' for label, _, _ in pages):
+        writer.write('index.html', f'{projectname} Documentation', '')
+    for label, title, _ in pages:
+        writer.write(label + '.html', title, f'<div class="textblock"><p>{html.escape(title)}</p></div>')
+    for compound in compounds:
+        writer.write(compound.filename, f'{compound.qualified_name} Class Reference', _class_body(compound))
+    if compounds:
+        writer.write('classes.html', 'Class Index', _list_body(compounds))
+        writer.write('annotated.html', 'Class List', _list_body(compounds))
+        writer.write('namespaces.html', 'Namespace List', '')
+    for namespace in sorted({x.namespace for x in compounds if x.namespace}):
+        writer.write(f'namespace{namespace}.html', f'{namespace} Namespace Reference',
+                     _list_body([x for x in compounds if x.namespace == namespace]))
+    if pages:
+        writer.write('pages.html', 'Related Pages', '')
+
+    tagfile = _value(config, 'GENERATE_TAGFILE')
+    if tagfile:
+        write_tagfile(tagfile, compounds, pages)
+    if _value(config, 'EXTERNAL_SEARCH', 'NO') == 'YES':
+        write_searchdata(os.path.join(outputdir, 'searchdata.xml'), compounds, pages, headers)
+    if _value(config, 'GENERATE_QHP', 'NO') == 'YES':
+        write_qhp(os.path.join(htmldir, 'index.qhp'),
+                  _value(config, 'QHP_NAMESPACE', 'org.doxygen.Project'),
+                  _value(config, 'QHP_VIRTUAL_FOLDER', 'doc'),
+                  projectname, compounds, writer.files)
+    warn_logfile = _value(config, 'WARN_LOGFILE')
+    if warn_logfile:
+        _write(warn_logfile, '')
+    return 0
+
+
+def qdoc(argv, settings):
+    confs = [x for x in argv if not x.startswith('-')]
+    outputdir = next((x.split('=', 1)[1] for x in argv if x.startswith('--outputdir=')), None)
+    if len(confs) != 1:
+        sys.stderr.write('usage: qdoc file.qdocconf --outputdir=DIR\n')
+        return 1
+    config = read_config(confs[0], expand=True)
+    confdir = os.path.dirname(os.path.abspath(confs[0]))
+    projectname = _value(config, 'project', 'Project')
+    outputdir = outputdir or os.path.join(confdir, _value(config, 'outputdir', 'html'))
+    headerdirs = [os.path.join(confdir, x) for x in config.get('headerdirs', ['.'])]
+    compounds = scan_headers(_input_files(headerdirs, HEADER_EXTENSIONS), settings)
+
+    writer = HtmlWriter(outputdir, projectname, None, None, settings['page_size'])
+    writer.write('index.html', projectname, _list_body(compounds))
+    for compound in compounds:
+        writer.write(compound.name.lower() + '.html', compound.qualified_name, _class_body(compound))
+    tagfile = _value(config, 'tagfile')
+    if tagfile:
+        write_tagfile(os.path.join(outputdir, tagfile), compounds, [])
+    return 0
+
+
+def qhelpgenerator(argv, settings):
+    qhp = next((x for x in argv if x.endswith('.qhp')), None)
+    output = argv[argv.index('-o') + 1] if '-o' in argv[:-1] else None
+    if qhp is None or output is None:
+        sys.stderr.write('usage: qhelpgenerator file.qhp -o file.qch\n')
+        return 1
+    try:
+        tree = ET.parse(qhp)
+    except (OSError, ET.ParseError) as exc:
+        sys.stderr.write(f'Cannot read {qhp}: {exc}\n')
+        return 1
+    basedir = os.path.dirname(os.path.abspath(qhp))
+    files = []
+    for elem in tree.iter('file'):
+        files.extend(os.path.relpath(x, basedir)
+                     for x in sorted(glob.glob(os.path.join(basedir, elem.text))))
+
+    os.makedirs(os.path.dirname(output) or '.', exist_ok=True)
+    tmp_output = output + '.stub'
+    if os.path.exists(tmp_output):
+        os.remove(tmp_output)
+    db = sqlite3.connect(tmp_output)
+    with db:
+        db.execute('CREATE TABLE NamespaceTable (Name TEXT)')
+        db.execute('CREATE TABLE FileNameTable (Name TEXT, Size INTEGER)')
+        db.execute('CREATE TABLE IndexTable (Name TEXT, Identifier TEXT, Ref TEXT)')
+        db.execute('INSERT INTO NamespaceTable VALUES (?)', (tree.findtext('namespace'),))
+        db.executemany('INSERT INTO FileNameTable VALUES (?, ?)',
+                       ((x, os.path.getsize(os.path.join(basedir, x))) for x in files))
+        db.executemany('INSERT INTO IndexTable VALUES (?, ?, ?)',
+                       ((x.get('name'), x.get('id'), x.get('ref')) for x in tree.iter('keyword')))
+    db.close()
+    os.replace(tmp_output, output)
+    return 0
+
+
+TOOLS = {
+    'doxygen': doxygen,
+    'qdoc': qdoc,
+    'qhelpgenerator': qhelpgenerator,
+}
+
+
+def main():
+    name = os.path.basename(sys.argv[0])
+    argv = sys.argv[1:]
+    tool = next((fct for key, fct in TOOLS.items() if name.startswith(key)), None)
+    if tool is None:
+        # Run as stubtools.py TOOL ARGS...
+        if not argv or argv[0] not in TOOLS:
+            sys.stderr.write(f'usage: {name} {{{",".join(TOOLS)}}} ARGS...\n')
+            return 1
+        tool = TOOLS[argv.pop(0)]
+    settings = _settings()
+    ret = tool(argv, settings)
+    if settings['delay'] > 0:
+        time.sleep(settings['delay'])
+    return ret
+
+
+if __name__ == '__main__':
+    sys.exit(main())
@@ -0,0 +1,262 @@
+#! /usr/bin/env python3
+# -*- coding: utf-8 -*-
+#
+# SPDX-License-Identifier: BSD-2-Clause
+
+"""
+Generate a synthetic source tree looking like a KDE checkout
+
+The tree contains `repos` repositories. Most of them belong to one of `groups`
+groups, like the KDE Frameworks, and are spread over the subgroups of their
+group; the others are standalone products. Each repository has a
+metainfo.yaml, a CMakeLists.txt, a README.md used as main page, documented
+headers in src/ and a page in docs/. Headers use the classes of the
+repositories they depend on, so that the tag files link them together.
+
+The same arguments always generate the same tree.
+"""
+
+import argparse
+import json
+import os
+import random
+import sys
+
+import yaml
+
+PLATFORMS = ('Linux', 'FreeBSD', 'Windows', 'macOS', 'Android')
+
+WORDS = ('model', 'view', 'item', 'job', 'widget', 'action', 'plugin', 'config', 'service',
+         'dialog', 'cache', 'parser', 'loader', 'runner', 'watcher', 'manager', 'store', 'helper')
+
+# Number of fake developers, listed in the accounts file
+MAINTAINERS = 10
+
+
+def _camel(*words):
+    return ''.join(w.capitalize() for w in words)
+
+
+def _repo_layout(repos, groups, subgroups):
+    """Returns a list of (name, group index or None, subgroup index or None),
+    one per repository"""
+    layout = []
+    counts = [0] * groups
+    for index in range(repos):
+        # One repository in groups + 1 is standalone
+        group = index % (groups + 1)
+        if group == groups:
+            layout.append((f'kstandalone{index}', None, None))
+            continue
+        layout.append((f'kgroup{group}lib{index}', group, counts[group] % subgroups))
+        counts[group] += 1
+    return layout
+
+
+def _write(path, txt):
+    os.makedirs(os.path.dirname(path), exist_ok=True)
+    with open(path, 'w', encoding='utf-8') as f:
+        f.write(txt)
+
+
+def _header(rnd, fancyname, cls, deps, methods):
+    """Returns the content of a documented header declaring `cls`"""
+    lines = [
+        f'/*',
+        f'    SPDX-License-Identifier: LGPL-2.0-or-later',
+        f'*/',
+        f'',
+        f'#ifndef {cls.upper()}_H',
+        f'#define {cls.upper()}_H',
+        f'',
+        f'#include <QObject>',
+        f'',
+        f'namespace {fancyname}',
+        f'{{',
+        f'',
+        f'/**',
+        f' * @class {cls} {cls.lower()}.h <{fancyname}/{cls}>',
+        f' *',
+        f' * @brief The {cls} class handles {rnd.choice(WORDS)}s.',
+        f' *',
+        f' * {cls} is part of {fancyname}. It works together with the other',
+        f' * {rnd.choice(WORDS)} classes to provide a complete {rnd.choice(WORDS)} API.',
+    ]
+    if deps:
+        lines.append(f' *')
+        lines.append(f' * @see ' + ', '.join(f'{ns}::{dep}' for ns, dep in deps))
+    lines += [
+        f' *',
+        f' * @since 5.{rnd.randint(0, 110)}',
+        f' */',
+        f'class {cls} : public QObject',
+        f'{{',
+        f'    Q_OBJECT',
+        f'public:',
+        f'    /**',
+        f'     * Creates a {cls}.',
+        f'     * @param parent the parent object',
+        f'     */',
+        f'    explicit {cls}(QObject *parent = nullptr);',
+        f'    ~{cls}() override;',
+        f'',
+    ]
+    for index in range(methods):
+        verb = rnd.choice(('set', 'load', 'save', 'find', 'update', 'clear', 'start'))
+        name = verb + _camel(rnd.choice(WORDS), str(index))
+        lines += [
+            f'    /**',
+            f'     * {verb.capitalize()}s the {rnd.choice(WORDS)} of this {cls}.',
+            f'     *',
+            f'     * @param value the new {rnd.choice(WORDS)}',
+            f'     * @return @c true on success',
+            f'     */',
+            f'    bool {name}(const QString &value);',
+            f'',
+        ]
+    for ns, dep in deps:
+        lines += [
+            f'    /**',
+            f'     * Returns the {ns}::{dep} used by this {cls}.',
+            f'     */',
+            f'    {ns}::{dep} *{dep[0].lower() + dep[1:]}() const;',
+            f'',
+        ]
+    lines += [
+        f'Q_SIGNALS:',
+        f'    /**',
+        f'     * Emitted when the {rnd.choice(WORDS)} changed.',
+        f'     */',
+        f'    void changed();',
+        f'}};',
+        f'',
+        f'}}',
+        f'',
+        f'#endif',
+        f'',
+    ]
+    return '\n'.join(lines)
+
+
+def generate_tree(root, repos=20, groups=2, subgroups=3, classes=10, methods=8, seed=0):
+    """Generate a synthetic source tree in `root`
+
+    Args:
+        root:      (string) the directory to create the repositories in.
+        repos:     (int) the number of repositories.
+        groups:    (int) the number of groups the repositories belong to.
+        subgroups: (int) the number of subgroups of each group.
+        classes:   (int) the number of classes of each repository.
+        methods:   (int) the number of methods of each class.
+        seed:      (int) the seed of the random generator.
+
+    Returns:
+        A dict describing the tree, with the arguments and the numbers of
+    files written.
+    """
+    rnd = random.Random(seed)
+    layout = _repo_layout(repos, groups, subgroups)
+    fancynames = {name: name.capitalize() for name, _, _ in layout}
+    classes_of = {name: [_camel(rnd.choice(WORDS), rnd.choice(WORDS), str(i)) for i in range(classes)]
+                  for name, _, _ in layout}
+    group_leaders = {}
+    headers = 0
+
+    for index, (name, group, subgroup) in enumerate(layout):
+        path = os.path.join(root, name)
+        fancyname = fancynames[name]
+
+        # Depend on a few of the repositories generated before
+        candidates = [x for x, g, _ in layout[:index] if g == group or g is None]
+        deps = rnd.sample(candidates, min(len(candidates), rnd.randint(0, 3)))
+
+        metainfo = {
+            'description': f'{fancyname} provides {rnd.choice(WORDS)} and {rnd.choice(WORDS)} classes',
+            'maintainer': f'dev{rnd.randrange(MAINTAINERS)}',
+            'type': rnd.choice(('functional', 'integration', 'solution')),
+            'platforms': [{'name': x} for x in rnd.sample(PLATFORMS, rnd.randint(1, len(PLATFORMS)))],
+            'public_lib': True,
+            'libraries': [{'cmake': f'KF::{fancyname}', 'qmake': fancyname}],
+            'cmakename': f'KF{fancyname}',
+            'dependencies': deps,
+        }
+        if group is not None:
+            metainfo['group'] = f'group{group}'
+            metainfo['subgroup'] = f'Tier {subgroup + 1}'
+            if group not in group_leaders:
+                group_leaders[group] = name
+                metainfo['group_info'] = {
+                    'fancyname': f'Synthetic Group {group}',
+                    'maintainer': 'dev0',
+                    'platforms': list(PLATFORMS),
+                    'description': f'Libraries of synthetic group {group}',
+                    'long_description': [f'Group {group} is generated by the kapidox benchmarks.'],
+                    'subgroups': [{'name': f'Tier {x + 1}', 'description': f'Tier {x + 1} libraries'}
+                                  for x in range(subgroups)],
+                }
+        _write(os.path.join(path, 'metainfo.yaml'), yaml.safe_dump(metainfo, sort_keys=False))
+        _write(os.path.join(path, 'CMakeLists.txt'), f'project({fancyname})\n')
+        _write(os.path.join(path, 'README.md'),
+               f'# {fancyname} {{#mainpage}}\n\n'
+               f'{metainfo["description"]}.\n\n'
+               f'## Introduction\n\n'
+               f'Start with {fancyname}::{classes_of[name][0]}, then read @ref {name}_usage.\n')
+        _write(os.path.join(path, 'docs', 'usage.md'),
+               f'# Using {fancyname} {{#{name}_usage}}\n\n'
+               + ''.join(f'- {fancyname}::{cls}\n' for cls in classes_of[name]))
+        for cls in classes_of[name]:
+            cls_deps = [(fancynames[x], rnd.choice(classes_of[x])) for x in deps]
+            _write(os.path.join(path, 'src', cls.lower() + '.h'),
+                   _header(rnd, fancyname, cls, cls_deps, methods))
+            headers += 1
+
+    with open(os.path.join(root, 'accounts'), 'w', encoding='utf-8') as f:
+        for index in range(MAINTAINERS):
+            f.write(f'dev{index} Developer Number{index} dev{index}@example.org\n')
+
+    return {
+        'repos': repos,
+        'groups': groups,
+        'subgroups': subgroups,
+        'classes': classes,
+        'methods': methods,
+        'seed': seed,
+        'headers': headers,
+    }
+
+
+def add_tree_arguments(parser):
+    """Add the arguments of generate_tree() to an argparse parser"""
+    group = parser.add_argument_group('synthetic tree')
+    group.add_argument('--repos', type=int, default=20,
+                       help='Number of repositories (default: 20)')
+    group.add_argument('--groups', type=int, default=2,
+                       help='Number of groups (default: 2)')
+    group.add_argument('--subgroups', type=int, default=3,
+                       help='Number of subgroups per group (default: 3)')
+    group.add_argument('--classes', type=int, default=10,
+                       help='Number of classes per repository (default: 10)')
+    group.add_argument('--methods', type=int, default=8,
+                       help='Number of methods per class (default: 8)')
+    group.add_argument('--seed', type=int, default=0,
+                       help='Seed of the random generator (default: 0)')
+
+
+def tree_arguments(args):
+    return {key: getattr(args, key) for key in ('repos', 'groups', 'subgroups', 'classes', 'methods', 'seed')}
+
+
+def main():
+    parser = argparse.ArgumentParser(description='Generate a synthetic KDE-like source tree')
+    parser.add_argument('root', help='Directory to create the tree in, must not exist')
+    add_tree_arguments(parser)
+    args = parser.parse_args()
+    if os.path.exists(args.root):
+        parser.error(f'{args.root} already exists')
+    info = generate_tree(args.root, **tree_arguments(args))
+    json.dump(info, sys.stdout, indent=2)
+    sys.stdout.write('\n')
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,125 @@
+# -*- coding: utf-8 -*-
+#
+# SPDX-License-Identifier: BSD-2-Clause
+
+"""
+Keep the external tools running at the same time within a CPU and memory
+budget
+
+Each doxygen, qdoc or dot process is started inside admit(), which waits until
+the CPUs and memory it is expected to use are available. A process expected
+to need more than the whole budget is started once nothing else runs.
+
+Doxygen runs several threads itself: threads_per_job() tells how many it may
+use so that the libraries generated at the same time, together, use the CPU
+budget without exceeding it. When libraries are generated one after the
+other, threads_per_job(jobs=1) gives each of them the whole budget.
+
+The time spent waiting in admit() is accounted to the open tracing spans, so
+that it is not mistaken for the time the process took.
+"""
+
+import logging
+import os
+import threading
+import time
+from contextlib import contextmanager
+
+from kapidox import tracing
+
+__all__ = ('configure', 'admit', 'threads_per_job', 'physical_memory_kb')
+
+# Memory a process is expected to use when it has never been measured
+DEFAULT_MEMORY_KB = 256 * 1024
+
+# Share of the physical memory used by default
+DEFAULT_MEMORY_SHARE = 0.8
+
+
+def physical_memory_kb():
+    """Returns the amount of physical memory in kB, or None if unknown"""
+    try:
+        return os.sysconf('SC_PHYS_PAGES') * os.sysconf('SC_PAGE_SIZE') // 1024
+    except (AttributeError, ValueError, OSError):
+        return None
+
+
+class Budget(object):
+    """
+    The CPUs and memory (in kB) the external tools may use. A None memory
+    budget means no limit.
+    """
+    def __init__(self, cpus, memory_kb=None, jobs=1):
+        self.cpus = max(1, cpus)
+        self.memory_kb = memory_kb
+        self.jobs = max(1, jobs)
+        self._used_cpus = 0
+        self._used_memory_kb = 0
+        self._running = 0
+        self._condition = threading.Condition()
+
+    def _fits(self, cpus, memory_kb):
+        if self._running == 0:
+            return True
+        if self._used_cpus + cpus > self.cpus:
+            return False
+        if self.memory_kb is not None and self._used_memory_kb + memory_kb > self.memory_kb:
+            return False
+        return True
+
+    @contextmanager
+    def admit(self, cpus=1, memory_kb=None, name=None):
+        """Wait until `cpus` CPUs and `memory_kb` kB of memory are available,
+        and reserve them for the block"""
+        cpus = min(cpus, self.cpus)
+        if memory_kb is None:
+            memory_kb = DEFAULT_MEMORY_KB
+        with self._condition:
+            if not self._fits(cpus, memory_kb):
+                logging.debug(f'{name or "A process"} waits for {cpus} CPU(s) and '
+                              f'{memory_kb // 1024} MiB to be available')
+                start = time.perf_counter()
+                self._condition.wait_for(lambda: self._fits(cpus, memory_kb))
+                tracing.account_wait(time.perf_counter() - start)
+            self._used_cpus += cpus
+            self._used_memory_kb += memory_kb
+            self._running += 1
+        try:
+            yield
+        finally:
+            with self._condition:
+                self._used_cpus -= cpus
+                self._used_memory_kb -= memory_kb
+                self._running -= 1
+                self._condition.notify_all()
+
+    def threads_per_job(self, jobs=None):
+        return max(1, self.cpus // (jobs or self.jobs))
+
+
+_budget = Budget(os.cpu_count() or 1)
+
+
+def configure(cpus, memory_kb=None, jobs=1):
+    """Set the budget of the external tools
+
+    Args:
+        cpus:      (int) the number of CPUs they may use.
+        memory_kb: (int) the memory they may use, in kB; None for no limit.
+        jobs:      (int) how many libraries are generated at the same time.
+    """
+    global _budget
+    _budget = Budget(cpus, memory_kb, jobs)
+
+
+def admit(cpus=1, memory_kb=None, name=None):
+    """Context manager reserving CPUs and memory for a process, see
+    Budget.admit()"""
+    return _budget.admit(cpus, memory_kb, name)
+
+
+def threads_per_job(jobs=None):
+    """Returns the number of threads a multi-threaded tool like doxygen may
+    use when `jobs` of them run at the same time, by default the number of
+    jobs the budget was configured with"""
+    return _budget.threads_per_job(jobs)
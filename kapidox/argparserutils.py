@@ -9,11 +9,34 @@ import logging
 import os
 import sys
 
+from . import admission, utils
+
 
 def normalized_path(inputpath):
     return os.path.normpath(inputpath)
 
 
+def memory_size(txt):
+    """Parse a size like 512M or 8G into kB"""
+    units = {'K': 1, 'M': 1024, 'G': 1024 ** 2, 'T': 1024 ** 3}
+    txt = txt.strip().upper().rstrip('B')
+    unit = 1024
+    if txt and txt[-1] in units:
+        unit = units[txt[-1]]
+        txt = txt[:-1]
+    try:
+        return int(float(txt) * unit)
+    except ValueError:
+        raise argparse.ArgumentTypeError(f'invalid size: {txt!r}')
+
+
+def default_max_memory():
+    memory = admission.physical_memory_kb()
+    if memory is None:
+        return None
+    return int(memory * admission.DEFAULT_MEMORY_SHARE)
+
+
 def parse_args(depdiagram_available):
     import textwrap
     parser = argparse.ArgumentParser(
@@ -28,6 +51,9 @@ def parse_args(depdiagram_available):
     group.add_argument('--depdiagram-dot-dir', type=normalized_path,
                        help='Generate dependency diagrams, using the .dot files from DIR.',
                        metavar="DIR")
+    group.add_argument('--depdiagram-format', choices=('png', 'svg'), default='png',
+                       help='Format of the dependency diagrams. SVG diagrams are '
+                            'faster to generate, smaller and scale better.')
     add_output_group(parser)
     add_qt_doc_group(parser)
     add_paths_group(parser)
@@ -36,9 +62,8 @@ def parse_args(depdiagram_available):
     check_common_args(args)
 
     if args.depdiagram_dot_dir and not depdiagram_available:
-        logging.error('You need to install the Graphviz Python bindings to '
-                      'generate dependency diagrams.\n'
-                      'See <https://www.graphviz.org/download/>.')
+        logging.error('The kapidox.depdiagram module could not be loaded, '
+                      'dependency diagrams cannot be generated.')
         exit(1)
 
     if not os.path.isdir(args.sourcesdir):
@@ -86,8 +111,11 @@ def add_paths_group(parser):
     group = parser.add_argument_group('paths')
     group.add_argument('--doxygen', default='doxygen', type=normalized_path,
                        help='(Path to) the doxygen executable.')
-    group.add_argument('--qhelpgenerator', default='qhelpgenerator', type=normalized_path,
-                       help='(Path to) the qhelpgenerator executable.')
+    group.add_argument('--qhelpgenerator', default=utils.find_qhelpgenerator(), type=normalized_path,
+                       help='(Path to) the qhelpgenerator executable (default: '
+                            'qhelpgenerator-qt5 if found, else qhelpgenerator).')
+    group.add_argument('--qdoc', default='qdoc', type=normalized_path,
+                       help='(Path to) the qdoc executable.')
     return group
 
 
@@ -100,6 +128,35 @@ def add_misc_group(parser):
                        help='Location of the HTML header files and support graphics.')
     group.add_argument('--keep-temp-dirs', action='store_true',
                        help='Do not delete temporary dirs, useful for debugging.')
+    group.add_argument('-j', '--jobs', type=int, default=os.cpu_count() or 1,
+                       help='Maximum number of libraries to rebuild, and of external '
+                            'tools (like dot) to run, at the same time (default: number '
+                            'of CPUs).')
+    group.add_argument('--max-cpus', metavar='N', type=int, default=os.cpu_count() or 1,
+                       help='Number of CPUs the external tools may use together '
+                            '(default: number of CPUs). Doxygen threads count.')
+    group.add_argument('--max-memory', metavar='SIZE', type=memory_size,
+                       default=default_max_memory(),
+                       help='Memory the external tools may use together, like 8G or '
+                            '512M (default: 80%% of the physical memory). Processes are '
+                            'expected to use as much memory as in previous runs.')
+    group.add_argument('--trace', metavar='FILE', type=normalized_path,
+                       help='Write the time spent in each stage and library to FILE, '
+                            'in Chrome trace event format (see chrome://tracing), '
+                            'and log a summary at the end.')
+    group.add_argument('--profile', metavar='STAGES', type=lambda x: x.split(','),
+                       help='Profile the Python code of the comma-separated STAGES '
+                            '("tag files", "discovery", "diagrams", "pass one", '
+                            '"pass two", "indexing", "qch", generator functions like '
+                            '"indexer", or "all") with cProfile.')
+    group.add_argument('--profile-dir', metavar='DIR', type=normalized_path,
+                       help='Where to write the profiles: one .pstats file per '
+                            'stage and a report.txt of the slowest functions '
+                            '(default: the profile directory of the kapidox cache, '
+                            'outside of the generated documentation).')
+    group.add_argument('--profile-top', metavar='N', type=int, default=30,
+                       help='Number of functions listed in the profile report '
+                            '(default: %(default)s).')
     return parser
 
 
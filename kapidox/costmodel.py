@@ -0,0 +1,188 @@
+# -*- coding: utf-8 -*-
+#
+# SPDX-License-Identifier: BSD-2-Clause
+
+"""
+Remember how long each library took to generate
+
+The time and peak memory of each stage of each library are stored in a SQLite
+database in utils.cache_dir(): the Doxygen runs of pass one ("doxygen-pass1")
+and pass two ("doxygen-pass2"), which take very different times since the
+second one reads the tag files of all the dependencies, the postprocessing
+("postprocess") and the dependency diagram ("diagram"). The next
+runs use them to start the most expensive libraries first, and to estimate
+when the run will end.
+"""
+
+import logging
+import os
+import sqlite3
+import statistics
+import threading
+import time
+
+from kapidox import utils
+
+DATABASE = 'costs.sqlite'
+
+SCHEMA = """
+CREATE TABLE IF NOT EXISTS timings (
+    library TEXT NOT NULL,
+    stage TEXT NOT NULL,
+    seconds REAL NOT NULL,
+    maxrss_kb INTEGER NOT NULL,
+    recorded_at REAL NOT NULL
+);
+CREATE INDEX IF NOT EXISTS timings_library ON timings (library, stage, recorded_at);
+"""
+
+# Number of runs kept for each library and stage
+HISTORY = 5
+
+# Cost of a stage when no library has a history yet, in seconds
+DEFAULT_COST = 1.
+
+
+def format_duration(seconds):
+    seconds = int(round(seconds))
+    if seconds < 60:
+        return f'{seconds}s'
+    minutes, seconds = divmod(seconds, 60)
+    if minutes < 60:
+        return f'{minutes}m{seconds:02}s'
+    hours, minutes = divmod(minutes, 60)
+    return f'{hours}h{minutes:02}m'
+
+
+class CostModel(object):
+    """
+    The timings of the previous runs
+
+    Libraries are identified by their output directory, which is unique. All
+    the methods can be called from several threads.
+    """
+    def __init__(self, path=None):
+        if path is None:
+            path = os.path.join(utils.cache_dir(), DATABASE)
+        self._lock = threading.Lock()
+        try:
+            self._db = sqlite3.connect(path, check_same_thread=False)
+            self._db.executescript(SCHEMA)
+        except sqlite3.Error as exc:
+            logging.warning(f'Could not open {path}, timings will not be kept: {exc}')
+            self._db = sqlite3.connect(':memory:', check_same_thread=False)
+            self._db.executescript(SCHEMA)
+
+    def record(self, lib, stage, seconds, maxrss_kb=0):
+        """Store the time and peak memory `stage` took for `lib`"""
+        with self._lock:
+            try:
+                with self._db:
+                    self._db.execute(
+                        'INSERT INTO timings VALUES (?, ?, ?, ?, ?)',
+                        (lib.outputdir, stage, seconds, maxrss_kb, time.time()))
+            except sqlite3.Error as exc:
+                logging.warning(f'Could not record the timings of {lib.fancyname}: {exc}')
+
+    def _history(self, lib, stage):
+        with self._lock:
+            return self._db.execute(
+                'SELECT seconds, maxrss_kb FROM timings WHERE library = ? AND stage = ?'
+                ' ORDER BY recorded_at DESC LIMIT ?',
+                (lib.outputdir, stage, HISTORY)).fetchall()
+
+    def estimate(self, lib, stages):
+        """Returns the expected duration of `stages` for `lib` in seconds, or
+        None if one of them has never been recorded"""
+        total = 0.
+        for stage in stages:
+            rows = self._history(lib, stage)
+            if not rows:
+                return None
+            total += statistics.mean(x[0] for x in rows)
+        return total
+
+    def estimate_maxrss(self, lib, stage):
+        """Returns the largest peak memory recently used by `stage` for `lib`
+        in kB, or None if it has never been recorded"""
+        rows = self._history(lib, stage)
+        if not rows:
+            return None
+        return max(x[1] for x in rows)
+
+    def estimate_all(self, libraries, stages):
+        """Returns a dict of library => expected duration of `stages`
+
+        Libraries without history are expected to take the median duration of
+        the others.
+        """
+        estimates = {lib: self.estimate(lib, stages) for lib in libraries}
+        known = [x for x in estimates.values() if x is not None]
+        default = statistics.median(known) if known else DEFAULT_COST * len(stages)
+        return {lib: default if cost is None else cost for lib, cost in estimates.items()}
+
+    def close(self):
+        """Forget all but the HISTORY last runs, and close the database"""
+        with self._lock:
+            try:
+                with self._db:
+                    self._db.execute(
+                        'DELETE FROM timings WHERE rowid IN ('
+                        ' SELECT rowid FROM ('
+                        '  SELECT rowid, ROW_NUMBER() OVER ('
+                        '   PARTITION BY library, stage ORDER BY recorded_at DESC) AS n'
+                        '  FROM timings)'
+                        ' WHERE n > ?)', (HISTORY,))
+            except sqlite3.Error as exc:
+                logging.warning(f'Could not prune the timings: {exc}')
+            self._db.close()
+
+
+def schedule(libraries, estimates):
+    """Returns `libraries`, the most expensive first
+
+    When libraries are spread over several workers, starting with the longest
+    ones (LPT scheduling) avoids ending the run waiting for a long library
+    started last.
+    """
+    return sorted(libraries, key=lambda x: estimates[x], reverse=True)
+
+
+class Progress(object):
+    """
+    Logs the progress of a stage, with an estimated time of arrival
+
+    The ETA is computed from the expected durations of the remaining
+    libraries, corrected by how fast the finished ones went compared to their
+    expected durations.
+    """
+    def __init__(self, title, estimates, workers=1):
+        self._title = title
+        self._estimates = dict(estimates)
+        self._workers = workers
+        self._done = []
+        self._start = time.perf_counter()
+        self._lock = threading.Lock()
+
+    def eta(self):
+        """Returns the expected remaining time in seconds"""
+        with self._lock:
+            remaining = sum(cost for lib, cost in self._estimates.items() if lib not in self._done)
+            expected_done = sum(self._estimates[x] for x in self._done)
+            elapsed = time.perf_counter() - self._start
+        if expected_done > 0:
+            remaining *= elapsed / expected_done
+        else:
+            remaining /= self._workers
+        return remaining
+
+    def log(self, lib, action):
+        """Log that `action` happened to `lib`, like 'Generating doc for'"""
+        with self._lock:
+            count = len(self._done)
+        logging.info(f'# [{count}/{len(self._estimates)}] {action} {lib.fancyname}'
+                     f' ({self._title}, ETA {format_duration(self.eta())})')
+
+    def done(self, lib):
+        with self._lock:
+            self._done.append(lib)
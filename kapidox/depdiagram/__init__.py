@@ -1 +1,2 @@
 from kapidox.depdiagram.generate import *
+from kapidox.depdiagram.render import *
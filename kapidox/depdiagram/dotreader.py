@@ -0,0 +1,187 @@
+# -*- coding: utf-8 -*-
+#
+# SPDX-License-Identifier: BSD-2-Clause
+
+"""
+A small reader for the Graphviz files generated by CMake's --graphviz option
+
+It understands the subset of the DOT language CMake uses: graph, node and
+edge statements, attribute lists, default attributes, subgraphs and comments.
+HTML labels, ports and edges between subgraphs are not supported.
+"""
+
+import re
+
+
+class ParseError(Exception):
+    pass
+
+
+class DotGraph(object):
+    """
+    The nodes and edges of a graph
+
+    `nodes` is a dict of node name => dict of attributes, in the order nodes
+    are first seen. `edges` is a list of (tail, head, attributes) tuples.
+    """
+    def __init__(self, name=None):
+        self.name = name
+        self.nodes = {}
+        self.edges = []
+
+    def add_node(self, name, defaults, attrs=None):
+        node_attrs = self.nodes.get(name)
+        if node_attrs is None:
+            node_attrs = dict(defaults)
+            self.nodes[name] = node_attrs
+        if attrs:
+            node_attrs.update(attrs)
+
+
+_TOKEN_RX = re.compile(r"""
+      (?P<ws>\s+)
+    | (?P<comment>//[^\n]*|/\*.*?\*/|^[ \t]*\#[^\n]*)
+    | (?P<string>"(?:[^"\\]|\\.)*")
+    | (?P<id>[A-Za-z_\x80-\uffff][\w\x80-\uffff]*|-?(?:\.\d+|\d+(?:\.\d*)?))
+    | (?P<op>->|--|[{}\[\]=;,:])
+    """, re.VERBOSE | re.DOTALL | re.MULTILINE)
+
+_KEYWORDS = {"strict", "graph", "digraph", "node", "edge", "subgraph"}
+
+
+def _tokenize(txt):
+    # Yields (kind, value) pairs, with kind being "id", "keyword" or the
+    # operator itself. Quoted strings are returned unquoted as ids.
+    pos = 0
+    length = len(txt)
+    while pos < length:
+        match = _TOKEN_RX.match(txt, pos)
+        if match is None:
+            line = txt.count("\n", 0, pos) + 1
+            raise ParseError(f"Unexpected character {txt[pos]!r} on line {line}")
+        pos = match.end()
+        kind = match.lastgroup
+        value = match.group(kind)
+        if kind in ("ws", "comment"):
+            continue
+        if kind == "string":
+            yield "id", value[1:-1].replace('\\"', '"').replace("\\\n", "")
+        elif kind == "id":
+            lower = value.lower()
+            if lower in _KEYWORDS:
+                yield "keyword", lower
+            else:
+                yield "id", value
+        else:
+            yield value, value
+    yield "eof", None
+
+
+class _Parser(object):
+    def __init__(self, txt):
+        self._tokens = _tokenize(txt)
+        self._next()
+
+    def _next(self):
+        self._kind, self._value = next(self._tokens)
+
+    def _accept(self, kind, value=None):
+        if self._kind == kind and (value is None or self._value == value):
+            token = self._value
+            self._next()
+            return token
+        return None
+
+    def _expect(self, kind, value=None):
+        token = self._accept(kind, value)
+        if token is None:
+            raise ParseError(f"Expected {value or kind}, got {self._value or self._kind!r}")
+        return token
+
+    def parse(self):
+        self._accept("keyword", "strict")
+        if not (self._accept("keyword", "digraph") or self._accept("keyword", "graph")):
+            raise ParseError("Not a graph")
+        graph = DotGraph(self._accept("id"))
+        self._expect("{")
+        self._parse_stmt_list(graph, {})
+        self._expect("}")
+        if self._kind != "eof":
+            raise ParseError(f"Unexpected {self._value!r} after the graph")
+        return graph
+
+    def _parse_stmt_list(self, graph, node_defaults):
+        # Default node attributes only apply to the current (sub)graph
+        node_defaults = dict(node_defaults)
+        while self._kind != "}":
+            self._parse_stmt(graph, node_defaults)
+            self._accept(";")
+
+    def _parse_stmt(self, graph, node_defaults):
+        if self._kind == "keyword":
+            keyword = self._value
+            if keyword in ("graph", "edge"):
+                self._next()
+                self._parse_attr_list()
+                return
+            if keyword == "node":
+                self._next()
+                node_defaults.update(self._parse_attr_list())
+                return
+            if keyword == "subgraph":
+                self._next()
+                self._accept("id")
+                self._parse_subgraph(graph, node_defaults)
+                return
+            raise ParseError(f"Unexpected keyword {keyword!r}")
+
+        if self._kind == "{":
+            self._parse_subgraph(graph, node_defaults)
+            return
+
+        name = self._expect("id")
+        if self._accept("="):
+            # Graph attribute
+            self._expect("id")
+            return
+
+        names = [name]
+        while self._kind in ("->", "--"):
+            self._next()
+            names.append(self._expect("id"))
+        attrs = self._parse_attr_list() if self._kind == "[" else {}
+
+        if len(names) == 1:
+            graph.add_node(name, node_defaults, attrs)
+            return
+        for node in names:
+            graph.add_node(node, node_defaults)
+        for tail, head in zip(names, names[1:]):
+            graph.edges.append((tail, head, attrs))
+
+    def _parse_subgraph(self, graph, node_defaults):
+        self._expect("{")
+        self._parse_stmt_list(graph, node_defaults)
+        self._expect("}")
+
+    def _parse_attr_list(self):
+        attrs = {}
+        while self._accept("["):
+            while not self._accept("]"):
+                key = self._expect("id")
+                self._expect("=")
+                attrs[key] = self._expect("id")
+                if not self._accept(","):
+                    self._accept(";")
+        return attrs
+
+
+def parse(txt):
+    """Parse the DOT source `txt` and return a DotGraph"""
+    return _Parser(txt).parse()
+
+
+def read(path):
+    """Parse the DOT file at `path` and return a DotGraph"""
+    with open(path) as f:
+        return parse(f.read())
@@ -60,5 +60,22 @@ class Framework(object):
         # framework-to-framework dependency
         return self._fw_list
 
+    def to_dict(self):
+        # Returns a JSON-serializable representation of the framework
+        return {
+            "tier": self.tier,
+            "name": self.name,
+            "targets": {target: sorted(deps) for target, deps in self._target_dict.items()},
+            "extra_frameworks": self._fw_list,
+        }
+
+    @staticmethod
+    def from_dict(dct):
+        # Creates a framework from the output of to_dict()
+        fw = Framework(dct["tier"], dct["name"])
+        fw._target_dict = {target: set(deps) for target, deps in dct["targets"].items()}
+        fw._fw_list = list(dct["extra_frameworks"])
+        return fw
+
     def __repr__(self):
         return self.name
@@ -6,13 +6,14 @@
 
 import logging
 import fnmatch
+import hashlib
+import json
 import os
-import re
 
-import gv
 import yaml
 
-from kapidox.depdiagram import gvutils
+from kapidox import tracing, utils
+from kapidox.depdiagram import dotreader
 from kapidox.depdiagram.framework import Framework
 
 
@@ -25,6 +26,10 @@ TARGET_SHAPES = [
 
 DEPS_SHAPE = "ellipse"
 
+# Bump this when changing how dot files are parsed, to invalidate the
+# frameworks already in the cache
+CACHE_VERSION = 2
+
 DEPS_BLACKLIST = [
     "-l*", "-W*", # link flags
     "/*", # absolute dirs
@@ -34,9 +39,11 @@ DEPS_BLACKLIST = [
 
 
 def preprocess(fname):
-    graph_handle = gv.read(fname)
-    txt = open(fname).read()
-    targets = []
+    """
+    Read a dot file generated by CMake and return a DotGraph whose nodes are
+    named after their label.
+    """
+    graph = dotreader.read(fname)
 
     # Replace the generated node names with their label. CMake generates a graph
     # like this:
@@ -53,12 +60,13 @@ def preprocess(fname):
     #
     # Using real framework names as labels makes it possible to merge multiple
     # .dot files.
-    for node_handle in gvutils.get_node_list(graph_handle):
-        node = gvutils.Node(node_handle)
-        label = node.label.replace("KF5::", "")
-        if node.shape in TARGET_SHAPES:
-            targets.append(label)
-        txt = txt.replace('"' + node.name + '"', '"' + label + '"')
+    labels = {}
+    targets = set()
+    for name, attrs in graph.nodes.items():
+        label = attrs.get("label", name).replace("KF5::", "")
+        labels[name] = label
+        if attrs.get("shape") in TARGET_SHAPES:
+            targets.add(label)
 
     # Sometimes cmake will generate an entry for the target alias, something
     # like this:
@@ -70,10 +78,18 @@ def preprocess(fname):
     #
     # After our node renaming, this ends up with a second "KParts" node
     # definition, which we need to get rid of.
-    for target in targets:
-        rx = r' *"' + target + '".*label="KF5::' + target + '".*shape="ellipse".*;'
-        txt = re.sub(rx, '', txt)
-    return txt
+    renamed = dotreader.DotGraph(graph.name)
+    for name, attrs in graph.nodes.items():
+        label = labels[name]
+        if (label in targets and attrs.get("label") == "KF5::" + label
+                and attrs.get("shape") == DEPS_SHAPE):
+            renamed.add_node(label, {})
+        else:
+            renamed.add_node(label, {}, attrs)
+
+    for tail, head, attrs in graph.edges:
+        renamed.edges.append((labels[tail], labels[head], attrs))
+    return renamed
 
 
 def _add_extra_dependencies(fw, dct):
@@ -93,103 +109,185 @@ class DotFileParser(object):
         fw = Framework(tier, name)
 
         # Preprocess dot files so that they can be merged together.
-        dot_data =  preprocess(dot_file)
-        self._init_fw_from_dot_data(fw, dot_data, self._with_qt)
+        graph = preprocess(dot_file)
+        self._init_fw_from_dot_data(fw, graph, self._with_qt)
 
         return fw
 
-    def _init_fw_from_dot_data(self, fw, dot_data, with_qt):
-        def target_from_node(node):
-            return node.name.replace("KF5", "")
-
-        src_handle = gv.readstring(dot_data)
+    def _init_fw_from_dot_data(self, fw, graph, with_qt):
+        def target_from_node(name):
+            return name.replace("KF5", "")
 
         targets = set()
-        for node_handle in gvutils.get_node_list(src_handle):
-            node = gvutils.Node(node_handle)
-            if node.shape in TARGET_SHAPES and self._want(node):
-                target = target_from_node(node)
+        for name, attrs in graph.nodes.items():
+            shape = attrs.get("shape")
+            if shape in TARGET_SHAPES and self._want(name, shape):
+                target = target_from_node(name)
                 targets.add(target)
                 fw.add_target(target)
 
-        for edge_handle in gvutils.get_edge_list(src_handle):
-            edge = gvutils.Edge(edge_handle)
-            target = target_from_node(edge.tail)
-            if target in targets and self._want(edge.head):
-                dep_target = target_from_node(edge.head)
+        for tail, head, _ in graph.edges:
+            target = target_from_node(tail)
+            if target in targets and self._want(head, graph.nodes[head].get("shape")):
+                dep_target = target_from_node(head)
                 fw.add_target_dependency(target, dep_target)
 
-    def _want(self, node):
-        if node.shape not in TARGET_SHAPES and node.shape != DEPS_SHAPE:
+    def _want(self, name, shape):
+        if shape not in TARGET_SHAPES and shape != DEPS_SHAPE:
             return False
-        name = node.name
 
         for pattern in DEPS_BLACKLIST:
-            if fnmatch.fnmatchcase(node.name, pattern):
+            if fnmatch.fnmatchcase(name, pattern):
                 return False
         if not self._with_qt and name.startswith("Qt"):
             return False
         return True
 
 
+class FrameworkCache(object):
+    """
+    Stores the frameworks parsed from dot and yaml files, so that unchanged
+    files do not have to be parsed again on the next run
+    """
+    def __init__(self, cache_dir, with_qt):
+        self._cache_dir = cache_dir
+        self._with_qt = with_qt
+
+    def _path(self, dot_file, yaml_file):
+        key = "|".join([
+            str(CACHE_VERSION),
+            str(self._with_qt),
+            os.path.basename(dot_file),
+            utils.file_digest(dot_file),
+            utils.file_digest(yaml_file),
+        ])
+        return os.path.join(self._cache_dir, hashlib.sha256(key.encode()).hexdigest() + ".json")
+
+    def load(self, dot_file, yaml_file):
+        """
+        Returns a pair (found, fw). `fw` is None if the files do not describe
+        a framework.
+        """
+        try:
+            with open(self._path(dot_file, yaml_file)) as f:
+                dct = json.load(f)
+        except (OSError, ValueError):
+            return False, None
+        if dct is None:
+            return True, None
+        return True, Framework.from_dict(dct)
+
+    def store(self, dot_file, yaml_file, fw):
+        path = self._path(dot_file, yaml_file)
+        try:
+            os.makedirs(self._cache_dir, exist_ok=True)
+            with open(path + ".new", "w") as f:
+                json.dump(fw.to_dict() if fw is not None else None, f)
+            os.replace(path + ".new", path)
+        except OSError as exc:
+            logging.warning(f"Could not cache the framework of {dot_file}: {exc}")
+
+
 class FrameworkDb(object):
     def __init__(self):
         self._fw_list = []
         self._fw_for_target = {}
+        self._fw_by_name = {}
 
-    def populate(self, dot_files, with_qt=False):
+    @tracing.traced('FrameworkDb.populate', 'depdiagram')
+    def populate(self, dot_files, with_qt=False, use_cache=True):
         """
         Init db from dot files
+
+        If `use_cache` is True, frameworks whose dot and yaml files did not
+        change since a previous run are loaded from utils.cache_dir() instead
+        of being parsed again.
         """
         parser = DotFileParser(with_qt)
+        cache = None
+        if use_cache:
+            cache = FrameworkCache(os.path.join(utils.cache_dir(), "depdiagram"), with_qt)
         for dot_file in dot_files:
             yaml_file = dot_file.replace(".dot", ".yaml")
-            with open(yaml_file) as f:
-                dct = yaml.safe_load(f)
+            if cache:
+                found, fw = cache.load(dot_file, yaml_file)
+                if found:
+                    if fw is not None:
+                        self._fw_list.append(fw)
+                    continue
 
-            if 'tier' not in dct:
-                # This mean it's not a frameworks
-                continue
+            fw = self._parse(parser, dot_file, yaml_file)
+            if cache:
+                cache.store(dot_file, yaml_file, fw)
+            if fw is not None:
+                self._fw_list.append(fw)
+        self._update_indexes()
 
-            tier = dct["tier"]
-            fw = parser.parse(tier, dot_file)
+    def _parse(self, parser, dot_file, yaml_file):
+        with open(yaml_file) as f:
+            dct = yaml.safe_load(f)
 
-            _add_extra_dependencies(fw, dct)
-            self._fw_list.append(fw)
-        self._update_fw_for_target()
+        if 'tier' not in dct:
+            # This mean it's not a frameworks
+            return None
 
-    def _update_fw_for_target(self):
+        tier = dct["tier"]
+        fw = parser.parse(tier, dot_file)
+
+        _add_extra_dependencies(fw, dct)
+        return fw
+
+    def _update_indexes(self):
         self._fw_for_target = {}
+        self._fw_by_name = {}
         for fw in self._fw_list:
+            self._fw_by_name.setdefault(fw.name, fw)
             for target in fw.get_targets():
                 self._fw_for_target[target] = fw
 
     def find_by_name(self, name):
-        for fw in self._fw_list:
-            if fw.name == name:
-                return fw
-        return None
-
-    def remove_unused_frameworks(self, wanted_fw):
-        def add_to_set(fw_set, wanted_fw):
-            fw_set.add(wanted_fw)
+        return self._fw_by_name.get(name)
 
-            for target in wanted_fw.get_all_target_dependencies():
+    def dependency_closure(self, wanted_fw):
+        """
+        Returns the set of frameworks `wanted_fw` depends on, directly or not,
+        including `wanted_fw` itself
+        """
+        fw_set = {wanted_fw}
+        todo = [wanted_fw]
+        while todo:
+            current_fw = todo.pop()
+            deps = []
+            for target in current_fw.get_all_target_dependencies():
                 fw = self._fw_for_target.get(target)
-                if fw is not None and not fw in fw_set:
-                    add_to_set(fw_set, fw)
+                if fw is not None:
+                    deps.append(fw)
 
-            for fw_name in wanted_fw.get_extra_frameworks():
-                fw = self.find_by_name(fw_name)
+            for fw_name in current_fw.get_extra_frameworks():
+                fw = self._fw_by_name.get(fw_name)
                 if not fw:
-                    logging.warning(f"Framework {wanted_fw} has an extra dependency on {fw_name}, but there is no such framework")
+                    logging.warning(f"Framework {current_fw} has an extra dependency on {fw_name}, but there is no such framework")
                     continue
-                if not fw in fw_set:
-                    add_to_set(fw_set, fw)
+                deps.append(fw)
+
+            for fw in deps:
+                if fw not in fw_set:
+                    fw_set.add(fw)
+                    todo.append(fw)
+        return fw_set
 
-        fw_set = set()
-        add_to_set(fw_set, wanted_fw)
-        self._fw_list = list(fw_set)
+    def filtered(self, wanted_fw):
+        """
+        Returns a db containing only `wanted_fw` and the frameworks it depends
+        on. It shares its indexes and frameworks with this db, which is not
+        modified.
+        """
+        fw_set = self.dependency_closure(wanted_fw)
+        db = FrameworkDb()
+        db._fw_list = [x for x in self._fw_list if x in fw_set]
+        db._fw_for_target = self._fw_for_target
+        db._fw_by_name = self._fw_by_name
+        return db
 
     def find_external_targets(self):
         all_targets = set([])
@@ -4,15 +4,15 @@
 #
 # SPDX-License-Identifier: BSD-2-Clause
 
+import heapq
 import logging
 import itertools
-from functools import cmp_to_key
 
 from kapidox.depdiagram.block import Block, quote
 from kapidox.depdiagram.framework import Framework
 from kapidox.depdiagram.frameworkdb import FrameworkDb
 
-__all__ = ('generate',)
+__all__ = ('generate', 'FrameworkDb')
 
 ROOT_NODE_ATTRS = dict(fontsize=12, shape="box")
 
@@ -32,10 +32,18 @@ FW_TARGET_ATTRS = dict(style="filled", fillcolor="paleturquoise")
 WANTED_FW_ATTRS = dict(penwidth=2)
 
 class FrameworkCmp(object):
+    """
+    Orders frameworks so that frameworks come after the frameworks they depend
+    on, directly or not.
+
+    The frameworks each framework depends on are computed once and memoized,
+    so comparing or sorting frameworks does not walk the dependency graph
+    again.
+    """
     def __init__(self, db):
         self.db = db
-        self.src = set(db)
-        self.dst = []
+        self._direct_deps = {}
+        self._reachable = {}
 
     def __call__(self, fw1, fw2):
         if self.depends_on(fw1, fw2):
@@ -45,28 +53,215 @@ class FrameworkCmp(object):
         return 0
 
     def depends_on(self, depender_fw, provider_fw):
-        for dep_target in depender_fw.get_all_target_dependencies():
-            if provider_fw.has_target(dep_target):
-                return True
-
-            try:
-                dep_fw = self.db.get_framework_for_target(dep_target)
-            except KeyError:
-                # No framework for this target, must be an external dependency,
-                # carry on
-                continue
-            if dep_fw != depender_fw and self.depends_on(dep_fw, provider_fw):
-                return True
+        return provider_fw in self.reachable(depender_fw)
+
+    def direct_dependencies(self, fw):
+        deps = self._direct_deps.get(fw)
+        if deps is None:
+            deps = set()
+            for dep_target in fw.get_all_target_dependencies():
+                try:
+                    dep_fw = self.db.get_framework_for_target(dep_target)
+                except KeyError:
+                    # No framework for this target, must be an external
+                    # dependency, carry on
+                    continue
+                deps.add(dep_fw)
+            self._direct_deps[fw] = deps
+        return deps
+
+    def reachable(self, fw):
+        """
+        Returns the set of frameworks `fw` depends on, directly or not
+        """
+        reachable = self._reachable.get(fw)
+        if reachable is None:
+            reachable = set()
+            todo = list(self.direct_dependencies(fw))
+            while todo:
+                dep_fw = todo.pop()
+                if dep_fw in reachable:
+                    continue
+                reachable.add(dep_fw)
+                known = self._reachable.get(dep_fw)
+                if known is not None:
+                    reachable.update(known)
+                else:
+                    todo.extend(self.direct_dependencies(dep_fw))
+            self._reachable[fw] = reachable
+        return reachable
+
+    def sort(self, frameworks):
+        """
+        Returns `frameworks` sorted so that each framework comes after the
+        frameworks of the list it depends on. Frameworks which do not depend
+        on each other are sorted by name, so the order is deterministic.
+        """
+        frameworks = sorted(frameworks, key=lambda x: x.name)
+        members = set(frameworks)
+        pending = {}
+        dependers = {fw: [] for fw in frameworks}
+        for fw in frameworks:
+            providers = [x for x in self.reachable(fw) if x in members and x != fw]
+            pending[fw] = len(providers)
+            for provider in providers:
+                dependers[provider].append(fw)
+
+        index = {fw: idx for idx, fw in enumerate(frameworks)}
+        ready = [index[fw] for fw in frameworks if pending[fw] == 0]
+        heapq.heapify(ready)
+        result = []
+        while len(result) < len(frameworks):
+            if not ready:
+                # Dependency cycle: release the first framework of the cycle
+                fw = min((x for x in frameworks if pending[x] > 0), key=lambda x: (pending[x], index[x]))
+                pending[fw] = 0
+                ready.append(index[fw])
+            fw = frameworks[heapq.heappop(ready)]
+            pending[fw] = -1
+            result.append(fw)
+            for depender in dependers[fw]:
+                if pending[depender] > 0:
+                    pending[depender] -= 1
+                    if pending[depender] == 0:
+                        heapq.heappush(ready, index[depender])
+        return result
+
+
+def _strongly_connected_components(graph):
+    """
+    Returns the strongly connected components of `graph` as a list of sets,
+    each component coming after the components it has edges to.
+
+    This is Tarjan's algorithm, without recursion so that long dependency
+    chains do not hit the recursion limit.
+    """
+    index = {}
+    lowlink = {}
+    stack = []
+    on_stack = set()
+    components = []
+    for root in graph:
+        if root in index:
+            continue
+        index[root] = lowlink[root] = len(index)
+        stack.append(root)
+        on_stack.add(root)
+        work = [(root, iter(graph.get(root, ())))]
+        while work:
+            node, succs = work[-1]
+            for succ in succs:
+                if succ not in index:
+                    index[succ] = lowlink[succ] = len(index)
+                    stack.append(succ)
+                    on_stack.add(succ)
+                    work.append((succ, iter(graph.get(succ, ()))))
+                    break
+                if succ in on_stack:
+                    lowlink[node] = min(lowlink[node], index[succ])
+            else:
+                work.pop()
+                if work:
+                    parent = work[-1][0]
+                    lowlink[parent] = min(lowlink[parent], lowlink[node])
+                if lowlink[node] == index[node]:
+                    component = set()
+                    while True:
+                        member = stack.pop()
+                        on_stack.discard(member)
+                        component.add(member)
+                        if member == node:
+                            break
+                    components.append(component)
+    return components
+
 
-        return False
+def transitive_reduction(graph):
+    """
+    Returns a copy of `graph` without the edges implied by other paths, like
+    Graphviz's tred tool does.
+
+    `graph` is a dict of node => set of nodes it has an edge to. Nodes which
+    are part of the same cycle are handled as a single node: edges between
+    them are all kept, and of the edges going from one cycle, or node, to
+    another, only one is kept, unless that connection is implied by other
+    paths. The kept edge is the first one in name order, so the result is
+    deterministic.
+    """
+    components = _strongly_connected_components(graph)
+    component_of = {}
+    for idx, component in enumerate(components):
+        for node in component:
+            component_of[node] = idx
+
+    # Edges between components, and the node edges they stand for
+    component_succs = [set() for _ in components]
+    node_edges = {}
+    for node, succs in graph.items():
+        for succ in succs:
+            src, dst = component_of[node], component_of[succ]
+            if src != dst:
+                component_succs[src].add(dst)
+                node_edges.setdefault((src, dst), []).append((node, succ))
+
+    # Components come after the components they have edges to, so the ones
+    # reachable from each component are known when it is reached
+    reachable = []
+    for succs in component_succs:
+        result = set(succs)
+        for succ in succs:
+            result.update(reachable[succ])
+        reachable.append(result)
+
+    reduced = {node: set() for node in graph}
+    for node, succs in graph.items():
+        for succ in succs:
+            if component_of[node] == component_of[succ]:
+                reduced[node].add(succ)
+    for src, succs in enumerate(component_succs):
+        for dst in succs:
+            if any(dst in reachable[other] for other in succs if other != dst):
+                continue
+            node, succ = min(node_edges[(src, dst)], key=lambda x: (str(x[0]), str(x[1])))
+            reduced[node].add(succ)
+    return reduced
 
 
 class DotWriter(Block):
-    def __init__(self, db, out, wanted_fw=None, detailed=False):
+    def __init__(self, db, out, wanted_fw=None, detailed=False, simplify=False):
         Block.__init__(self, out)
         self.db = db
         self.detailed = detailed
         self.wanted_fw = wanted_fw
+        if detailed:
+            self.edges = self.get_target_edges()
+        else:
+            self.edges = self.get_framework_edges()
+        if simplify:
+            self.edges = transitive_reduction(self.edges)
+
+    def get_framework_edges(self):
+        edges = {}
+        for fw in self.db:
+            deps = set()
+            for target in fw.get_all_target_dependencies():
+                try:
+                    target_fw = self.db.get_framework_for_target(target)
+                    if fw == target_fw:
+                        continue
+                    deps.add(target_fw.name)
+                except KeyError:
+                    deps.add(target)
+            deps.update(fw.get_extra_frameworks())
+            edges[fw.name] = deps
+        return edges
+
+    def get_target_edges(self):
+        edges = {}
+        for fw in self.db:
+            for target in fw.get_targets():
+                edges[target] = set(fw.get_dependencies_for_target(target))
+        return edges
 
     def write(self):
         with self.curly_block("digraph Root") as root:
@@ -86,6 +281,7 @@ class DotWriter(Block):
                     b.write_list_attrs("node", **OTHER_ATTRS)
                     b.write_nodes(other_targets)
 
+            fw_cmp = FrameworkCmp(self.db)
             lst = sorted([x for x in self.db], key=lambda x: x.tier)
             for tier, frameworks in itertools.groupby(lst, lambda x: x.tier):
                 cluster_title = f"Tier {tier}"
@@ -94,8 +290,7 @@ class DotWriter(Block):
                     # Sort frameworks within the tier to ensure frameworks which
                     # depend on other frameworks from that tier are listed after
                     # their dependees.
-                    frameworks = list(frameworks)
-                    for fw in sorted(frameworks, key=cmp_to_key(FrameworkCmp(self.db))):
+                    for fw in fw_cmp.sort(frameworks):
                         if self.detailed:
                             self.write_detailed_framework(tier_block, fw)
                         else:
@@ -106,20 +301,8 @@ class DotWriter(Block):
             tier_block.write_list_attrs(quote(fw.name), **WANTED_FW_ATTRS)
         else:
             tier_block.write_nodes([fw.name])
-        edges = set([])
-        for target in fw.get_all_target_dependencies():
-            try:
-                target_fw = self.db.get_framework_for_target(target)
-                if fw == target_fw:
-                    continue
-                dep = target_fw.name
-            except KeyError:
-                dep = target
-            edges.add((fw.name, dep))
-        for dep_fw in fw.get_extra_frameworks():
-            edges.add((fw.name, dep_fw))
-        for (fw_name, dep) in edges:
-            tier_block.writeln(f'"{fw_name}" -> "{dep}";')
+        for dep in sorted(self.edges[fw.name]):
+            tier_block.writeln(f'"{fw.name}" -> "{dep}";')
 
     def write_detailed_framework(self, tier_block, fw):
         with tier_block.cluster_block(fw.name, **FW_ATTRS) as fw_block:
@@ -129,25 +312,36 @@ class DotWriter(Block):
             targets = sorted(fw.get_targets())
             fw_block.write_nodes(targets)
             for target in targets:
-                deps = fw.get_dependencies_for_target(target)
-                for dep in sorted(deps):
+                for dep in sorted(self.edges[target]):
                     fw_block.writeln(f'"{target}" -> "{dep}";')
 
 
-def generate(out, dot_files, framework=None, with_qt=False, detailed=False):
-    db = FrameworkDb()
-    db.populate(dot_files, with_qt=with_qt)
+def generate(out, dot_files, framework=None, with_qt=False, detailed=False, db=None,
+             simplify=False):
+    """
+    Write the dependency diagram of `framework`, or of all frameworks, to `out`
+
+    If `db` is set, it is used instead of parsing `dot_files` again, which is
+    much faster when generating diagrams for several frameworks. It is not
+    modified: when `framework` is set, a filtered view of it is used.
+
+    If `simplify` is True, edges implied by other edges are not written, like
+    when piping the diagram through tred.
+    """
+    if db is None:
+        db = FrameworkDb()
+        db.populate(dot_files, with_qt=with_qt)
 
     if framework:
         wanted_fw = db.find_by_name(framework)
         if wanted_fw is None:
             logging.error(f"No framework named {framework}.")
             return False
-        db.remove_unused_frameworks(wanted_fw)
+        db = db.filtered(wanted_fw)
     else:
         wanted_fw = None
 
-    writer = DotWriter(db, out, wanted_fw=wanted_fw, detailed=detailed)
+    writer = DotWriter(db, out, wanted_fw=wanted_fw, detailed=detailed, simplify=simplify)
     writer.write()
 
     return True
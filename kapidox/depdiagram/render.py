@@ -0,0 +1,162 @@
+# -*- coding: utf-8 -*-
+#
+# SPDX-License-Identifier: BSD-2-Clause
+
+"""
+Render dot files with Graphviz's dot tool
+"""
+
+import hashlib
+import logging
+import os
+import re
+import shutil
+from concurrent.futures import ThreadPoolExecutor
+
+from kapidox import admission, tracing
+
+__all__ = ('render', 'render_all', 'optimize_svg', 'prune_cache')
+
+# Bump this when changing how diagrams are rendered, to invalidate the images
+# already in the cache
+CACHE_VERSION = 1
+
+
+_SVG_COMMENT_RX = re.compile(r"<!--.*?-->|<!DOCTYPE[^>]*>", re.DOTALL)
+_SVG_SPACE_RX = re.compile(r">\s+<")
+
+
+def optimize_svg(path):
+    """
+    Make a SVG file generated by dot smaller, by removing the comments, the
+    DOCTYPE and the indentation. The DOCTYPE points to a DTD browsers do not
+    load anyway.
+    """
+    with open(path, encoding="utf-8") as f:
+        txt = f.read()
+    txt = _SVG_COMMENT_RX.sub("", txt)
+    txt = _SVG_SPACE_RX.sub("><", txt).strip() + "\n"
+    with open(path, "w", encoding="utf-8") as f:
+        f.write(txt)
+
+
+def _cache_key(dot_path, fmt):
+    digest = hashlib.sha256(f"{CACHE_VERSION}|{fmt}|".encode())
+    with open(dot_path, "rb") as f:
+        digest.update(f.read())
+    return digest.hexdigest()
+
+
+def _read_cache_key(path):
+    try:
+        with open(path) as f:
+            return f.read().strip()
+    except OSError:
+        return None
+
+
+def prune_cache(cache_dir):
+    """
+    Remove the files of `cache_dir` which are not part of a cached image (see
+    render()): the entries of older versions, and files left by interrupted
+    runs.
+    """
+    if not os.path.isdir(cache_dir):
+        return
+    names = set(os.listdir(cache_dir))
+    for name in names:
+        if name + ".key" in names or (name.endswith(".key") and name[:-4] in names):
+            continue
+        logging.debug(f"Removing stale cached diagram {name}")
+        path = os.path.join(cache_dir, name)
+        if os.path.isdir(path):
+            shutil.rmtree(path, ignore_errors=True)
+        else:
+            os.remove(path)
+
+
+def render(dot_path, out_path, fmt="png", cache_dir=None):
+    """
+    Render `dot_path` to `out_path` in format `fmt`. Returns True on success.
+
+    SVG output is passed through optimize_svg().
+
+    If `cache_dir` is set, the last image rendered to a file named like
+    `out_path` is stored there, with a key made of the content of `dot_path`
+    and `fmt`, and dot is not run again while the graph does not change. The
+    dot file must be written in a canonical way (nodes and edges always in the
+    same order) for this to be useful, like depdiagram.generate() does. Jobs
+    running at the same time must have different output file names.
+    """
+    cache_path = None
+    if cache_dir:
+        try:
+            cache_path = os.path.join(cache_dir, os.path.basename(out_path))
+            key = _cache_key(dot_path, fmt)
+            if os.path.isfile(cache_path) and _read_cache_key(cache_path + ".key") == key:
+                shutil.copyfile(cache_path, out_path)
+                return True
+        except OSError as exc:
+            logging.warning(f"Could not use the diagram cache for {dot_path}: {exc}")
+            cache_path = None
+
+    cmd = ["dot", "-T" + fmt, "-o" + out_path, dot_path]
+    try:
+        with admission.admit(name=f"dot for {dot_path}"), \
+                tracing.span(os.path.basename(dot_path), "dot"):
+            ret = tracing.call(cmd)
+    except OSError as exc:
+        logging.error(f"Rendering {dot_path} failed: {exc}")
+        return False
+    if ret != 0:
+        logging.error(f"Rendering {dot_path} failed: dot exited with status {ret}")
+        return False
+    if fmt == "svg":
+        try:
+            optimize_svg(out_path)
+        except (OSError, UnicodeError) as exc:
+            logging.warning(f"Could not optimize {out_path}: {exc}")
+
+    if cache_path:
+        try:
+            os.makedirs(cache_dir, exist_ok=True)
+            # Without its key, the entry is ignored while it changes
+            if os.path.exists(cache_path + ".key"):
+                os.remove(cache_path + ".key")
+            shutil.copyfile(out_path, cache_path + ".new")
+            os.replace(cache_path + ".new", cache_path)
+            with open(cache_path + ".key.new", "w") as f:
+                f.write(key)
+            os.replace(cache_path + ".key.new", cache_path + ".key")
+        except OSError as exc:
+            logging.warning(f"Could not cache the diagram of {dot_path}: {exc}")
+    return True
+
+
+def render_all(jobs, max_workers=None, cache_dir=None, measures=None):
+    """
+    Render several dot files, running up to `max_workers` dot processes at
+    once (by default, one per CPU). See render() for `cache_dir`, which is
+    pruned first with prune_cache().
+
+    `jobs` is a list of (dot_path, out_path, fmt) tuples. Returns the list of
+    jobs which failed.
+
+    If `measures` is a dict, it is filled with job => tracing.measure() span
+    of its rendering.
+    """
+    if max_workers is None:
+        max_workers = os.cpu_count() or 1
+    if cache_dir:
+        prune_cache(cache_dir)
+
+    def run(job):
+        with tracing.measure() as measure:
+            ok = render(*job, cache_dir=cache_dir)
+        if measures is not None:
+            measures[job] = measure
+        return ok
+
+    with ThreadPoolExecutor(max_workers=max_workers) as executor:
+        results = list(executor.map(run, jobs))
+    return [job for job, ok in zip(jobs, results) if not ok]
@@ -6,13 +6,60 @@
 # SPDX-License-Identifier: BSD-2-Clause
 
 import argparse
+import logging
+import os
 import sys
+import tempfile
 
-from kapidox import depdiagram
+from kapidox import depdiagram, utils
 
 DESCRIPTION = """\
 """
 
+# Name of the diagram showing all the frameworks, in --all mode
+OVERVIEW_NAME = "kf5"
+
+
+def generate_all(dot_files, output_dir, jobs=None, fmt="png"):
+    """
+    Render the diagrams of all frameworks to `output_dir` in format `fmt`:
+    "$framework.$fmt", "$framework-simplified.$fmt" and an overview of all the
+    frameworks, named "kf5.$fmt". Qt libraries are shown in the diagrams of frameworks below tier
+    3.
+
+    The dot files are only parsed once, and up to `jobs` dot processes run at
+    the same time.
+    """
+    db = depdiagram.FrameworkDb()
+    db.populate(dot_files)
+    qt_db = depdiagram.FrameworkDb()
+    qt_db.populate(dot_files, with_qt=True)
+
+    os.makedirs(output_dir, exist_ok=True)
+    with tempfile.TemporaryDirectory(prefix="depdiagram-") as tmp_dir:
+        jobs_lst = []
+
+        def add_job(name, fw_db, **kwargs):
+            dot_path = os.path.join(tmp_dir, name + ".dot")
+            with open(dot_path, "w") as out:
+                if not depdiagram.generate(out, None, db=fw_db, **kwargs):
+                    return
+            jobs_lst.append((dot_path, os.path.join(output_dir, name + "." + fmt), fmt))
+
+        for fw in sorted(db, key=lambda x: x.name):
+            logging.info(fw.name)
+            fw_db = qt_db if fw.tier < 3 else db
+            add_job(fw.name, fw_db, framework=fw.name)
+            add_job(fw.name + "-simplified", fw_db, framework=fw.name, simplify=True)
+        logging.info(OVERVIEW_NAME)
+        add_job(OVERVIEW_NAME, db, simplify=True)
+
+        failed = depdiagram.render_all(jobs_lst, max_workers=jobs)
+
+    for _, out_path, _ in failed:
+        logging.error(f"Could not generate {out_path}")
+    return not failed
+
 
 def main():
     parser = argparse.ArgumentParser(description=DESCRIPTION)
@@ -29,16 +76,47 @@ def main():
     parser.add_argument("--framework", dest="framework",
                         help="Only show dependencies of framework FRAMEWORK", metavar="FRAMEWORK")
 
+    parser.add_argument("--simplify", dest="simplify", action="store_true",
+                        help="Do not show dependencies implied by other dependencies")
+
+    parser.add_argument("--all", dest="all", action="store_true",
+                        help="Render the diagrams of all frameworks to the directory set with --output-dir")
+
+    parser.add_argument("--output-dir", dest="output_dir",
+                        help="Write the diagrams to DIR, with --all", metavar="DIR")
+
+    parser.add_argument("-j", "--jobs", dest="jobs", type=int,
+                        help="Run up to N dot processes at once, with --all (default: number of CPUs)",
+                        metavar="N")
+
+    parser.add_argument("--format", dest="format", choices=("png", "svg"), default="png",
+                        help="Format of the diagrams, with --all (default: png)")
+
     parser.add_argument("dot_files", nargs="+")
 
     args = parser.parse_args()
+    utils.setup_logging()
+
+    if args.all:
+        if not args.output_dir:
+            parser.error("--all requires --output-dir")
+        ignored = [option for option, value in (("--qt", args.qt), ("--detailed", args.detailed),
+                                                ("--framework", args.framework),
+                                                ("--simplify", args.simplify)) if value]
+        if ignored:
+            parser.error(f"--all cannot be used with {', '.join(ignored)}")
+        if generate_all(args.dot_files, args.output_dir, jobs=args.jobs, fmt=args.format):
+            return 0
+        else:
+            return 1
 
     if args.output == "-":
         out = sys.stdout
     else:
         out = open(args.output, "w")
 
-    if depdiagram.generate(out, args.dot_files, framework=args.framework, with_qt=args.qt, detailed=args.detailed):
+    if depdiagram.generate(out, args.dot_files, framework=args.framework, with_qt=args.qt, detailed=args.detailed,
+                           simplify=args.simplify):
         return 0
     else:
         return 1
@@ -6,6 +6,7 @@
 # SPDX-License-Identifier: BSD-2-Clause
 
 import argparse
+import hashlib
 import os
 import logging
 import shutil
@@ -13,6 +14,7 @@ import subprocess
 import sys
 import tempfile
 import time
+from concurrent.futures import ThreadPoolExecutor, as_completed
 
 from kapidox import utils
 
@@ -20,16 +22,66 @@ DESCRIPTION = """
 Generate Graphviz dot files for one or all frameworks.
 """
 
+# Written at the end of the dot files, followed by the digest of the files
+# they were generated from
+SOURCE_DIGEST_PREFIX = "# Source digest: "
+
+
+def source_digest(fw_dir, yaml_path):
+    """Returns a digest of the files cmake reads to generate the dot file of
+    a framework: its CMakeLists.txt and *.cmake files, and `yaml_path`."""
+    digest = hashlib.sha256()
+    for root, dirs, files in os.walk(fw_dir):
+        # Skip .git and the like
+        dirs[:] = sorted(x for x in dirs if not x.startswith("."))
+        for name in sorted(files):
+            if name == "CMakeLists.txt" or name.endswith(".cmake"):
+                path = os.path.join(root, name)
+                digest.update(os.path.relpath(path, fw_dir).encode() + b"\0")
+                digest.update(utils.file_digest(path).encode())
+    digest.update(b"metainfo.yaml\0")
+    digest.update(utils.file_digest(yaml_path).encode())
+    return digest.hexdigest()
+
+
+def read_source_digest(dot_path):
+    """Returns the source digest stored in `dot_path`, or None"""
+    try:
+        with open(dot_path) as f:
+            for line in f:
+                if line.startswith(SOURCE_DIGEST_PREFIX):
+                    return line[len(SOURCE_DIGEST_PREFIX):].strip()
+    except OSError:
+        pass
+    return None
+
 
-def generate_dot(fw_dir, fw_name, output_dir):
+def generate_dot(fw_dir, fw_name, output_dir, digest=None, build_dir=None):
     """Calls cmake to generate the dot file for a framework.
 
+    If `digest` is set, it is stored in the dot file, see
+    read_source_digest().
+
+    If `build_dir` is set, cmake runs there instead of in a temporary
+    directory, and the build directory is kept. If it already contains a
+    configured build tree, its CMake cache is reused, which is much faster than
+    configuring from scratch.
+
     Returns true on success, false on failure"""
     dot_path = os.path.join(output_dir, fw_name + ".dot")
-    build_dir = tempfile.mkdtemp(prefix="depdiagram-prepare-build-")
+    if build_dir:
+        os.makedirs(build_dir, exist_ok=True)
+        keep_build_dir = True
+    else:
+        build_dir = tempfile.mkdtemp(prefix="depdiagram-prepare-build-")
+        keep_build_dir = False
+    if os.path.exists(os.path.join(build_dir, "CMakeCache.txt")):
+        source = build_dir
+    else:
+        source = fw_dir
     try:
-        ret = subprocess.call(["cmake", fw_dir, f"--graphviz={dot_path}"],
-                              stdout=open("/dev/null", "w"),
+        ret = subprocess.call(["cmake", source, f"--graphviz={dot_path}"],
+                              stdout=subprocess.DEVNULL,
                               cwd=build_dir)
         if ret != 0:
             if os.path.exists(dot_path):
@@ -42,12 +94,21 @@ def generate_dot(fw_dir, fw_name, output_dir):
             version = utils.get_kapidox_version()
             if version:
                 f.write(f"# By {sys.argv[0]} {version}\n")
+            if digest:
+                f.write(f"{SOURCE_DIGEST_PREFIX}{digest}\n")
     finally:
-        shutil.rmtree(build_dir)
+        if not keep_build_dir:
+            shutil.rmtree(build_dir)
     return True
 
 
-def prepare_one(fw_dir, output_dir):
+def prepare_one(fw_dir, output_dir, force=False, build_dir=None):
+    """Generate the dot file of the framework in `fw_dir`
+
+    Unless `force` is True, nothing is done if the dot file in `output_dir`
+    has been generated from the same CMake files and metainfo.yaml. See
+    generate_dot() for `build_dir`.
+    """
     fw_name = utils.parse_fancyname(fw_dir)
     if fw_name is None:
         return False
@@ -57,33 +118,61 @@ def prepare_one(fw_dir, output_dir):
         logging.error(f"'{fw_dir}' is not a framework: '{yaml_path}' does not exist.")
         return False
 
-    if not os.path.exists(output_dir):
-        os.makedirs(output_dir)
+    os.makedirs(output_dir, exist_ok=True)
 
-    if not generate_dot(fw_dir, fw_name, output_dir):
+    digest = source_digest(fw_dir, yaml_path)
+    dot_path = os.path.join(output_dir, fw_name + ".dot")
+    output_yaml_path = os.path.join(output_dir, fw_name + ".yaml")
+    if (not force and os.path.exists(output_yaml_path)
+            and read_source_digest(dot_path) == digest):
+        logging.info(f"{fw_name} is up to date, skipping")
+        return True
+
+    if not generate_dot(fw_dir, fw_name, output_dir, digest, build_dir):
         return False
-    shutil.copyfile(yaml_path, os.path.join(output_dir, fw_name + ".yaml"))
+    shutil.copyfile(yaml_path, output_yaml_path)
     return True
 
 
-def prepare_all(fw_base_dir, dot_dir):
+def _build_dir(build_base_dir, fw_dir):
+    if build_base_dir is None:
+        return None
+    return os.path.join(build_base_dir, os.path.basename(fw_dir))
+
+
+def prepare_all(fw_base_dir, dot_dir, jobs=1, force=False, build_base_dir=None):
     """Generate dot files for all frameworks.
 
     Looks for frameworks in `fw_base_dir`. Output the dot files in sub dirs of
-    `dot_dir`.
+    `dot_dir`. Up to `jobs` frameworks are prepared at the same time. See
+    prepare_one() for `force`.
+
+    If `build_base_dir` is set, each framework is configured in the
+    directory of the same name in `build_base_dir`, see generate_dot().
     """
-    lst = os.listdir(fw_base_dir)
+    fw_names = [x for x in sorted(os.listdir(fw_base_dir))
+                if os.path.isdir(os.path.join(fw_base_dir, x))]
     fails = []
-    for idx, fw_name in enumerate(lst):
-        fw_dir = os.path.join(fw_base_dir, fw_name)
-        if not os.path.isdir(fw_dir):
-            continue
-
-        progress = int(100 * (idx + 1) / len(lst))
-        print(f'{progress}% {fw_name}')
-        if not prepare_one(fw_dir, dot_dir):
-            fails.append(fw_name)
-    return fails
+    with ThreadPoolExecutor(max_workers=jobs) as executor:
+        futures = {
+            executor.submit(prepare_one, os.path.join(fw_base_dir, fw_name), dot_dir, force,
+                            _build_dir(build_base_dir, fw_name)): fw_name
+            for fw_name in fw_names
+        }
+        for idx, future in enumerate(as_completed(futures)):
+            fw_name = futures[future]
+            try:
+                ok = future.result()
+            except Exception as exc:
+                logging.error(f"Preparing {fw_name} failed: {exc}")
+                ok = False
+            progress = int(100 * (idx + 1) / len(fw_names))
+            if ok:
+                print(f'{progress}% {fw_name}')
+            else:
+                print(f'{progress}% {fw_name} (failed)')
+                fails.append(fw_name)
+    return sorted(fails)
 
 
 def main():
@@ -96,22 +185,45 @@ def main():
     group.add_argument("-a", "--all",
                        help="Generate dot files for all frameworks whose dir is in BASE_DIR",
                        metavar="BASE_DIR")
+    parser.add_argument("-j", "--jobs", type=int, default=os.cpu_count() or 1,
+                        help="Prepare up to N frameworks at the same time, with --all (default: number of CPUs)",
+                        metavar="N")
+    parser.add_argument("-f", "--force", action="store_true",
+                        help="Generate dot files even if the CMake files and metainfo.yaml did not change")
+    build_group = parser.add_mutually_exclusive_group()
+    build_group.add_argument("--build-dir",
+                             help="Configure the framework in DIR, and keep it. If DIR is an already"
+                                  " configured build tree, its CMake cache is reused. Only with --single",
+                             metavar="DIR")
+    build_group.add_argument("--build-base-dir",
+                             help="Configure each framework in the dir of the same name in BASE_DIR, and"
+                                  " keep them. Existing build trees are reused, like with --build-dir",
+                             metavar="BASE_DIR")
     parser.add_argument("dot_dir",
                         help="Destination dir where dot files will be generated")
 
     args = parser.parse_args()
 
+    if args.build_dir and not args.single:
+        parser.error("--build-dir can only be used with --single")
+
     dot_dir = os.path.abspath(args.dot_dir)
+    build_base_dir = args.build_base_dir and os.path.abspath(args.build_base_dir)
 
     if args.single:
         fw_dir = os.path.abspath(args.single)
-        if prepare_one(fw_dir, dot_dir):
+        if args.build_dir:
+            build_dir = os.path.abspath(args.build_dir)
+        else:
+            build_dir = _build_dir(build_base_dir, fw_dir)
+        if prepare_one(fw_dir, dot_dir, force=args.force, build_dir=build_dir):
             return 0
         else:
             return 1
     else:
         fw_base_dir = os.path.abspath(args.all)
-        fails = prepare_all(fw_base_dir, dot_dir)
+        fails = prepare_all(fw_base_dir, dot_dir, jobs=args.jobs, force=args.force,
+                            build_base_dir=build_base_dir)
         if fails:
             logging.error(f"{len(fails)} framework(s) failed: {', '.join(fails)}")
             return 1
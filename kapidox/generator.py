@@ -13,7 +13,6 @@ import os
 import logging
 from os import environ
 import shutil
-import subprocess
 import tempfile
 import sys
 import pathlib
@@ -21,6 +20,9 @@ from typing import Any, Dict
 import xml.etree.ElementTree as ET
 import re
 import glob
+import hashlib
+import sqlite3
+from concurrent.futures import ThreadPoolExecutor, as_completed
 from pathlib import Path
 
 import jinja2
@@ -32,7 +34,7 @@ import json
 
 from jinja2.environment import Template
 
-from kapidox import utils
+from kapidox import admission, utils, tracing
 try:
     from kapidox import depdiagram
     DEPDIAGRAM_AVAILABLE = True
@@ -61,6 +63,36 @@ WARN_LOGFILE = 'doxygen-warnings.log'
 
 HTML_SUBDIR = 'html'
 
+SEARCH_DATABASE = 'searchdata.sqlite'
+
+# Entries are matched on name, keyword and text; the other columns are only
+# returned with the results.
+SEARCH_DATABASE_SCHEMA = """
+CREATE VIRTUAL TABLE docs USING fts5(
+    name, keyword, text,
+    type UNINDEXED, url UNINDEXED, library UNINDEXED, product UNINDEXED,
+    tokenize = "unicode61 tokenchars '_'",
+    prefix = '2 3'
+)
+"""
+
+# Bump this when changing what slim_tagfile() drops, to invalidate the copies
+# already in the cache
+SLIM_TAGFILE_VERSION = 2
+
+# Compounds nobody links to from another project's documentation
+SLIM_TAGFILE_DROPPED_COMPOUNDS = {'dir', 'example'}
+
+# Describes the tag file a reduced copy was made from, next to the copy
+SLIM_TAGFILE_SOURCE = 'source.json'
+
+# Bump this when changing how .qch files are created, to invalidate the files
+# already in the cache
+QCH_CACHE_VERSION = 1
+
+# The generation date, which library.html adds to every page
+QCH_FINGERPRINT_IGNORED_RX = re.compile(rb'Generated on .*? by')
+
 
 class Context(object):
     """
@@ -81,6 +113,9 @@ class Context(object):
         'dependency_diagram',
         'copyright',
         'is_qdoc',
+        # Resources
+        'memory_estimate',
+        'threads',
         # Output
         'outputdir',
         'htmldir',
@@ -90,6 +125,7 @@ class Context(object):
         'qhp',
         # Binaries
         'doxygen',
+        'qdoc',
         'qhelpgenerator',
     )
 
@@ -103,6 +139,7 @@ class Context(object):
         self.qhp = args.qhp
         # Binaries
         self.doxygen = args.doxygen
+        self.qdoc = args.qdoc
         self.qhelpgenerator = args.qhelpgenerator
 
         for key in self.__slots__:
@@ -192,8 +229,7 @@ def create_dirs(ctx):
     ctx.htmldir = os.path.join(ctx.outputdir, HTML_SUBDIR)
     ctx.tagfile = os.path.join(ctx.htmldir, ctx.fwinfo.fancyname + '.tags')
 
-    if not os.path.exists(ctx.outputdir):
-        os.makedirs(ctx.outputdir)
+    os.makedirs(ctx.outputdir, exist_ok=True)
 
     if os.path.exists(ctx.htmldir):
         # If we have files left there from a previous run but which are no
@@ -322,6 +358,117 @@ def search_for_tagfiles(suggestion=None, doclink=None, flattenlinks=False, searc
     return []
 
 
+def _slim_tagfile_source(tagfile):
+    stat = os.stat(tagfile)
+    return {
+        'path': tagfile,
+        'mtime_ns': stat.st_mtime_ns,
+        'size': stat.st_size,
+        'version': SLIM_TAGFILE_VERSION,
+    }
+
+
+def _read_slim_tagfile_source(slimdir):
+    try:
+        with open(os.path.join(slimdir, SLIM_TAGFILE_SOURCE)) as f:
+            return json.load(f)
+    except (OSError, ValueError):
+        return None
+
+
+def slim_tagfile(tagfile, cachedir):
+    """Return a reduced copy of a tag file, creating it if needed
+
+    The copy does not contain the compounds Doxygen does not need to create
+    links (see SLIM_TAGFILE_DROPPED_COMPOUNDS), nor the indentation. Section
+    anchors are kept: links to the sections of another project's pages need
+    them. The copy is stored in `cachedir` and reused as long as the
+    modification time and the size of `tagfile` do not change.
+
+    Args:
+        tagfile:  (string) path to the tag file.
+        cachedir: (string) the directory to store reduced copies in.
+
+    Returns:
+        The path to the reduced copy.
+    """
+    tagfile = os.path.abspath(tagfile)
+    source = _slim_tagfile_source(tagfile)
+    slimdir = os.path.join(cachedir, hashlib.sha256(tagfile.encode('utf-8')).hexdigest())
+    slim_path = os.path.join(slimdir, os.path.basename(tagfile))
+    if os.path.isfile(slim_path) and _read_slim_tagfile_source(slimdir) == source:
+        return slim_path
+
+    tree = ET.parse(tagfile)
+    root = tree.getroot()
+    for compound in root.findall('compound'):
+        if compound.get('kind') in SLIM_TAGFILE_DROPPED_COMPOUNDS:
+            root.remove(compound)
+    for parent in root.iter():
+        if len(parent):
+            parent.text = None
+        parent.tail = None
+
+    os.makedirs(slimdir, exist_ok=True)
+    source_path = os.path.join(slimdir, SLIM_TAGFILE_SOURCE)
+    if os.path.exists(source_path):
+        os.unlink(source_path)
+    tree.write(slim_path + '.new', encoding='utf-8', xml_declaration=True)
+    os.replace(slim_path + '.new', slim_path)
+    with open(source_path + '.new', 'w') as f:
+        json.dump(source, f)
+    os.replace(source_path + '.new', source_path)
+    return slim_path
+
+
+def prune_slim_tagfiles(cachedir):
+    """Remove the reduced copies of tag files which no longer exist, and the
+    copies made by other versions of slim_tagfile()
+
+    Args:
+        cachedir: (string) the directory reduced copies are stored in.
+    """
+    if not os.path.isdir(cachedir):
+        return
+    for entry in os.listdir(cachedir):
+        slimdir = os.path.join(cachedir, entry)
+        source = _read_slim_tagfile_source(slimdir)
+        if (source is not None and source.get('version') == SLIM_TAGFILE_VERSION
+                and os.path.isfile(source.get('path', ''))):
+            continue
+        logging.debug(f'Removing stale reduced tag file {slimdir}')
+        if os.path.isdir(slimdir):
+            shutil.rmtree(slimdir, ignore_errors=True)
+        else:
+            os.unlink(slimdir)
+
+
+@tracing.traced()
+def slim_tagfiles(tagfiles):
+    """Replace tag files with reduced copies cached in utils.cache_dir()
+
+    Tag files which cannot be read are kept as they are. Stale copies are
+    removed from the cache first, see prune_slim_tagfiles().
+
+    Args:
+        tagfiles: (list of pairs of (tag_file, link_path)) the tag files, as
+                  returned by search_for_tagfiles().
+
+    Returns:
+        A list of pairs of (tag_file, link_path).
+    """
+    cachedir = os.path.join(utils.cache_dir(), 'tagfiles')
+    prune_slim_tagfiles(cachedir)
+    slimmed = []
+    for tagfile, link in tagfiles:
+        try:
+            slimmed.append((slim_tagfile(tagfile, cachedir), link))
+        except (OSError, ET.ParseError) as exc:
+            logging.warning(f'Could not reduce tag file {tagfile}: {exc}')
+            slimmed.append((tagfile, link))
+    return slimmed
+
+
 def menu_items(htmldir, modulename):
     """Menu items for standard Doxygen files
 
@@ -423,6 +570,7 @@ def parse_dox_html(stream):
     return dct
 
 
+@tracing.traced()
 def postprocess_internal_qdoc(htmldir: str, tmpl: Template, env: Dict[str, Any]):
     """Substitute text in HTML files
 
@@ -452,6 +600,7 @@ def postprocess_internal_qdoc(htmldir: str, tmpl: Template, env: Dict[str, Any])
         os.rename(newpath, path)
 
 
+@tracing.traced()
 def postprocess_internal(htmldir, tmpl, mapping):
     """Substitute text in HTML files
 
@@ -528,17 +677,20 @@ def generate_dependencies_page(tmp_dir, doxdatadir, modulename, dependency_diagr
     return out_path
 
 
+@tracing.traced()
 def generate_apidocs_qdoc(ctx: Context, tmp_dir: str, doxyfile_entries=None, keep_temp_dirs=False):
     absolute = pathlib.Path(os.path.join(ctx.outputdir, 'html')).absolute()
 
     environ['KAPIDOX_DIR'] = ctx.doxdatadir
 
-    logging.info(f'Running QDoc (qdoc {ctx.fwinfo.path}/.qdocconf --outputdir={absolute}')
-    ret = subprocess.call(['qdoc', ctx.fwinfo.path + "/.qdocconf", f"--outputdir={absolute}"])
+    logging.info(f'Running QDoc ({ctx.qdoc} {ctx.fwinfo.path}/.qdocconf --outputdir={absolute}')
+    with admission.admit(memory_kb=ctx.memory_estimate, name=f'qdoc for {ctx.fancyname}'):
+        ret = tracing.call([ctx.qdoc, ctx.fwinfo.path + "/.qdocconf", f"--outputdir={absolute}"])
     if ret != 0:
         raise Exception("QDoc exited with a non-zero status code")
 
 
+@tracing.traced()
 def generate_apidocs(ctx: Context, tmp_dir, doxyfile_entries=None, keep_temp_dirs=False):
     """Generate the API documentation for a single directory"""
 
@@ -634,56 +786,146 @@ def generate_apidocs(ctx: Context, tmp_dir, doxyfile_entries=None, keep_temp_dir
             localdoxyfile = os.path.join(find_src_subdir(ctx.fwinfo.docdir)[0], 'Doxyfile.local')
             if os.path.isfile(localdoxyfile):
                 with codecs.open(localdoxyfile, 'r', 'utf-8') as f:
+                    line = ''
                     for line in f:
                         doxyfile.write(line)
+                    if not line.endswith('\n'):
+                        doxyfile.write('\n')
+
+        # Share the CPUs with the other libraries generated at the same time.
+        # Written last so that the threads Doxygen starts are the ones
+        # reserved below, whatever Doxyfile.local says.
+        threads = ctx.threads or admission.threads_per_job()
+        writer.write_entries(
+                NUM_PROC_THREADS=threads,
+                DOT_NUM_THREADS=threads)
 
     logging.info('Running Doxygen')
-    subprocess.call([ctx.doxygen, doxyfile_path])
+    with admission.admit(cpus=threads, memory_kb=ctx.memory_estimate,
+                         name=f'Doxygen for {ctx.fancyname}'):
+        tracing.call([ctx.doxygen, doxyfile_path])
 
 
-def generate_diagram(png_path, fancyname, dot_files, tmp_dir):
-    """Generate a dependency diagram for a framework.
+def write_diagram_dot(dot_path, fancyname, db):
+    """Write the simplified dependency graph of a framework to `dot_path`.
+
+    Edges implied by other edges are removed in Python, so the graph does not
+    need to be piped through tred.
     """
-    def run_cmd(cmd, **kwargs):
-        try:
-            subprocess.check_call(cmd, **kwargs)
-        except subprocess.CalledProcessError as exc:
-            logging.error(f'Command {exc.cmd} failed with error code {exc.returncode}.')
-            return False
-        return True
+    with open(dot_path, 'w') as f:
+        ok = depdiagram.generate(f, None, framework=fancyname, db=db, simplify=True)
+    if not ok:
+        logging.error(f'Generating diagram for {fancyname} failed')
+    return ok
 
-    logging.info('Generating dependency diagram')
-    dot_path = os.path.join(tmp_dir, fancyname + '.dot')
 
-    with open(dot_path, 'w') as f:
-        with_qt = False
-        ok = depdiagram.generate(f, dot_files, framework=fancyname,
-                                 with_qt=with_qt)
-        if not ok:
-            logging.error('Generating diagram failed')
-            return False
+def diagram_cache_dir():
+    """Return the directory rendered dependency diagrams are cached in"""
+    return os.path.join(utils.cache_dir(), 'diagrams')
 
-    logging.info('- Simplifying diagram')
-    simplified_dot_path = os.path.join(tmp_dir, fancyname + '-simplified.dot')
-    with open(simplified_dot_path, 'w') as f:
-        if not run_cmd(['tred', dot_path], stdout=f):
-            return False
 
-    logging.info('- Generating diagram png')
-    if not run_cmd(['dot', '-Tpng', '-o' + png_path, simplified_dot_path]):
-        return False
+@tracing.traced()
+def generate_diagrams(libraries, db, tmp_dir, jobs=None, fmt='png', costs=None):
+    """Generate the dependency diagrams of several libraries.
 
-    # These os.unlink() calls are not in a 'finally' block on purpose.
-    # Keeping the dot files around makes it possible to inspect their content
-    # when running with the --keep-temp-dirs option. If generation fails and
-    # --keep-temp-dirs is not set, the files will be removed when the program
-    # ends because they were created in `tmp_dir`.
-    os.unlink(dot_path)
-    os.unlink(simplified_dot_path)
-    return True
+    The graphs are all written first, then rendered by up to `jobs` dot
+    processes running at the same time. Graphs which have already been
+    rendered by a previous run are taken from diagram_cache_dir() instead.
+    The `dependency_diagram` attribute of the libraries whose diagram has been
+    generated is set.
+
+    Args:
+        libraries: (list of Libraries) the libraries.
+        db:        (depdiagram.FrameworkDb) the dependencies of all
+                   frameworks.
+        tmp_dir:   (string) the directory to write the diagrams in.
+        jobs:      (int) the maximum number of dot processes to run at once;
+                   defaults to the number of CPUs.
+        fmt:       (string) the format of the diagrams, 'png' or 'svg'.
+        costs:     (costmodel.CostModel) if set, the time taken by each
+                   diagram is recorded there.
+    """
+    logging.info('Generating dependency diagrams')
+    diagrams = []
+    for lib in libraries:
+        dot_path = os.path.join(tmp_dir, lib.fancyname + '.dot')
+        out_path = os.path.join(tmp_dir, lib.name) + '.' + fmt
+        if write_diagram_dot(dot_path, lib.fancyname, db):
+            diagrams.append((lib, (dot_path, out_path, fmt)))
+
+    measures = {}
+    failed = depdiagram.render_all([job for _, job in diagrams], max_workers=jobs,
+                                   cache_dir=diagram_cache_dir(), measures=measures)
+    for lib, job in diagrams:
+        if costs is not None and job in measures:
+            costs.record(lib, 'diagram', measures[job].busy, measures[job].child_maxrss)
+        if job in failed:
+            continue
+        dot_path, out_path, _ = job
+        lib.dependency_diagram = out_path
+        # Only remove the dot files of the diagrams which have been rendered:
+        # the other ones are kept to be inspected with --keep-temp-dirs, and
+        # are removed with `tmp_dir` otherwise.
+        os.unlink(dot_path)
 
 
-def create_fw_context(args, lib, tagfiles, copyright=''):
+def dependency_closure(lib, libraries):
+    """Find the libraries `lib` depends on, directly or indirectly
+
+    Args:
+        lib:       (Library) the library.
+        libraries: (list of Libraries) all the libraries.
+
+    Returns:
+        A set of library names, or None if the dependencies of `lib` or of one
+    of the libraries it depends on are unknown.
+    """
+    libraries_by_name = {x.name: x for x in libraries}
+    closure = set()
+    todo = [lib]
+    while todo:
+        current = todo.pop()
+        if current.dependencies is None:
+            return None
+        for name in current.dependencies:
+            if name in closure:
+                continue
+            closure.add(name)
+            dep_lib = libraries_by_name.get(name)
+            # Dependencies which are not documented, like
+            # extra-cmake-modules, have no tag file anyway
+            if dep_lib is not None:
+                todo.append(dep_lib)
+    return closure
+
+
+def filter_tagfiles(lib, tagfiles, libraries):
+    """Keep only the tag files Doxygen needs to create links for `lib`
+
+    The tag files of the documented libraries are kept only if `lib` depends
+    on them. External tag files, like the Qt ones, are always kept. If the
+    dependencies of `lib` are unknown, all the tag files are kept.
+
+    Args:
+        lib:       (Library) the library to document.
+        tagfiles:  (list of pairs of (tag_file, link_path)) all the tag files.
+        libraries: (list of Libraries) all the libraries.
+
+    Returns:
+        A list of pairs of (tag_file, link_path).
+    """
+    closure = dependency_closure(lib, libraries)
+    if closure is None:
+        logging.debug(f'Dependencies of {lib.fancyname} are unknown, using all tag files')
+        return tagfiles
+
+    owners = {create_fw_tagfile_tuple(x)[0]: x.name for x in libraries}
+    filtered = [x for x in tagfiles if x[0] not in owners or owners[x[0]] in closure]
+    logging.debug(f'Using {len(filtered)} of {len(tagfiles)} tag files for {lib.fancyname}')
+    return filtered
+
+
+def create_fw_context(args, lib, tagfiles, copyright='', memory_estimate=None, threads=None):
 
     # There is one more level for groups
     if lib.part_of_group:
@@ -714,9 +956,13 @@ def create_fw_context(args, lib, tagfiles, copyright=''):
                    # Output
                    outputdir=lib.outputdir,
                    is_qdoc=lib.metainfo['qdoc'],
+                   # Resources
+                   memory_estimate=memory_estimate,
+                   threads=threads,
                    )
 
 
+@tracing.traced()
 def gen_fw_apidocs(ctx, tmp_base_dir):
     create_dirs(ctx)
     # tmp_dir is deleted when tmp_base_dir is
@@ -739,6 +985,34 @@ def create_fw_tagfile_tuple(lib):
     return tagfile, prefix + lib.outputdir + '/html/'
 
 
+def snapshot_fw_tagfiles(libraries, out_dir):
+    """Copy the tag files of the libraries to `out_dir`
+
+    When the libraries are rebuilt at the same time, Doxygen removes and
+    rewrites the tag file of each of them while the libraries depending on it
+    read it. Reading copies made beforehand avoids seeing a missing or half
+    written tag file, which silently drops the links to that library.
+
+    Args:
+        libraries: (list of Libraries) the libraries.
+        out_dir:   (string) the directory to copy the tag files to.
+
+    Returns:
+        A dict of tag file path, as returned by create_fw_tagfile_tuple(), =>
+    path of its copy. Libraries without a tag file, like the ones documented
+    with QDoc, are not part of it.
+    """
+    snapshots = {}
+    for lib in libraries:
+        tagfile = create_fw_tagfile_tuple(lib)[0]
+        if not os.path.isfile(tagfile):
+            continue
+        copy_dir = os.path.join(out_dir, lib.outputdir)
+        os.makedirs(copy_dir, exist_ok=True)
+        snapshots[tagfile] = shutil.copy(tagfile, copy_dir)
+    return snapshots
+
+
 def finish_fw_apidocs_doxygen(ctx: Context, env: Dict[str, Any]):
     tmpl = create_jinja_environment(ctx.doxdatadir).get_template('library.html')
     postprocess_internal(ctx.htmldir, tmpl, env)
@@ -786,6 +1060,7 @@ def gen_template_environment(ctx: Context) -> Dict[str, Any]:
     return mapping
 
 
+@tracing.traced()
 def finish_fw_apidocs(ctx: Context):
     env = gen_template_environment(ctx)
 
@@ -800,6 +1075,7 @@ def finish_fw_apidocs(ctx: Context):
         finish_fw_apidocs_doxygen(ctx, env)
 
 
+@tracing.traced()
 def indexer(lib):
     """ Create json index from xml
       <add>
@@ -845,6 +1121,7 @@ def indexer(lib):
             f.write(chunk)
 
 
+@tracing.traced()
 def create_product_index(product):
     doclist = []
     for lib in product.libraries:
@@ -868,6 +1145,7 @@ def create_product_index(product):
             f.write(chunk)
 
 
+@tracing.traced()
 def create_global_index(products):
     doclist = []
     for product in products:
@@ -889,95 +1167,308 @@ def create_global_index(products):
             f.write(chunk)
 
 
-def create_qch(products, tagfiles):
+@tracing.traced()
+def create_search_database(products, path=SEARCH_DATABASE):
+    """Create a SQLite database with a FTS5 table of all search entries
+
+    The database contains the same entries as the global searchdata.json, with
+    URLs relative to the top-level directory. It is used by
+    kapidox-search-serve to answer queries on the server side.
+
+    Args:
+        products: (list of Products) the products to index. Their
+                  searchdata.json must have been created by
+                  create_product_index().
+        path:     (string) where to write the database.
+
+    Returns:
+        True if the database has been created, False if the SQLite library
+    does not support FTS5.
+    """
+    tmp_path = path + '.new'
+    if os.path.exists(tmp_path):
+        os.remove(tmp_path)
+
+    conn = sqlite3.connect(tmp_path)
+    created = False
+    try:
+        try:
+            conn.execute(SEARCH_DATABASE_SCHEMA)
+        except sqlite3.OperationalError as exc:
+            logging.warning(f'Cannot create search database: {exc}')
+            return False
+
+        for product in products:
+            if product.metainfo['qdoc']:
+                continue
+
+            with open(product.outputdir + '/searchdata.json', 'r') as f:
+                prodindex = json.load(f)
+            rows = []
+            for libindex in prodindex['libraries']:
+                for item in libindex['docfields']:
+                    rows.append((item.get('name') or '',
+                                 item.get('keyword') or '',
+                                 item.get('text') or '',
+                                 item.get('type') or '',
+                                 os.path.join(product.name, item['url']),
+                                 libindex['fancyname'],
+                                 prodindex['fancyname']))
+            conn.executemany('INSERT INTO docs VALUES (?, ?, ?, ?, ?, ?, ?)', rows)
+
+        conn.execute("INSERT INTO docs(docs) VALUES ('optimize')")
+        conn.commit()
+        created = True
+    finally:
+        conn.close()
+        # Do not leave an incomplete database in the output directory
+        if not created:
+            os.remove(tmp_path)
+
+    os.replace(tmp_path, path)
+    return True
+
+
+def write_qhp(product, path):
+    """Merge the Qt Help Project files of the libraries of a product
+
+    Args:
+        product: (Product) the product.
+        path:    (string) where to write the merged .qhp file. The files it
+                 lists are relative to the current directory, so it must be
+                 in the current directory.
+    """
     tag_root = "QtHelpProject"
     tag_files = "files"
     tag_filter_section = "filterSection"
     tag_keywords = "keywords"
     tag_toc = "toc"
-    for product in products:
-        tree_out = ET.ElementTree(ET.Element(tag_root))
-        root_out = tree_out.getroot()
-        root_out.set("version", "1.0")
-        namespace = ET.SubElement(root_out, "namespace")
-        namespace.text = "org.kde." + product.name
-        virtual_folder = ET.SubElement(root_out, "virtualFolder")
-        virtual_folder.text = product.name
-        filter_section = ET.SubElement(root_out, tag_filter_section)
-        filter_attribute = ET.SubElement(filter_section, "filterAttribute")
-        filter_attribute.text = "doxygen"
-        toc = ET.SubElement(filter_section, "toc")
-        keywords = ET.SubElement(filter_section, tag_keywords)
-        if len(product.libraries) > 0:
-            if product.libraries[0].part_of_group:
-                product_index_section = ET.SubElement(toc, "section", {'ref': product.name + "/index.html", 'title': product.fancyname})
-        files = ET.SubElement(filter_section, tag_files)
-
-        for lib in sorted(product.libraries, key=lambda lib: lib.name):
-            tree = ET.parse(lib.outputdir + '/html/index.qhp')
-            root = tree.getroot()
-            for child in root.findall(".//*[@ref]"):
-                if lib.part_of_group:
-                    child.attrib['ref'] = lib.name + "/html/" + child.attrib['ref']
-                else:
-                    child.attrib['ref'] = "html/" + child.attrib['ref']
-                child.attrib['ref'] = product.name + '/' + child.attrib['ref']
-
-            for child in root.find(".//"+tag_toc):
-                if lib.part_of_group:
-                    product_index_section.append(child)
-                else:
-                    toc.append(child)
-
-            for child in root.find(".//keywords"):
-                keywords.append(child)
-
-            resources = [
-                "*.json",
-                product.name + "/*.json",
-                "resources/css/*.css",
-                "resources/3rd-party/bootstrap/css/*.css",
-                "resources/3rd-party/jquery/jquery-3.1.0.min.js",
-                "resources/*.svg",
-                "resources/js/*.js",
-                "resources/icons/*",
-            ]
-            if product.part_of_group:
-                resources.extend([
-                    product.name + "/*.html",
-                    product.name + "/" + lib.name + "/html/*.html",
-                    product.name + "/" + lib.name + "/html/*.png",
-                    product.name + "/" + lib.name + "/html/*.css",
-                    product.name + "/" + lib.name + "/html/*.js",
-                    product.name + "/" + lib.name + "/html/*.json"
-                    ])
+    tree_out = ET.ElementTree(ET.Element(tag_root))
+    root_out = tree_out.getroot()
+    root_out.set("version", "1.0")
+    namespace = ET.SubElement(root_out, "namespace")
+    namespace.text = "org.kde." + product.name
+    virtual_folder = ET.SubElement(root_out, "virtualFolder")
+    virtual_folder.text = product.name
+    filter_section = ET.SubElement(root_out, tag_filter_section)
+    filter_attribute = ET.SubElement(filter_section, "filterAttribute")
+    filter_attribute.text = "doxygen"
+    toc = ET.SubElement(filter_section, "toc")
+    keywords = ET.SubElement(filter_section, tag_keywords)
+    if len(product.libraries) > 0:
+        if product.libraries[0].part_of_group:
+            product_index_section = ET.SubElement(toc, "section", {'ref': product.name + "/index.html", 'title': product.fancyname})
+    files = ET.SubElement(filter_section, tag_files)
+
+    for lib in sorted(product.libraries, key=lambda lib: lib.name):
+        tree = ET.parse(lib.outputdir + '/html/index.qhp')
+        root = tree.getroot()
+        for child in root.findall(".//*[@ref]"):
+            if lib.part_of_group:
+                child.attrib['ref'] = lib.name + "/html/" + child.attrib['ref']
+            else:
+                child.attrib['ref'] = "html/" + child.attrib['ref']
+            child.attrib['ref'] = product.name + '/' + child.attrib['ref']
 
+        for child in root.find(".//"+tag_toc):
+            if lib.part_of_group:
+                product_index_section.append(child)
             else:
-                resources.extend([
-                    product.name + "/html/*.html",
-                    product.name + "/html/*.png",
-                    product.name + "/html/*.css",
-                    product.name + "/html/*.js"
-                    ])
+                toc.append(child)
+
+        for child in root.find(".//keywords"):
+            keywords.append(child)
+
+        # The JSON files of the top-level directory, like the global search
+        # index or symbolindex.SYMBOL_INDEX, cover the whole site: they are
+        # not part of any product
+        resources = [
+            product.name + "/*.json",
+            "resources/css/*.css",
+            "resources/3rd-party/bootstrap/css/*.css",
+            "resources/3rd-party/jquery/jquery-3.1.0.min.js",
+            "resources/*.svg",
+            "resources/js/*.js",
+            "resources/icons/*",
+        ]
+        if product.part_of_group:
+            resources.extend([
+                product.name + "/*.html",
+                product.name + "/" + lib.name + "/html/*.html",
+                product.name + "/" + lib.name + "/html/*.png",
+                product.name + "/" + lib.name + "/html/*.svg",
+                product.name + "/" + lib.name + "/html/*.css",
+                product.name + "/" + lib.name + "/html/*.js",
+                product.name + "/" + lib.name + "/html/*.json"
+                ])
+
+        else:
+            resources.extend([
+                product.name + "/html/*.html",
+                product.name + "/html/*.png",
+                product.name + "/html/*.svg",
+                product.name + "/html/*.css",
+                product.name + "/html/*.js"
+                ])
+
+        for resource in resources:
+            file_elem = ET.SubElement(files, "file")
+            file_elem.text = resource
 
-            for resource in resources:
-                file_elem = ET.SubElement(files, "file")
-                file_elem.text = resource
+    tree_out.write(path, encoding="utf-8", xml_declaration=True)
 
-        if not os.path.isdir('qch'):
-            os.mkdir('qch')
 
-        name = product.name+".qhp"
-        outname = product.name+".qch"
-        tree_out.write(name, encoding="utf-8", xml_declaration=True)
+def qch_fingerprint(qhp_path, qhelpgenerator):
+    """Compute a digest of a .qhp file and of the files it lists
 
-        # On many distributions, qhelpgenerator from Qt5 is suffixed with
-        # "-qt5". Look for it first, and fall back to unsuffixed one if
-        # not found.
-        qhelpgenerator = shutil.which("qhelpgenerator-qt5")
+    The generation date in the HTML pages is ignored, otherwise a product would
+    never be found unchanged.
 
-        if qhelpgenerator is None:
-            qhelpgenerator = "qhelpgenerator"
+    Args:
+        qhp_path:       (string) the .qhp file, in the current directory.
+        qhelpgenerator: (string) the qhelpgenerator which compiles it.
+
+    Returns:
+        A hex string.
+    """
+    digest = hashlib.sha256(f'{QCH_CACHE_VERSION}|{qhelpgenerator}|'.encode())
+    with open(qhp_path, 'rb') as f:
+        digest.update(f.read())
+    for file_elem in ET.parse(qhp_path).iter('file'):
+        for path in sorted(glob.glob(file_elem.text)):
+            if not os.path.isfile(path):
+                continue
+            with open(path, 'rb') as f:
+                content = f.read()
+            if path.endswith('.html'):
+                content = QCH_FINGERPRINT_IGNORED_RX.sub(b'', content)
+            digest.update(path.encode() + b'\0')
+            digest.update(hashlib.sha256(content).digest())
+    return digest.hexdigest()
+
+
+def _read_qch_fingerprint(path):
+    try:
+        with open(path) as f:
+            return f.read().strip()
+    except OSError:
+        return None
+
+
+def prune_qch_cache(cachedir):
+    """Remove the files of `cachedir` which are not part of a cached .qch
+    file, see create_product_qch(): the entries of older versions, and
+    files left by interrupted runs
+
+    Args:
+        cachedir: (string) the directory .qch files are cached in.
+    """
+    if not os.path.isdir(cachedir):
+        return
+    names = set(os.listdir(cachedir))
+    for name in names:
+        stem, ext = os.path.splitext(name)
+        if ext == '.qch' and stem + '.fingerprint' in names:
+            continue
+        if ext == '.fingerprint' and stem + '.qch' in names:
+            continue
+        logging.debug(f'Removing stale cached file {name}')
+        path = os.path.join(cachedir, name)
+        if os.path.isdir(path):
+            shutil.rmtree(path, ignore_errors=True)
+        else:
+            os.remove(path)
+
+
+@tracing.traced()
+def create_product_qch(product, qhelpgenerator, cachedir=None):
+    """Create qch/`product.name`.qch
+
+    The merged .qhp file of the product is written to a temporary file of its
+    own, so several products can be handled at the same time.
+
+    If `cachedir` is set, the last .qch file compiled for the product is
+    stored there, with its qch_fingerprint(), and qhelpgenerator only runs if
+    the product changed since then.
 
-        subprocess.call([qhelpgenerator, name, '-o', 'qch/'+outname])
+    Returns:
+        True on success, False on failure.
+    """
+    fd, name = tempfile.mkstemp(prefix=product.name + '-', suffix='.qhp', dir='.')
+    os.close(fd)
+    outname = product.name + ".qch"
+    outpath = os.path.join('qch', outname)
+    fingerprint = None
+    try:
+        write_qhp(product, name)
+        if cachedir:
+            cached = os.path.join(cachedir, product.name + '.qch')
+            fingerprint_path = os.path.join(cachedir, product.name + '.fingerprint')
+            fingerprint = qch_fingerprint(name, qhelpgenerator)
+            if os.path.isfile(cached) and _read_qch_fingerprint(fingerprint_path) == fingerprint:
+                logging.info(f'{product.fancyname} did not change, reusing {outname}')
+                shutil.copyfile(cached, outpath)
+                return True
+        ret = tracing.call([qhelpgenerator, name, '-o', outpath])
+    finally:
         os.remove(name)
+    if ret != 0:
+        logging.error(f'Creating {outname} failed: {qhelpgenerator} exited with status {ret}')
+        return False
+
+    if fingerprint:
+        try:
+            os.makedirs(cachedir, exist_ok=True)
+            # Without its fingerprint, the entry is ignored while it changes
+            if os.path.exists(fingerprint_path):
+                os.remove(fingerprint_path)
+            shutil.copyfile(outpath, cached + '.new')
+            os.replace(cached + '.new', cached)
+            with open(fingerprint_path + '.new', 'w') as f:
+                f.write(fingerprint)
+            os.replace(fingerprint_path + '.new', fingerprint_path)
+        except OSError as exc:
+            logging.warning(f'Could not cache {outname}: {exc}')
+    return True
+
+
+@tracing.traced()
+def create_qch(products, tagfiles, jobs=None, use_cache=True, qhelpgenerator=None):
+    """Create a Qt Compressed Help file for each product in the qch directory
+
+    The files are compiled by `qhelpgenerator`, by default the one returned by
+    utils.find_qhelpgenerator().
+
+    Products are handled by up to `jobs` workers at the same time (by default,
+    one per CPU). A product which fails does not prevent the others from being
+    created.
+
+    If `use_cache` is True, the .qch files of products which did not change
+    since the previous run are copied from utils.cache_dir() instead of being
+    compiled again. The cache keeps one .qch file per product.
+
+    Returns:
+        The list of products whose .qch file could not be created.
+    """
+    os.makedirs('qch', exist_ok=True)
+
+    if qhelpgenerator is None:
+        qhelpgenerator = utils.find_qhelpgenerator()
+
+    cachedir = os.path.join(utils.cache_dir(), 'qch') if use_cache else None
+    if cachedir:
+        prune_qch_cache(cachedir)
+    failed = []
+    with ThreadPoolExecutor(max_workers=jobs or os.cpu_count() or 1) as executor:
+        futures = {executor.submit(create_product_qch, product, qhelpgenerator, cachedir): product
+                   for product in products}
+        for future in as_completed(futures):
+            product = futures[future]
+            try:
+                ok = future.result()
+            except Exception as exc:
+                logging.error(f'Creating the qch file of {product.fancyname} failed: {exc}')
+                ok = False
+            if not ok:
+                failed.append(product)
+    return failed
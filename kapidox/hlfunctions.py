@@ -13,10 +13,11 @@ import shutil
 import sys
 import tempfile
 import json
+from concurrent.futures import ThreadPoolExecutor, as_completed
 
 from urllib.request import urlretrieve
 
-from . import generator, utils, argparserutils, preprocessing
+from . import admission, costmodel, generator, utils, argparserutils, preprocessing, symbolindex, tracing
 
 try:
     from kapidox import depdiagram
@@ -37,19 +38,42 @@ def do_it(maintainers_fct, copyright, searchpaths=None):
         exit(2)
 
     if not DEPDIAGRAM_AVAILABLE:
-        logging.warning("Missing Graphviz dependency: diagrams will not be generated.")
+        logging.warning("Missing kapidox.depdiagram module: diagrams will not be generated.")
 
-    tagfiles = generator.search_for_tagfiles(
-        suggestion=args.qtdoc_dir,
-        doclink=args.qtdoc_link,
-        flattenlinks=args.qtdoc_flatten_links,
-        searchpaths=searchpaths)
+    admission.configure(args.max_cpus, args.max_memory, args.jobs)
+    if args.trace:
+        tracing.enable()
+    if args.profile:
+        tracing.enable_profiling(args.profile)
+    try:
+        _do_it(args, maintainers_fct, copyright, searchpaths)
+    finally:
+        if args.trace:
+            tracing.write_chrome_trace(args.trace)
+            tracing.log_summary()
+        if args.profile:
+            profile_dir = args.profile_dir or os.path.join(utils.cache_dir(), 'profile')
+            report = tracing.write_profiles(profile_dir, args.profile_top)
+            if report:
+                logging.info(f'Profiles written to {profile_dir}, see {report}')
+
+
+def _do_it(args, maintainers_fct, copyright, searchpaths):
+    with tracing.span('tag files'):
+        tagfiles = generator.search_for_tagfiles(
+            suggestion=args.qtdoc_dir,
+            doclink=args.qtdoc_link,
+            flattenlinks=args.qtdoc_flatten_links,
+            searchpaths=searchpaths)
+        external_tagfiles = tagfiles
+        tagfiles = generator.slim_tagfiles(external_tagfiles)
 
     rootdir = args.sourcesdir
-    maintainers = maintainers_fct()
+    with tracing.span('discovery'):
+        maintainers = maintainers_fct()
 
-    metalist = preprocessing.parse_tree(rootdir)
-    products, groups, libraries, available_platforms = preprocessing.sort_metainfo(metalist, maintainers)
+        metalist = preprocessing.parse_tree(rootdir)
+        products, groups, libraries, available_platforms = preprocessing.sort_metainfo(metalist, maintainers)
 
     dirsrc = os.path.join(args.doxdatadir, 'htmlresource')
     dirdest = 'resources'
@@ -73,53 +97,97 @@ def do_it(maintainers_fct, copyright, searchpaths=None):
                                           qch_enabled=args.qhp
                                           )
     tmp_dir = tempfile.mkdtemp(prefix='kapidox-')
+    costs = costmodel.CostModel()
 
     try:
         if args.depdiagram_dot_dir:
-            dot_files = utils.find_dot_files(args.depdiagram_dot_dir)
-            assert dot_files
-        for lib in libraries:
-            logging.info(f'# Generating doc for {lib.fancyname}')
-            if args.depdiagram_dot_dir:
-                png_path = os.path.join(tmp_dir, lib.name) + '.png'
-                ok = generator.generate_diagram(png_path, lib.fancyname,
-                                                dot_files, tmp_dir)
-                if ok:
-                    lib.dependency_diagram = png_path
-
-            # store this as we won't use that every time
-            create_qhp = args.qhp
-            args.qhp = False
-            ctx = generator.create_fw_context(args, lib, tagfiles)
-            # set it back
-            args.qhp = create_qhp
-
-            generator.gen_fw_apidocs(ctx, tmp_dir)
-            tagfiles.insert(0, generator.create_fw_tagfile_tuple(lib))
-
-        # Rebuild for interdependencies
-        for lib in libraries:
-            logging.info(f'# Rebuilding {lib.fancyname} for interdependencies')
-            shutil.rmtree(lib.outputdir)
-            ctx = generator.create_fw_context(args, lib, tagfiles, copyright)
-            generator.gen_fw_apidocs(ctx, tmp_dir)
-            generator.finish_fw_apidocs(ctx)
-            if not ctx.is_qdoc:
-                logging.info('# Generate indexing files')
-                generator.indexer(lib)
-        for product in products:
-            if not product.metainfo['qdoc']:
-                generator.create_product_index(product)
-
-            if product.logo_url is not None:
-                logodir = os.path.dirname(product.logo_url)
-                if not os.path.isdir(logodir):
-                    os.mkdir(logodir)
-                shutil.copy(product.logo_url_src, product.logo_url)
-        generator.create_global_index(products)
+            with tracing.span('diagrams'):
+                dot_files = utils.find_dot_files(args.depdiagram_dot_dir)
+                assert dot_files
+                logging.info('# Loading dependency diagram data')
+                depdiagram_db = depdiagram.FrameworkDb()
+                depdiagram_db.populate(dot_files)
+                generator.generate_diagrams(libraries, depdiagram_db, tmp_dir,
+                                            jobs=args.jobs,
+                                            fmt=args.depdiagram_format,
+                                            costs=costs)
+        with tracing.span('pass one'):
+            progress = costmodel.Progress(
+                'pass one', costs.estimate_all(libraries, ('doxygen-pass1',)))
+            for lib in libraries:
+                progress.log(lib, 'Generating doc for')
+
+                with tracing.span(lib.fancyname, 'pass one'):
+                    # store this as we won't use that every time
+                    create_qhp = args.qhp
+                    args.qhp = False
+                    ctx = generator.create_fw_context(
+                        args, lib, generator.filter_tagfiles(lib, tagfiles, libraries),
+                        memory_estimate=costs.estimate_maxrss(lib, 'doxygen-pass1'),
+                        # Libraries are generated one at a time in this pass
+                        threads=admission.threads_per_job(jobs=1))
+                    # set it back
+                    args.qhp = create_qhp
+
+                    with tracing.measure() as measure:
+                        generator.gen_fw_apidocs(ctx, tmp_dir)
+                    costs.record(lib, 'doxygen-pass1', measure.busy, measure.child_maxrss)
+                tagfiles.insert(0, generator.create_fw_tagfile_tuple(lib))
+                progress.done(lib)
+
+        # Rebuild for interdependencies. All the tag files exist now; the
+        # libraries read copies of them, so that they do not depend on each
+        # other anymore while their own tag files are rewritten.
+        with tracing.span('pass two'):
+            snapshots = generator.snapshot_fw_tagfiles(libraries, os.path.join(tmp_dir, 'tagfiles'))
+            estimates = costs.estimate_all(libraries, ('doxygen-pass2', 'postprocess'))
+            if tracing.is_profiling():
+                # cProfile only sees the thread it runs in
+                logging.info('Rebuilding one library at a time to profile them')
+                progress = costmodel.Progress('pass two', estimates)
+                for lib in costmodel.schedule(libraries, estimates):
+                    _rebuild_library(args, lib, tagfiles, snapshots, libraries, copyright,
+                                     tmp_dir, costs)
+                    progress.done(lib)
+                    progress.log(lib, 'Rebuilt')
+            else:
+                progress = costmodel.Progress('pass two', estimates, args.jobs)
+                with ThreadPoolExecutor(max_workers=args.jobs) as executor:
+                    futures = {
+                        executor.submit(_rebuild_library, args, lib, tagfiles, snapshots,
+                                        libraries, copyright, tmp_dir, costs): lib
+                        for lib in costmodel.schedule(libraries, estimates)
+                    }
+                    try:
+                        for future in as_completed(futures):
+                            future.result()
+                            lib = futures[future]
+                            progress.done(lib)
+                            progress.log(lib, 'Rebuilt')
+                    except BaseException:
+                        for future in futures:
+                            future.cancel()
+                        raise
+        with tracing.span('indexing'):
+            for product in products:
+                if not product.metainfo['qdoc']:
+                    generator.create_product_index(product)
+
+                if product.logo_url is not None:
+                    logodir = os.path.dirname(product.logo_url)
+                    if not os.path.isdir(logodir):
+                        os.mkdir(logodir)
+                    shutil.copy(product.logo_url_src, product.logo_url)
+            generator.create_global_index(products)
+            logging.info('# Creating search database')
+            generator.create_search_database(products)
+            logging.info('# Creating symbol index')
+            symbolindex.create_symbol_index(libraries, external_tagfiles)
         if args.qhp:
             logging.info('# Merge qch files')
-            generator.create_qch(products, tagfiles)
+            with tracing.span('qch'):
+                generator.create_qch(products, tagfiles, jobs=args.jobs,
+                                     qhelpgenerator=args.qhelpgenerator)
         logging.info("# Writing metadata...")
         with open('metadata.json', 'w') as file:
             json.dump(metalist, file)
@@ -130,7 +198,34 @@ def do_it(maintainers_fct, copyright, searchpaths=None):
             json.dump(libs, file)
         logging.info('# Done')
     finally:
+        costs.close()
         if args.keep_temp_dirs:
             logging.info(f'Kept temp dir at {tmp_dir}')
         else:
             shutil.rmtree(tmp_dir)
+
+
+def _rebuild_library(args, lib, tagfiles, snapshots, libraries, copyright, tmp_dir, costs):
+    """Generate the final documentation of `lib`, once the tag files of all
+    the libraries exist
+
+    The tag files of the libraries are read from their copies in
+    `snapshots`, see generator.snapshot_fw_tagfiles().
+    """
+    with tracing.span(lib.fancyname, 'pass two'):
+        shutil.rmtree(lib.outputdir)
+        lib_tagfiles = [(snapshots.get(path, path), link)
+                        for path, link in generator.filter_tagfiles(lib, tagfiles, libraries)]
+        ctx = generator.create_fw_context(
+            args, lib, lib_tagfiles, copyright,
+            memory_estimate=costs.estimate_maxrss(lib, 'doxygen-pass2'))
+        with tracing.measure() as measure:
+            generator.gen_fw_apidocs(ctx, tmp_dir)
+        costs.record(lib, 'doxygen-pass2', measure.busy, measure.child_maxrss)
+
+        with tracing.measure() as measure:
+            generator.finish_fw_apidocs(ctx)
+            if not ctx.is_qdoc:
+                logging.info(f'# Generate indexing files for {lib.fancyname}')
+                generator.indexer(lib)
+        costs.record(lib, 'postprocess', measure.busy, measure.child_maxrss)
@@ -95,6 +95,8 @@ class Library(object):
             # backward compat
             self.exampledirs = utils.tolist(metainfo.get('public_example_dir', ['examples']))
         self.dependency_diagram = None
+        # Names of the libraries this one depends on, None if unknown
+        self.dependencies = metainfo.get('dependencies')
         self.type = metainfo.get('type', '')
         self.portingAid = metainfo.get('portingAid', False)
         self.deprecated = metainfo.get('deprecated', False)
@@ -10,7 +10,7 @@
 import logging
 import os
 import sys
-from typing import Any, Dict, Optional
+from typing import Any, Dict, List, Optional
 
 from urllib.request import Request, urlopen
 from urllib.error import HTTPError
@@ -60,6 +60,40 @@ def expand_platform_all(dct, available_platforms):
                 dct[platform] = note
 
 
+def read_dependencies(path) -> Optional[List[str]]:
+    """Read the names of the repositories a repository depends on from its
+    `.kde-ci.yml` file.
+
+    Args:
+        path: (string) the path of the repository.
+    Returns:
+        The list of repository names, or `None` if the dependencies are
+    unknown.
+    """
+    ci_file = os.path.join(path, '.kde-ci.yml')
+    if not os.path.isfile(ci_file):
+        return None
+
+    try:
+        with open(ci_file) as f:
+            ci = yaml.safe_load(f)
+    except Exception as e:
+        logging.warning(f'Could not load .kde-ci.yml for {path}: {e}')
+        return None
+
+    if not isinstance(ci, dict):
+        return None
+
+    dependencies = set()
+    for entry in ci.get('Dependencies') or []:
+        if not isinstance(entry, dict):
+            continue
+        for project in (entry.get('require') or {}):
+            # Projects are named like "frameworks/kcoreaddons"
+            dependencies.add(project.rsplit('/', 1)[-1])
+    return sorted(dependencies)
+
+
 def create_metainfo(path) -> Optional[Dict[str, Any]]:
     """Look for a `metadata.yaml` file and create a dictionary out it.
 
@@ -119,6 +153,11 @@ def create_metainfo(path) -> Optional[Dict[str, Any]]:
     else:
         repo_id = dirname
 
+    if 'dependencies' in metainfo:
+        dependencies = utils.tolist(metainfo['dependencies'])
+    else:
+        dependencies = read_dependencies(path)
+
     qdoc: bool = False
 
     if 'qdoc' in metainfo:
@@ -130,6 +169,7 @@ def create_metainfo(path) -> Optional[Dict[str, Any]]:
         'repo_id': repo_id,
         'public_lib': metainfo.get('public_lib', False),
         'dependency_diagram': None,
+        'dependencies': dependencies,
         'path': path,
         'qdoc': qdoc,
     })
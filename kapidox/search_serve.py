@@ -0,0 +1,213 @@
+#! /usr/bin/env python3
+# -*- coding: utf-8 -*-
+#
+# SPDX-License-Identifier: BSD-2-Clause
+
+import argparse
+import json
+import logging
+import os
+import re
+import sqlite3
+import sys
+import threading
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+from urllib.parse import parse_qs, urlparse
+
+from kapidox import utils
+
+## @package kapidox.search_serve
+#
+# Answer search queries over HTTP using the searchdata.sqlite database
+# created by kapidox-generate.
+#
+
+DESCRIPTION = """\
+Serve ranked, paginated search results from the searchdata.sqlite database
+created by kapidox-generate.
+
+Query it with GET /search?q=QUERY[&page=N][&per_page=N][&product=NAME].
+"""
+
+DEFAULT_PER_PAGE = 20
+
+MAX_PER_PAGE = 100
+
+# Deeper pages are refused, nobody reads that far and SQLite cannot handle
+# arbitrarily large offsets
+MAX_PAGE = 1000
+
+# Matches in names weigh more than matches in keywords, which weigh more than
+# matches in the text.
+RANK = 'bm25(docs, 10.0, 5.0, 1.0)'
+
+
+def fts_query(query):
+    """Turn a user query into a FTS5 query
+
+    Every word of the query is quoted, so that FTS5 operators typed by the
+    user are not interpreted, and matched as a prefix.
+
+    Returns:
+        The FTS5 query, or None if the query does not contain any word.
+    """
+    words = re.findall(r'\w+', query)
+    if not words:
+        return None
+    return ' '.join('"' + word + '"*' for word in words)
+
+
+class SearchDatabase(object):
+    """Read-only access to a search database, usable from several threads"""
+    def __init__(self, path):
+        self.path = path
+        self._local = threading.local()
+
+    def _connection(self):
+        conn = getattr(self._local, 'conn', None)
+        if conn is None:
+            uri = 'file:' + os.path.abspath(self.path) + '?mode=ro'
+            conn = sqlite3.connect(uri, uri=True)
+            self._local.conn = conn
+        return conn
+
+    def search(self, query, page=1, per_page=DEFAULT_PER_PAGE, product=None):
+        """Search the database
+
+        Args:
+            query:    (string) the words to look for.
+            page:     (int) the page of results to return, starting at 1.
+            per_page: (int) the number of results per page.
+            product:  (string) if set, only return results from the product
+                      with this fancy name.
+
+        Returns:
+            A dict with the total number of results and the results of the
+        requested page, best matches first.
+        """
+        match = fts_query(query)
+        if match is None:
+            return {'total': 0, 'results': []}
+
+        where = 'docs MATCH ?'
+        params = [match]
+        if product:
+            where += ' AND product = ?'
+            params.append(product)
+
+        conn = self._connection()
+        total = conn.execute('SELECT count(*) FROM docs WHERE ' + where, params).fetchone()[0]
+        rows = conn.execute(
+            "SELECT name, url, type, library, product,"
+            " snippet(docs, 2, '<b>', '</b>', '...', 16)"
+            " FROM docs WHERE " + where +
+            " ORDER BY " + RANK + " LIMIT ? OFFSET ?",
+            params + [per_page, (page - 1) * per_page])
+        results = [{'name': name, 'url': url, 'type': type_, 'library': library,
+                    'product': product_, 'text': text}
+                   for name, url, type_, library, product_, text in rows]
+        return {'total': total, 'results': results}
+
+
+def parse_search_params(query_string):
+    """Read the parameters of a search request
+
+    `page` and `per_page` are clamped to the accepted range.
+
+    Returns:
+        A tuple (query, page, per_page, product).
+
+    Raises:
+        ValueError: if `page` or `per_page` is not an integer, or if `page`
+    is larger than MAX_PAGE.
+    """
+    params = parse_qs(query_string)
+    query = params.get('q', [''])[0]
+    product = params.get('product', [None])[0]
+    try:
+        page = max(1, int(params.get('page', ['1'])[0]))
+        per_page = int(params.get('per_page', [str(DEFAULT_PER_PAGE)])[0])
+    except ValueError:
+        raise ValueError('page and per_page must be integers') from None
+    if page > MAX_PAGE:
+        raise ValueError(f'page must not be larger than {MAX_PAGE}')
+    per_page = min(max(1, per_page), MAX_PER_PAGE)
+    return query, page, per_page, product
+
+
+class SearchRequestHandler(BaseHTTPRequestHandler):
+    # Set by create_server()
+    database = None
+
+    def do_GET(self):
+        url = urlparse(self.path)
+        if url.path != '/search':
+            self.send_error(404)
+            return
+
+        try:
+            query, page, per_page, product = parse_search_params(url.query)
+        except ValueError as exc:
+            self.send_error(400, str(exc))
+            return
+
+        try:
+            result = self.database.search(query, page=page, per_page=per_page,
+                                          product=product)
+        except OverflowError:
+            self.send_error(400, 'page is too large')
+            return
+        except sqlite3.Error as exc:
+            logging.error(f'Query {query!r} failed: {exc}')
+            self.send_error(500)
+            return
+
+        result.update({'query': query, 'page': page, 'per_page': per_page})
+        body = json.dumps(result).encode('utf-8')
+        self.send_response(200)
+        self.send_header('Content-Type', 'application/json; charset=utf-8')
+        self.send_header('Content-Length', str(len(body)))
+        self.send_header('Access-Control-Allow-Origin', '*')
+        self.end_headers()
+        self.wfile.write(body)
+
+    def log_message(self, format, *args):
+        logging.debug(format % args)
+
+
+def create_server(database_path, host, port):
+    handler = type('Handler', (SearchRequestHandler,),
+                   {'database': SearchDatabase(database_path)})
+    return ThreadingHTTPServer((host, port), handler)
+
+
+def main():
+    utils.setup_logging()
+    parser = argparse.ArgumentParser(
+        formatter_class=argparse.RawDescriptionHelpFormatter,
+        description=DESCRIPTION)
+    parser.add_argument('database',
+                        help='Path to the searchdata.sqlite file')
+    parser.add_argument('--host', default='127.0.0.1',
+                        help='Address to listen on (default: %(default)s)')
+    parser.add_argument('--port', type=int, default=8001,
+                        help='Port to listen on (default: %(default)s)')
+    args = parser.parse_args()
+
+    if not os.path.isfile(args.database):
+        logging.error(f'{args.database} is not a file')
+        return 1
+
+    server = create_server(args.database, args.host, args.port)
+    logging.info(f'Serving {args.database} on http://{args.host}:{args.port}/search')
+    try:
+        server.serve_forever()
+    except KeyboardInterrupt:
+        pass
+    finally:
+        server.server_close()
+    return 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
@@ -0,0 +1,226 @@
+#! /usr/bin/env python3
+# -*- coding: utf-8 -*-
+#
+# SPDX-License-Identifier: BSD-2-Clause
+
+import argparse
+import json
+import logging
+import os
+import sys
+import xml.etree.ElementTree as ET
+from collections import namedtuple
+from urllib.parse import urljoin
+
+from kapidox import utils
+
+## @package kapidox.symbolindex
+#
+# Index of the documented symbols of all libraries.
+#
+# The index maps fully qualified names (like `KIO::Job` or `KJob::kill`) to the
+# library documenting them and the URL of their documentation. It is built
+# from Doxygen tag files, including the Qt ones, and saved as a JSON file so
+# that other tools can load it and do constant time lookups.
+#
+
+__all__ = (
+    "Symbol",
+    "SymbolIndex",
+    "SYMBOL_INDEX",
+    )
+
+SYMBOL_INDEX = 'symbols.json'
+
+FORMAT_VERSION = 1
+
+# Compounds whose members are prefixed with the compound name
+SCOPE_KINDS = {'class', 'struct', 'union', 'namespace', 'interface', 'protocol',
+               'category', 'exception', 'service', 'singleton'}
+
+Symbol = namedtuple('Symbol', ['name', 'kind', 'library', 'url'])
+
+
+def _html_filename(filename):
+    # Doxygen omits the extension in some tag files, and adds it back when
+    # creating links
+    if os.path.splitext(filename)[1]:
+        return filename
+    return filename + '.html'
+
+
+def _join_link(link, filename):
+    if '://' in link:
+        if not link.endswith('/'):
+            link += '/'
+        return urljoin(link, filename)
+    return os.path.join(link, filename)
+
+
+class SymbolIndex(object):
+    """Map fully qualified symbol names to their documentation"""
+    def __init__(self):
+        self._libraries = []
+        # name => (library index, kind, url)
+        self._symbols = {}
+
+    def add_tagfile(self, tagfile, link, library=None):
+        """Add all the symbols of a Doxygen tag file to the index
+
+        When a symbol is already known, the first definition is kept. If the
+        tag file cannot be read or parsed, the index is left unchanged.
+
+        Args:
+            tagfile: (string) path to the tag file.
+            link:    (string) path or URL of the directory the HTML files
+                     referenced by the tag file are in.
+            library: (string) name of the library the tag file documents;
+                     defaults to the base name of the tag file.
+
+        Raises:
+            OSError, xml.etree.ElementTree.ParseError: the tag file could not
+            be read.
+        """
+        if library is None:
+            library = os.path.splitext(os.path.basename(tagfile))[0]
+        lib_idx = len(self._libraries)
+
+        # Collect the symbols apart so that a truncated tag file does not
+        # leave half of its symbols in the index
+        known = self._symbols
+        symbols = {}
+        for _, compound in ET.iterparse(tagfile):
+            if compound.tag != 'compound':
+                continue
+            kind = compound.get('kind')
+            name = compound.findtext('name')
+            filename = compound.findtext('filename')
+            if name and filename and name not in known and name not in symbols:
+                symbols[name] = (lib_idx, kind, _join_link(link, _html_filename(filename)))
+
+            prefix = name + '::' if kind in SCOPE_KINDS and name else ''
+            for member in compound.iterfind('member'):
+                member_name = member.findtext('name')
+                anchorfile = member.findtext('anchorfile')
+                if not member_name or not anchorfile:
+                    continue
+                qualified_name = prefix + member_name
+                if qualified_name in known or qualified_name in symbols:
+                    continue
+                url = _join_link(link, _html_filename(anchorfile))
+                anchor = member.findtext('anchor')
+                if anchor:
+                    url += '#' + anchor
+                symbols[qualified_name] = (lib_idx, member.get('kind'), url)
+            # Compounds are not needed anymore once indexed, free them to keep
+            # memory usage low on big tag files
+            compound.clear()
+
+        self._libraries.append(library)
+        known.update(symbols)
+
+    def lookup(self, name):
+        """Return the Symbol for `name`, or None if it is not documented"""
+        entry = self._symbols.get(name)
+        if entry is None:
+            return None
+        lib_idx, kind, url = entry
+        return Symbol(name, kind, self._libraries[lib_idx], url)
+
+    def __contains__(self, name):
+        return name in self._symbols
+
+    def __len__(self):
+        return len(self._symbols)
+
+    def save(self, path):
+        dct = {
+            'version': FORMAT_VERSION,
+            'libraries': self._libraries,
+            'symbols': self._symbols,
+            }
+        tmp_path = path + '.new'
+        with open(tmp_path, 'w') as f:
+            json.dump(dct, f, separators=(',', ':'))
+        os.replace(tmp_path, path)
+
+    @classmethod
+    def load(cls, path):
+        with open(path) as f:
+            dct = json.load(f)
+        if dct.get('version') != FORMAT_VERSION:
+            raise ValueError(f'{path} is not a symbol index kapidox can read')
+        index = cls()
+        index._libraries = dct['libraries']
+        index._symbols = {name: tuple(entry) for name, entry in dct['symbols'].items()}
+        return index
+
+
+def create_symbol_index(libraries, tagfiles, path=SYMBOL_INDEX):
+    """Create the symbol index of a documentation build
+
+    Args:
+        libraries: (list of Libraries) the documented libraries; their tag
+                   files must have been generated.
+        tagfiles:  (list of pairs of (tag_file, link_path)) external tag
+                   files, such as the ones from search_for_tagfiles().
+        path:      (string) where to write the index.
+
+    Tag files which cannot be read are skipped with a warning.
+
+    Returns:
+        The SymbolIndex.
+    """
+    index = SymbolIndex()
+
+    def add(tagfile, link, library=None):
+        try:
+            index.add_tagfile(tagfile, link, library=library)
+        except (OSError, ET.ParseError) as exc:
+            logging.warning(f'Could not index the symbols of {tagfile}, skipping it: {exc}')
+
+    for lib in libraries:
+        tagfile = os.path.join(lib.outputdir, 'html', lib.fancyname + '.tags')
+        if os.path.isfile(tagfile):
+            add(tagfile, lib.outputdir + '/html', library=lib.fancyname)
+    for tagfile, link in tagfiles:
+        add(tagfile, link)
+    index.save(path)
+    return index
+
+
+DESCRIPTION = """\
+Look up where symbols are documented, using the symbols.json index created by
+kapidox-generate.
+"""
+
+
+def main():
+    utils.setup_logging()
+    parser = argparse.ArgumentParser(description=DESCRIPTION)
+    parser.add_argument("-i", "--index", default=SYMBOL_INDEX,
+                        help="Path to the symbol index (default: %(default)s)",
+                        metavar="FILE")
+    parser.add_argument("names", nargs="+", metavar="NAME",
+                        help="Fully qualified name of a symbol, like KIO::Job")
+    args = parser.parse_args()
+
+    try:
+        index = SymbolIndex.load(args.index)
+    except (OSError, ValueError) as exc:
+        logging.error(f"Could not load {args.index}: {exc}")
+        return 2
+
+    ret = 0
+    for name in args.names:
+        symbol = index.lookup(name)
+        if symbol is None:
+            logging.error(f"{name} not found")
+            ret = 1
+            continue
+        print(f"{symbol.name}\t{symbol.kind}\t{symbol.library}\t{symbol.url}")
+    return ret
+
+
+if __name__ == "__main__":
+    sys.exit(main())
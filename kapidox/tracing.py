@@ -0,0 +1,387 @@
+# -*- coding: utf-8 -*-
+#
+# SPDX-License-Identifier: BSD-2-Clause
+
+"""
+Measure where the time of a run goes
+
+Code is instrumented with spans: span() is a context manager and traced() a
+decorator. Each span records its wall time, the CPU time of the thread it runs
+in, the resources used by the child processes (doxygen, qdoc, dot...) run
+through call() while it is open, and the time spent waiting for the admission
+control to start them (see account_wait()).
+
+Tracing is disabled until enable() is called; disabled spans cost next to
+nothing. Once enabled, the spans can be exported with write_chrome_trace(),
+which can be loaded in chrome://tracing or https://ui.perfetto.dev, and
+summarized with log_summary().
+
+Spans can also be profiled with cProfile, see enable_profiling().
+"""
+
+import cProfile
+import functools
+import io
+import json
+import logging
+import os
+import pstats
+import re
+import subprocess
+import sys
+import threading
+import time
+from contextlib import contextmanager
+
+__all__ = ('enable', 'is_enabled', 'span', 'measure', 'traced', 'call', 'account_wait',
+           'write_chrome_trace', 'log_summary', 'enable_profiling', 'is_profiling', 'write_profiles')
+
+
+class Span(object):
+    def __init__(self, name, category, args, start, cpu_start):
+        self.name = name
+        self.category = category
+        self.args = args
+        self.tid = threading.get_ident()
+        self.start = start
+        self.end = None
+        self._cpu_start = cpu_start
+        self.cpu = 0.
+        # Resources used by child processes
+        self.child_utime = 0.
+        self.child_stime = 0.
+        self.child_maxrss = 0
+        # Time spent waiting for the admission control
+        self.wait = 0.
+
+    @property
+    def wall(self):
+        return self.end - self.start
+
+    @property
+    def busy(self):
+        """The wall time, without the time spent waiting for the admission
+        control"""
+        return self.wall - self.wait
+
+
+class Tracer(object):
+    def __init__(self):
+        self.enabled = False
+        self.spans = []
+        self._lock = threading.Lock()
+        self._local = threading.local()
+        self._origin = time.perf_counter()
+
+    def _stack(self):
+        stack = getattr(self._local, 'stack', None)
+        if stack is None:
+            stack = []
+            self._local.stack = stack
+        return stack
+
+    def begin(self, name, category, args):
+        span = Span(name, category, args, time.perf_counter(), time.thread_time())
+        self._stack().append(span)
+        return span
+
+    def end(self, span, record=True):
+        span.end = time.perf_counter()
+        span.cpu = time.thread_time() - span._cpu_start
+        stack = self._stack()
+        if span in stack:
+            stack.remove(span)
+        if record:
+            with self._lock:
+                self.spans.append(span)
+
+    def is_measuring(self):
+        """Whether child processes run by the current thread must be
+        measured"""
+        return bool(self._stack())
+
+    def add_child_rusage(self, rusage):
+        """Account the resources used by a child process to the open spans of
+        the current thread"""
+        for span in self._stack():
+            span.child_utime += rusage.ru_utime
+            span.child_stime += rusage.ru_stime
+            span.child_maxrss = max(span.child_maxrss, rusage.ru_maxrss)
+
+    def add_wait(self, seconds):
+        """Account time spent waiting to the open spans of the current
+        thread"""
+        for span in self._stack():
+            span.wait += seconds
+
+    def chrome_trace(self):
+        pid = os.getpid()
+        events = []
+        with self._lock:
+            spans = sorted(self.spans, key=lambda x: x.start)
+        for span in spans:
+            args = dict(span.args)
+            args.update(
+                cpu_ms=round(span.cpu * 1000, 3),
+                child_user_ms=round(span.child_utime * 1000, 3),
+                child_sys_ms=round(span.child_stime * 1000, 3),
+                child_maxrss_kb=span.child_maxrss,
+                wait_ms=round(span.wait * 1000, 3))
+            events.append({
+                'name': span.name,
+                'cat': span.category,
+                'ph': 'X',
+                'ts': round((span.start - self._origin) * 1e6),
+                'dur': round(span.wall * 1e6),
+                'pid': pid,
+                'tid': span.tid,
+                'args': args,
+            })
+        return {'traceEvents': events, 'displayTimeUnit': 'ms'}
+
+    def summary(self):
+        """Returns a list of (category, name, count, wall, cpu, child_cpu),
+        the longest first"""
+        totals = {}
+        with self._lock:
+            spans = list(self.spans)
+        for span in spans:
+            key = (span.category, span.name)
+            count, wall, cpu, child_cpu = totals.get(key, (0, 0., 0., 0.))
+            totals[key] = (count + 1, wall + span.wall, cpu + span.cpu,
+                           child_cpu + span.child_utime + span.child_stime)
+        rows = [key + value for key, value in totals.items()]
+        return sorted(rows, key=lambda x: x[3], reverse=True)
+
+
+class Profiling(object):
+    """
+    Runs the spans with chosen names under cProfile
+
+    All the calls of a span are accumulated in one profile. Profiles only
+    cover the thread that starts them, so only one thread is profiled at a
+    time: spans opened in other threads meanwhile are skipped, with a warning.
+
+    A span named explicitly, opened while another span is profiled, gets its
+    own profile: the outer profile is paused until it ends. With "all", the
+    nested spans are part of the profile of the outer one.
+    """
+    def __init__(self):
+        self.names = set()
+        self._profiles = {}
+        self._owner = None
+        self._stack = []
+        self._warned = set()
+        self._lock = threading.Lock()
+
+    def wants(self, name):
+        return bool(self.names) and ('all' in self.names or name in self.names)
+
+    def _skip(self, name, reason):
+        if name not in self._warned:
+            self._warned.add(name)
+            logging.warning(f'Not profiling {name}: {reason}')
+
+    def start(self, name):
+        thread = threading.get_ident()
+        with self._lock:
+            if self._owner not in (None, thread):
+                self._skip(name, 'it runs in another thread than the profiled span')
+                return None
+            if self._stack and name not in self.names:
+                # Selected by "all", already part of the outer profile
+                return None
+            if not self._stack and sys.getprofile() is not None:
+                self._skip(name, 'another profiler is active')
+                return None
+            profile = self._profiles.get(name)
+            if profile is None:
+                profile = cProfile.Profile()
+                self._profiles[name] = profile
+            elif profile in self._stack:
+                # Recursive span, already being profiled
+                return None
+            if self._stack:
+                self._stack[-1].disable()
+            self._stack.append(profile)
+            self._owner = thread
+        profile.enable()
+        return profile
+
+    def stop(self, profile):
+        profile.disable()
+        with self._lock:
+            self._stack.remove(profile)
+            outer = self._stack[-1] if self._stack else None
+            if outer is None:
+                self._owner = None
+        if outer is not None:
+            outer.enable()
+
+    def write(self, out_dir, top):
+        """Write a .pstats file per profiled span to `out_dir`, and a report
+        of the `top` functions of all of them. Returns the path of the report,
+        or None if nothing has been profiled"""
+        with self._lock:
+            profiles = dict(self._profiles)
+        missing = sorted(self.names - set(profiles) - self._warned - {'all'})
+        if missing:
+            logging.warning(f'Not profiled, no span ran with these names: {", ".join(missing)}')
+        if not profiles:
+            return None
+        os.makedirs(out_dir, exist_ok=True)
+        paths = []
+        for name, profile in sorted(profiles.items()):
+            path = os.path.join(out_dir, re.sub(r'[^\w.-]+', '-', name) + '.pstats')
+            profile.dump_stats(path)
+            paths.append(path)
+
+        stream = io.StringIO()
+        stream.write(f"Profiled: {', '.join(sorted(profiles))}\n")
+        stats = pstats.Stats(*paths, stream=stream)
+        for key in ('tottime', 'cumulative'):
+            stream.write(f'\n# Top {top} functions by {key}\n')
+            stats.sort_stats(key).print_stats(top)
+        report_path = os.path.join(out_dir, 'report.txt')
+        with open(report_path, 'w') as f:
+            f.write(stream.getvalue())
+        return report_path
+
+
+_tracer = Tracer()
+_profiling = Profiling()
+
+
+def enable():
+    """Start recording spans"""
+    _tracer.enabled = True
+
+
+def is_enabled():
+    return _tracer.enabled
+
+
+def enable_profiling(names):
+    """Run the spans named after one of `names` under cProfile
+
+    `names` are the names of stages (like "pass two") or of traced functions
+    (like "indexer"); "all" profiles everything from the first span on.
+    """
+    _profiling.names.update(names)
+
+
+def is_profiling():
+    """Whether spans may be profiled. Code running spans in several threads
+    should then run them in the calling thread, which is the one profiled"""
+    return bool(_profiling.names)
+
+
+def write_profiles(out_dir, top=30):
+    """Write the profiles to `out_dir`, see Profiling.write()"""
+    return _profiling.write(out_dir, top)
+
+
+@contextmanager
+def span(name, category='stage', **args):
+    """Record the time spent in the block as a span named `name`
+
+    `args` are stored with the span, and shown in the trace viewer.
+    """
+    profile = _profiling.wants(name)
+    if not _tracer.enabled and not profile:
+        yield
+        return
+    current = _tracer.begin(name, category, args) if _tracer.enabled else None
+    profiler = _profiling.start(name) if profile else None
+    try:
+        yield
+    finally:
+        if profiler is not None:
+            _profiling.stop(profiler)
+        if current is not None:
+            _tracer.end(current)
+
+
+@contextmanager
+def measure():
+    """Measure the block, even if tracing is disabled
+
+    Yields a Span whose `wall`, `cpu` and `child_*` attributes are set when
+    the block ends. The span is not part of the trace.
+    """
+    current = _tracer.begin('measure', 'measure', {})
+    try:
+        yield current
+    finally:
+        _tracer.end(current, record=False)
+
+
+def traced(name=None, category='generator'):
+    """Decorator recording each call of the function as a span, named after
+    the function unless `name` is set"""
+    def decorator(fct):
+        span_name = name or fct.__name__
+
+        @functools.wraps(fct)
+        def wrapper(*args, **kwargs):
+            if not _tracer.enabled and not _profiling.wants(span_name):
+                return fct(*args, **kwargs)
+            with span(span_name, category):
+                return fct(*args, **kwargs)
+        return wrapper
+    return decorator
+
+
+def _exit_status(status):
+    """Returns the exit status of a process from the status returned by
+    os.wait4(), like subprocess does: the exit code, or minus the signal that
+    killed the process"""
+    if os.WIFSIGNALED(status):
+        return -os.WTERMSIG(status)
+    if os.WIFEXITED(status):
+        return os.WEXITSTATUS(status)
+    raise ValueError(f'Unexpected wait status {status}')
+
+
+def call(cmd, **kwargs):
+    """Run a command like subprocess.call() and return its exit status
+
+    The CPU time and memory used by the command are accounted to the open
+    spans of the current thread, including those opened by measure(). When
+    there are none, the command is waited for like subprocess.call() does.
+    """
+    with subprocess.Popen(cmd, **kwargs) as process:
+        if not (_tracer.is_measuring() and hasattr(os, 'wait4')):
+            return process.wait()
+        try:
+            _, status, rusage = os.wait4(process.pid, 0)
+        except ChildProcessError:
+            # Already reaped by someone else
+            return process.wait()
+        process.returncode = _exit_status(status)
+        _tracer.add_child_rusage(rusage)
+        return process.returncode
+
+
+def account_wait(seconds):
+    """Tell the open spans of the current thread, including those opened by
+    measure(), that `seconds` of their wall time were spent waiting for
+    resources rather than working"""
+    _tracer.add_wait(seconds)
+
+
+def write_chrome_trace(path):
+    """Write the recorded spans to `path`, in Chrome trace event format"""
+    with open(path, 'w') as f:
+        json.dump(_tracer.chrome_trace(), f)
+
+
+def log_summary(limit=30):
+    """Log the `limit` longest span names, with their total durations"""
+    rows = _tracer.summary()
+    if not rows:
+        return
+    logging.info('# Time spent (seconds)')
+    logging.info(f"{'Category':<12} {'Name':<40} {'Count':>6} {'Wall':>9} {'CPU':>9} {'Children':>9}")
+    for category, name, count, wall, cpu, child_cpu in rows[:limit]:
+        logging.info(f'{category:<12.12} {name:<40.40} {count:>6} {wall:>9.2f} {cpu:>9.2f} {child_cpu:>9.2f}')
@@ -5,6 +5,7 @@
 # SPDX-License-Identifier: BSD-2-Clause
 
 from fnmatch import fnmatch
+import hashlib
 import logging
 import os
 import re
@@ -14,6 +15,8 @@ import sys
 import tempfile
 import requests
 
+from kapidox import tracing
+
 
 ## @package kapidox.utils
 #
@@ -49,6 +52,7 @@ def serialize_name(name):
         return None
 
 
+@tracing.traced(category='discovery')
 def set_repopath(id):
     """ Return the repopath for the repo id, queried from projects.kde.org
 
@@ -160,6 +164,15 @@ def cache_dir():
     return cachedir
 
 
+def file_digest(path):
+    """Return the SHA-256 digest of the content of a file, as a hex string."""
+    digest = hashlib.sha256()
+    with open(path, 'rb') as f:
+        for chunk in iter(lambda: f.read(1 << 20), b''):
+            digest.update(chunk)
+    return digest.hexdigest()
+
+
 def svn_export(remote, local, overwrite=False):
     """Wraps svn export.
 
@@ -231,6 +244,15 @@ def copy_dir_contents(directory, dest):
             shutil.copytree(f, dest_f, ignore=ignore)
 
 
+def find_qhelpgenerator():
+    """Returns the qhelpgenerator to use when none has been specified
+
+    On many distributions, qhelpgenerator from Qt5 is suffixed with "-qt5".
+    Look for it first, and fall back to the unsuffixed one if not found.
+    """
+    return shutil.which("qhelpgenerator-qt5") or "qhelpgenerator"
+
+
 _KAPIDOX_VERSION = None
 
 
@@ -15,6 +15,8 @@ setup(
                 "kapidox-generate = kapidox.kapidox_generate:main",
                 "kapidox-depdiagram-prepare = kapidox.depdiagram_prepare:main",
                 "kapidox-depdiagram-generate = kapidox.depdiagram_generate:main",
+                "kapidox-search-serve = kapidox.search_serve:main",
+                "kapidox-symbol-lookup = kapidox.symbolindex:main",
             ],
         },
         install_requires=["doxypypy", "doxyqml", "requests", "jinja2", "pyyaml"]
@@ -0,0 +1,57 @@
+# -*- coding: utf-8 -*-
+#
+# SPDX-License-Identifier: BSD-2-Clause
+
+import threading
+import time
+import unittest
+
+from kapidox import admission, tracing
+
+
+class BudgetTest(unittest.TestCase):
+    def test_waits_for_cpus(self):
+        budget = admission.Budget(2)
+        started = threading.Event()
+        release = threading.Event()
+
+        def hold():
+            with budget.admit(cpus=2):
+                started.set()
+                release.wait()
+
+        holder = threading.Thread(target=hold)
+        holder.start()
+        started.wait()
+        threading.Timer(0.2, release.set).start()
+        with tracing.measure() as measure:
+            with budget.admit(cpus=1):
+                pass
+        holder.join()
+
+        self.assertGreaterEqual(measure.wait, 0.15)
+        self.assertLess(measure.busy, 0.1)
+
+    def test_no_wait(self):
+        budget = admission.Budget(2)
+        with tracing.measure() as measure:
+            with budget.admit(cpus=1):
+                with budget.admit(cpus=1):
+                    time.sleep(0.05)
+        self.assertEqual(measure.wait, 0.)
+        self.assertGreaterEqual(measure.busy, 0.05)
+
+    def test_too_large(self):
+        # A process larger than the budget runs once nothing else does
+        budget = admission.Budget(1, memory_kb=1024)
+        with budget.admit(cpus=4, memory_kb=4096):
+            pass
+
+    def test_threads_per_job(self):
+        self.assertEqual(admission.Budget(8, jobs=3).threads_per_job(), 2)
+        self.assertEqual(admission.Budget(2, jobs=4).threads_per_job(), 1)
+        self.assertEqual(admission.Budget(8, jobs=3).threads_per_job(jobs=1), 8)
+
+
+if __name__ == '__main__':
+    unittest.main()
@@ -0,0 +1,83 @@
+# -*- coding: utf-8 -*-
+#
+# SPDX-License-Identifier: BSD-2-Clause
+
+import unittest
+
+from kapidox import costmodel
+
+
+class _Library(object):
+    def __init__(self, name):
+        self.outputdir = name
+        self.fancyname = name.capitalize()
+
+
+
+class ScheduleTest(unittest.TestCase):
+    def test_longest_first(self):
+        a, b, c = _Library('a'), _Library('b'), _Library('c')
+        estimates = {a: 1., b: 10., c: 5.}
+        self.assertEqual(costmodel.schedule([a, b, c], estimates), [b, c, a])
+
+    def test_stable(self):
+        libs = [_Library(x) for x in 'abcd']
+        estimates = {lib: 2. for lib in libs}
+        self.assertEqual(costmodel.schedule(libs, estimates), libs)
+
+    def test_empty(self):
+        self.assertEqual(costmodel.schedule([], {}), [])
+
+
+class CostModelTest(unittest.TestCase):
+    def setUp(self):
+        self.costs = costmodel.CostModel(':memory:')
+        self.addCleanup(self.costs.close)
+
+    def test_estimate(self):
+        lib = _Library('a')
+        self.assertIsNone(self.costs.estimate(lib, ('doxygen-pass2',)))
+        self.costs.record(lib, 'doxygen-pass2', 4., 1000)
+        self.costs.record(lib, 'doxygen-pass2', 6., 3000)
+        self.costs.record(lib, 'postprocess', 1., 10)
+        self.assertEqual(self.costs.estimate(lib, ('doxygen-pass2',)), 5.)
+        self.assertEqual(self.costs.estimate(lib, ('doxygen-pass2', 'postprocess')), 6.)
+        self.assertEqual(self.costs.estimate_maxrss(lib, 'doxygen-pass2'), 3000)
+
+    def test_stages_are_separate(self):
+        lib = _Library('a')
+        self.costs.record(lib, 'doxygen-pass1', 1., 100)
+        self.assertIsNone(self.costs.estimate(lib, ('doxygen-pass2',)))
+        self.assertIsNone(self.costs.estimate_maxrss(lib, 'doxygen-pass2'))
+
+    def test_history(self):
+        lib = _Library('a')
+        for seconds in range(costmodel.HISTORY + 3):
+            self.costs.record(lib, 'doxygen-pass2', float(seconds))
+        # Only the last runs count
+        expected = sum(range(3, costmodel.HISTORY + 3)) / costmodel.HISTORY
+        self.assertAlmostEqual(self.costs.estimate(lib, ('doxygen-pass2',)), expected)
+
+    def test_estimate_all(self):
+        a, b, c, d = (_Library(x) for x in 'abcd')
+        self.costs.record(a, 'doxygen-pass2', 1.)
+        self.costs.record(b, 'doxygen-pass2', 3.)
+        self.costs.record(c, 'doxygen-pass2', 8.)
+        estimates = self.costs.estimate_all([a, b, c, d], ('doxygen-pass2',))
+        self.assertEqual(estimates, {a: 1., b: 3., c: 8., d: 3.})
+
+    def test_estimate_all_without_history(self):
+        a, b = _Library('a'), _Library('b')
+        estimates = self.costs.estimate_all([a, b], ('doxygen-pass2', 'postprocess'))
+        self.assertEqual(estimates, {a: 2 * costmodel.DEFAULT_COST, b: 2 * costmodel.DEFAULT_COST})
+
+
+class FormatDurationTest(unittest.TestCase):
+    def test_format(self):
+        self.assertEqual(costmodel.format_duration(42.4), '42s')
+        self.assertEqual(costmodel.format_duration(125), '2m05s')
+        self.assertEqual(costmodel.format_duration(2 * 3600 + 7 * 60), '2h07m')
+
+
+if __name__ == '__main__':
+    unittest.main()
@@ -0,0 +1,114 @@
+# -*- coding: utf-8 -*-
+#
+# SPDX-License-Identifier: BSD-2-Clause
+
+import unittest
+
+from kapidox.depdiagram.framework import Framework
+from kapidox.depdiagram.generate import FrameworkCmp, transitive_reduction
+
+
+class TransitiveReductionTest(unittest.TestCase):
+    def test_implied_edges(self):
+        graph = {
+            'a': {'b', 'c', 'd'},
+            'b': {'c'},
+            'c': {'d'},
+            'd': set(),
+            }
+        self.assertEqual(transitive_reduction(graph),
+                         {'a': {'b'}, 'b': {'c'}, 'c': {'d'}, 'd': set()})
+
+    def test_nodes_without_entry(self):
+        # Targets without a framework only appear as edge heads
+        graph = {'a': {'b', 'Qt5::Core'}, 'b': {'Qt5::Core'}}
+        self.assertEqual(transitive_reduction(graph), {'a': {'b'}, 'b': {'Qt5::Core'}})
+
+    def test_unrelated_edges_kept(self):
+        graph = {'a': {'b', 'c'}, 'b': set(), 'c': set()}
+        self.assertEqual(transitive_reduction(graph), graph)
+
+    def test_edges_into_cycle(self):
+        graph = {'a': {'b', 'c'}, 'b': {'c'}, 'c': {'b'}}
+        self.assertEqual(transitive_reduction(graph), {'a': {'b'}, 'b': {'c'}, 'c': {'b'}})
+
+    def test_edges_out_of_cycle(self):
+        graph = {'a': {'b'}, 'b': {'a', 'c', 'd'}, 'c': {'d'}, 'd': set()}
+        self.assertEqual(transitive_reduction(graph),
+                         {'a': {'b'}, 'b': {'a', 'c'}, 'c': {'d'}, 'd': set()})
+
+    def test_edge_implied_through_cycle(self):
+        graph = {'a': {'b', 'd'}, 'b': {'c'}, 'c': {'b', 'd'}, 'd': set()}
+        self.assertEqual(transitive_reduction(graph),
+                         {'a': {'b'}, 'b': {'c'}, 'c': {'b', 'd'}, 'd': set()})
+
+    def test_long_chain(self):
+        # Longer than the recursion limit
+        size = 2000
+        graph = {i: {i + 1} for i in range(size)}
+        graph[0].add(size)
+        reduced = transitive_reduction(graph)
+        self.assertEqual(reduced[0], {1})
+
+
+class _Db(object):
+    def __init__(self, frameworks):
+        self._fw_for_target = {}
+        for fw in frameworks:
+            for target in fw.get_targets():
+                self._fw_for_target[target] = fw
+
+    def get_framework_for_target(self, target):
+        return self._fw_for_target[target]
+
+
+def _frameworks(deps):
+    # deps is a dict of framework name => names of the frameworks it depends on
+    frameworks = {}
+    for name in deps:
+        fw = Framework(1, name)
+        fw.add_target(name)
+        frameworks[name] = fw
+    for name, names in deps.items():
+        for dep in names:
+            frameworks[name].add_target_dependency(name, dep)
+    return frameworks
+
+
+class FrameworkCmpTest(unittest.TestCase):
+    def _sort(self, deps, order):
+        frameworks = _frameworks(deps)
+        fw_cmp = FrameworkCmp(_Db(frameworks.values()))
+        return [x.name for x in fw_cmp.sort(frameworks[x] for x in order)]
+
+    def test_dependencies_first(self):
+        deps = {
+            'KIO': ['KCoreAddons', 'KService', 'Qt5::Network'],
+            'KService': ['KCoreAddons'],
+            'KCoreAddons': ['Qt5::Core'],
+            'Attica': [],
+            }
+        self.assertEqual(self._sort(deps, deps), ['Attica', 'KCoreAddons', 'KService', 'KIO'])
+
+    def test_deterministic(self):
+        deps = {'C': [], 'A': [], 'D': ['B'], 'B': []}
+        expected = ['A', 'B', 'C', 'D']
+        self.assertEqual(self._sort(deps, 'ABCD'), expected)
+        self.assertEqual(self._sort(deps, 'DCBA'), expected)
+
+    def test_indirect_dependency_outside_list(self):
+        # C depends on A through B, which is not sorted
+        deps = {'A': [], 'B': ['A'], 'C': ['B']}
+        self.assertEqual(self._sort(deps, 'CA'), ['A', 'C'])
+
+    def test_cycle(self):
+        deps = {'A': ['B'], 'B': ['A'], 'C': ['A'], 'D': []}
+        self.assertEqual(self._sort(deps, 'CDBA'), ['D', 'A', 'B', 'C'])
+
+    def test_smallest_cycle_released_first(self):
+        deps = {'A': ['B'], 'B': ['C'], 'C': ['A'], 'E': ['D'], 'D': ['E']}
+        self.assertEqual(self._sort(deps, 'EDCBA'), ['D', 'E', 'A', 'B', 'C'])
+
+
+if __name__ == '__main__':
+    unittest.main()
@@ -0,0 +1,83 @@
+# -*- coding: utf-8 -*-
+#
+# SPDX-License-Identifier: BSD-2-Clause
+
+import os
+import stat
+import sys
+import tempfile
+import unittest
+from unittest import mock
+
+from kapidox.depdiagram import prune_cache, render_all
+
+# Stands for Graphviz's dot: copies the graph to the output file, and counts
+# its runs
+FAKE_DOT = """#!{python}
+import sys
+out_path = [x[2:] for x in sys.argv if x.startswith('-o')][0]
+with open(sys.argv[-1]) as f, open(out_path, 'w') as out:
+    out.write(f.read())
+with open({runs!r}, 'a') as f:
+    f.write('x')
+"""
+
+
+class RenderCacheTest(unittest.TestCase):
+    def setUp(self):
+        tmp_dir = tempfile.TemporaryDirectory()
+        self.addCleanup(tmp_dir.cleanup)
+        self.tmp_dir = tmp_dir.name
+        self.cache_dir = os.path.join(self.tmp_dir, 'cache')
+        self.runs_path = os.path.join(self.tmp_dir, 'runs')
+        bin_dir = os.path.join(self.tmp_dir, 'bin')
+        os.makedirs(bin_dir)
+        dot = os.path.join(bin_dir, 'dot')
+        with open(dot, 'w') as f:
+            f.write(FAKE_DOT.format(python=sys.executable, runs=self.runs_path))
+        os.chmod(dot, os.stat(dot).st_mode | stat.S_IEXEC)
+        patcher = mock.patch.dict(os.environ, {'PATH': bin_dir + os.pathsep + os.environ['PATH']})
+        patcher.start()
+        self.addCleanup(patcher.stop)
+        self.dot_path = os.path.join(self.tmp_dir, 'kio.dot')
+        self.out_path = os.path.join(self.tmp_dir, 'kio.png')
+
+    def _runs(self):
+        if not os.path.exists(self.runs_path):
+            return 0
+        with open(self.runs_path) as f:
+            return len(f.read())
+
+    def _render(self, graph):
+        with open(self.dot_path, 'w') as f:
+            f.write(graph)
+        failed = render_all([(self.dot_path, self.out_path, 'png')],
+                            cache_dir=self.cache_dir)
+        self.assertEqual(failed, [])
+        with open(self.out_path) as f:
+            self.assertEqual(f.read(), graph)
+
+    def test_reuse(self):
+        self._render('digraph { a -> b }')
+        self._render('digraph { a -> b }')
+        self.assertEqual(self._runs(), 1)
+
+    def test_one_entry_per_output(self):
+        self._render('digraph { a -> b }')
+        self._render('digraph { a -> c }')
+        self.assertEqual(self._runs(), 2)
+        self.assertEqual(sorted(os.listdir(self.cache_dir)), ['kio.png', 'kio.png.key'])
+        self._render('digraph { a -> b }')
+        self.assertEqual(self._runs(), 3)
+
+    def test_prune(self):
+        self._render('digraph { a -> b }')
+        for name in ('0123abcd.png', 'solid.png.key', 'kio.png.new'):
+            with open(os.path.join(self.cache_dir, name), 'w') as f:
+                f.write(name)
+        prune_cache(self.cache_dir)
+        self.assertEqual(sorted(os.listdir(self.cache_dir)), ['kio.png', 'kio.png.key'])
+
+
+if __name__ == '__main__':
+    unittest.main()
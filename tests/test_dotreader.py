@@ -0,0 +1,141 @@
+# -*- coding: utf-8 -*-
+#
+# SPDX-License-Identifier: BSD-2-Clause
+
+import os
+import tempfile
+import unittest
+
+from kapidox.depdiagram import dotreader, frameworkdb
+
+# As generated by older CMake versions
+OLD_STYLE = """\
+digraph "KF5DNSSD" {
+node [
+  fontsize = "12"
+];
+    "node0" [ label="KF5DNSSD" shape="polygon"];
+    "node1" [ label="Qt5::Network" shape="ellipse"];
+    "node0" -> "node1" // KF5DNSSD -> Qt5::Network
+    "node2" [ label="Qt5::Core" shape="ellipse"];
+    "node1" -> "node2"
+}
+"""
+
+# As generated by CMake >= 3.17
+NEW_STYLE = """\
+digraph "KF5Parts" {
+node [
+  fontsize = "12"
+];
+subgraph clusterLegend {
+  label = "Legend";
+  color = black;
+  edge [ style = invis ];
+  legendNode0 [ label = "Executable", shape = egg ];
+  legendNode1 [ label = "Static Library", shape = octagon ];
+  legendNode0 -> legendNode1 [ style = solid ];
+}
+    "node0" [ label = "KParts", shape = polygon ];
+    "node1" [ label = "KF5::KIOWidgets", shape = ellipse ];
+    "node0" -> "node1" [ style = dotted ] // KParts -> KF5::KIOWidgets
+}
+"""
+
+TRAILER = """\
+# Generated on 2023-01-01
+# Source digest: 0123456789abcdef
+"""
+
+
+class ParseTest(unittest.TestCase):
+    def test_old_style(self):
+        graph = dotreader.parse(OLD_STYLE)
+        self.assertEqual(graph.name, 'KF5DNSSD')
+        self.assertEqual(list(graph.nodes), ['node0', 'node1', 'node2'])
+        self.assertEqual(graph.nodes['node0'],
+                         {'fontsize': '12', 'label': 'KF5DNSSD', 'shape': 'polygon'})
+        self.assertEqual([(t, h) for t, h, _ in graph.edges],
+                         [('node0', 'node1'), ('node1', 'node2')])
+
+    def test_new_style(self):
+        graph = dotreader.parse(NEW_STYLE)
+        self.assertEqual(graph.nodes['legendNode0'],
+                         {'fontsize': '12', 'label': 'Executable', 'shape': 'egg'})
+        self.assertEqual(graph.nodes['node1']['shape'], 'ellipse')
+        self.assertIn(('node0', 'node1', {'style': 'dotted'}), graph.edges)
+        self.assertIn(('legendNode0', 'legendNode1', {'style': 'solid'}), graph.edges)
+
+    def test_comments_and_trailer(self):
+        txt = "/* header */\n" + OLD_STYLE + TRAILER
+        graph = dotreader.parse(txt)
+        self.assertEqual(len(graph.nodes), 3)
+        self.assertEqual(len(graph.edges), 2)
+
+    def test_garbage_after_graph(self):
+        with self.assertRaises(dotreader.ParseError):
+            dotreader.parse(OLD_STYLE + 'node3;\n')
+
+    def test_not_a_graph(self):
+        with self.assertRaises(dotreader.ParseError):
+            dotreader.parse('"node0" -> "node1"\n')
+
+
+class PreprocessTest(unittest.TestCase):
+    def setUp(self):
+        self._tmp = tempfile.TemporaryDirectory()
+
+    def tearDown(self):
+        self._tmp.cleanup()
+
+    def _preprocess(self, txt):
+        path = os.path.join(self._tmp.name, 'graph.dot')
+        with open(path, 'w') as f:
+            f.write(txt)
+        return frameworkdb.preprocess(path)
+
+    def test_nodes_named_after_labels(self):
+        graph = self._preprocess(OLD_STYLE + TRAILER)
+        self.assertEqual(list(graph.nodes), ['KF5DNSSD', 'Qt5::Network', 'Qt5::Core'])
+        self.assertEqual([(t, h) for t, h, _ in graph.edges],
+                         [('KF5DNSSD', 'Qt5::Network'), ('Qt5::Network', 'Qt5::Core')])
+
+    def test_new_style(self):
+        graph = self._preprocess(NEW_STYLE + TRAILER)
+        self.assertEqual(graph.nodes['KParts']['shape'], 'polygon')
+        self.assertEqual(graph.nodes['KIOWidgets']['shape'], 'ellipse')
+        self.assertIn(('KParts', 'KIOWidgets'), [(t, h) for t, h, _ in graph.edges])
+
+    def _check_alias_removed(self, graph):
+        self.assertEqual(graph.nodes['KParts'],
+                         {'label': 'KParts', 'shape': 'polygon'})
+        self.assertEqual([(t, h) for t, h, _ in graph.edges],
+                         [('KTextEditor', 'KParts'), ('KTextEditor', 'KParts')])
+
+    def test_alias_after_target(self):
+        graph = self._preprocess("""\
+digraph "KTextEditor" {
+    "node0" [ label="KTextEditor" shape="polygon"];
+    "node1" [ label="KParts" shape="polygon"];
+    "node2" [ label="KF5::KParts" shape="ellipse"];
+    "node0" -> "node1"
+    "node0" -> "node2"
+}
+""")
+        self._check_alias_removed(graph)
+
+    def test_alias_before_target(self):
+        graph = self._preprocess("""\
+digraph "KTextEditor" {
+    "node0" [ label="KTextEditor" shape="polygon"];
+    "node1" [ label="KF5::KParts" shape="ellipse"];
+    "node2" [ label="KParts" shape="polygon"];
+    "node0" -> "node1"
+    "node0" -> "node2"
+}
+""")
+        self._check_alias_removed(graph)
+
+
+if __name__ == '__main__':
+    unittest.main()
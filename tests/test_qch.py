@@ -0,0 +1,99 @@
+# -*- coding: utf-8 -*-
+#
+# SPDX-License-Identifier: BSD-2-Clause
+
+import os
+import tempfile
+import types
+import unittest
+
+from kapidox import generator
+
+INDEX_QHP = """<?xml version='1.0' encoding='UTF-8'?>
+<QtHelpProject version="1.0">
+  <namespace>org.kde.{name}</namespace>
+  <virtualFolder>{name}</virtualFolder>
+  <filterSection>
+    <toc><section title="{name}" ref="index.html"/></toc>
+    <keywords><keyword name="{name}" id="{name}" ref="index.html"/></keywords>
+    <files/>
+  </filterSection>
+</QtHelpProject>
+"""
+
+
+def _write(path, content):
+    os.makedirs(os.path.dirname(path) or '.', exist_ok=True)
+    with open(path, 'w') as f:
+        f.write(content)
+
+
+def _product(name):
+    """Write the files of a product made of one library, and return it"""
+    _write(os.path.join(name, 'html', 'index.qhp'), INDEX_QHP.format(name=name))
+    _write(os.path.join(name, 'html', 'index.html'),
+           f'<p>{name}</p><p>Generated on Mon Oct 19 2026 17:41:38 by doxygen</p>')
+    _write(os.path.join(name, 'searchdata.json'), '{}')
+    lib = types.SimpleNamespace(name=name, outputdir=name, part_of_group=False)
+    return types.SimpleNamespace(name=name, fancyname=name.upper(), part_of_group=False,
+                                 libraries=[lib])
+
+
+class QchFingerprintTest(unittest.TestCase):
+    def setUp(self):
+        tmp_dir = tempfile.TemporaryDirectory()
+        self.addCleanup(tmp_dir.cleanup)
+        cwd = os.getcwd()
+        os.chdir(tmp_dir.name)
+        self.addCleanup(os.chdir, cwd)
+        self.product = _product('kcoreaddons')
+        self.other = _product('kio')
+        _write('searchdata.json', '{"all": []}')
+        _write('symbols.json', '{}')
+
+    def _fingerprint(self):
+        generator.write_qhp(self.product, 'product.qhp')
+        return generator.qch_fingerprint('product.qhp', 'qhelpgenerator')
+
+    def test_top_level_files_not_listed(self):
+        generator.write_qhp(self.product, 'product.qhp')
+        with open('product.qhp') as f:
+            qhp = f.read()
+        self.assertNotIn('<file>*.json</file>', qhp)
+        self.assertIn('<file>kcoreaddons/*.json</file>', qhp)
+
+    def test_other_products_ignored(self):
+        fingerprint = self._fingerprint()
+        _write('searchdata.json', '{"all": [1]}')
+        _write('symbols.json', '{"KJob": 1}')
+        _write(os.path.join('kio', 'html', 'index.html'), '<p>changed</p>')
+        self.assertEqual(self._fingerprint(), fingerprint)
+
+    def test_generation_date_ignored(self):
+        fingerprint = self._fingerprint()
+        _write(os.path.join('kcoreaddons', 'html', 'index.html'),
+               '<p>kcoreaddons</p><p>Generated on Tue Oct 20 2026 09:00:00 by doxygen</p>')
+        self.assertEqual(self._fingerprint(), fingerprint)
+
+    def test_product_change(self):
+        fingerprint = self._fingerprint()
+        _write(os.path.join('kcoreaddons', 'html', 'index.html'), '<p>KCoreAddons</p>')
+        self.assertNotEqual(self._fingerprint(), fingerprint)
+
+
+class PruneQchCacheTest(unittest.TestCase):
+    def test_prune(self):
+        with tempfile.TemporaryDirectory() as cachedir:
+            kept = ['kio.qch', 'kio.fingerprint']
+            removed = ['0123abcd.qch', 'kcoreaddons.qch', 'solid.fingerprint', 'kio.qch.new']
+            for name in kept + removed:
+                _write(os.path.join(cachedir, name), name)
+            generator.prune_qch_cache(cachedir)
+            self.assertEqual(sorted(os.listdir(cachedir)), sorted(kept))
+
+    def test_missing(self):
+        generator.prune_qch_cache(os.path.join(tempfile.gettempdir(), 'kapidox-does-not-exist'))
+
+
+if __name__ == '__main__':
+    unittest.main()
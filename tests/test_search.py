@@ -0,0 +1,135 @@
+# -*- coding: utf-8 -*-
+#
+# SPDX-License-Identifier: BSD-2-Clause
+
+import json
+import os
+import sqlite3
+import tempfile
+import threading
+import types
+import unittest
+import urllib.error
+import urllib.request
+from unittest import mock
+
+from kapidox import generator, search_serve
+
+
+def _has_fts5():
+    conn = sqlite3.connect(':memory:')
+    try:
+        conn.execute('CREATE VIRTUAL TABLE t USING fts5(a)')
+        return True
+    except sqlite3.OperationalError:
+        return False
+    finally:
+        conn.close()
+
+
+def _write_product(root, name, libraries):
+    outputdir = os.path.join(root, name)
+    os.makedirs(outputdir)
+    index = {
+        'name': name,
+        'fancyname': name.upper(),
+        'libraries': [{'name': lib, 'fancyname': lib.upper(), 'docfields': docfields}
+                      for lib, docfields in libraries.items()],
+    }
+    with open(os.path.join(outputdir, 'searchdata.json'), 'w') as f:
+        json.dump(index, f)
+    return types.SimpleNamespace(name=name, outputdir=outputdir, metainfo={'qdoc': False})
+
+
+DOCFIELDS = [
+    {'name': 'KJob', 'keyword': 'KJob', 'text': 'The base class of jobs', 'type': 'class',
+     'url': 'kcoreaddons/html/classKJob.html'},
+    {'name': 'KJob::kill', 'keyword': 'kill', 'text': 'Abort this job', 'type': 'function',
+     'url': 'kcoreaddons/html/classKJob.html#kill'},
+    {'name': 'KAboutData', 'keyword': 'KAboutData', 'text': 'Information about a program',
+     'type': 'class', 'url': 'kcoreaddons/html/classKAboutData.html'},
+]
+
+
+class SearchParamsTest(unittest.TestCase):
+    def test_defaults(self):
+        self.assertEqual(search_serve.parse_search_params('q=job'),
+                         ('job', 1, search_serve.DEFAULT_PER_PAGE, None))
+
+    def test_clamped(self):
+        self.assertEqual(search_serve.parse_search_params('q=job&page=-3&per_page=100000&product=kf'),
+                         ('job', 1, search_serve.MAX_PER_PAGE, 'kf'))
+        self.assertEqual(search_serve.parse_search_params('per_page=0')[2], 1)
+
+    def test_invalid(self):
+        for query_string in ('page=abc', 'per_page=1.5', 'page=' + '9' * 5000,
+                             f'page={search_serve.MAX_PAGE + 1}', 'page=' + '9' * 30):
+            with self.assertRaises(ValueError, msg=query_string):
+                search_serve.parse_search_params(query_string)
+
+
+@unittest.skipUnless(_has_fts5(), 'needs SQLite with FTS5')
+class SearchDatabaseTest(unittest.TestCase):
+    def setUp(self):
+        tmp_dir = tempfile.TemporaryDirectory()
+        self.addCleanup(tmp_dir.cleanup)
+        self.root = tmp_dir.name
+        self.path = os.path.join(self.root, generator.SEARCH_DATABASE)
+        self.products = [_write_product(self.root, 'kcoreaddons', {'kcoreaddons': DOCFIELDS})]
+
+    def test_create(self):
+        self.assertTrue(generator.create_search_database(self.products, self.path))
+        self.assertEqual(sorted(os.listdir(self.root)), ['kcoreaddons', generator.SEARCH_DATABASE])
+        db = search_serve.SearchDatabase(self.path)
+        result = db.search('kjob')
+        self.assertEqual(result['total'], 2)
+        self.assertEqual(result['results'][0]['name'], 'KJob')
+        self.assertEqual(result['results'][0]['url'], 'kcoreaddons/kcoreaddons/html/classKJob.html')
+        self.assertEqual(db.search('kjob', page=2, per_page=1)['results'][0]['name'], 'KJob::kill')
+        self.assertEqual(db.search('kjob', product='OTHER')['total'], 0)
+        self.assertEqual(db.search('+-*')['total'], 0)
+
+    def test_no_fts5(self):
+        with mock.patch.object(generator, 'SEARCH_DATABASE_SCHEMA',
+                               'CREATE VIRTUAL TABLE docs USING nosuchmodule(name)'):
+            with self.assertLogs(level='WARNING'):
+                self.assertFalse(generator.create_search_database(self.products, self.path))
+        self.assertEqual(os.listdir(self.root), ['kcoreaddons'])
+
+    def test_failure_removes_database(self):
+        with open(os.path.join(self.products[0].outputdir, 'searchdata.json'), 'w') as f:
+            f.write('{')
+        with self.assertRaises(ValueError):
+            generator.create_search_database(self.products, self.path)
+        self.assertEqual(os.listdir(self.root), ['kcoreaddons'])
+
+    def test_server(self):
+        generator.create_search_database(self.products, self.path)
+        server = search_serve.create_server(self.path, '127.0.0.1', 0)
+        self.addCleanup(server.server_close)
+        thread = threading.Thread(target=server.serve_forever)
+        thread.start()
+        self.addCleanup(thread.join)
+        self.addCleanup(server.shutdown)
+        base_url = f'http://127.0.0.1:{server.server_address[1]}'
+
+        with urllib.request.urlopen(base_url + '/search?q=kaboutdata') as response:
+            result = json.load(response)
+        self.assertEqual(result['total'], 1)
+        self.assertEqual(result['page'], 1)
+
+        for query_string in ('q=job&page=abc', 'q=job&page=' + '9' * 30):
+            with self.assertRaises(urllib.error.HTTPError) as cm:
+                urllib.request.urlopen(base_url + '/search?' + query_string)
+            cm.exception.close()
+            self.assertEqual(cm.exception.code, 400)
+
+    def test_huge_page(self):
+        generator.create_search_database(self.products, self.path)
+        db = search_serve.SearchDatabase(self.path)
+        with self.assertRaises(OverflowError):
+            db.search('kjob', page=2 ** 63)
+
+
+if __name__ == '__main__':
+    unittest.main()
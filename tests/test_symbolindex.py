@@ -0,0 +1,83 @@
+# -*- coding: utf-8 -*-
+#
+# SPDX-License-Identifier: BSD-2-Clause
+
+import os
+import tempfile
+import unittest
+
+from kapidox import symbolindex
+
+TAGFILE = """\
+<?xml version='1.0' encoding='UTF-8' standalone='yes' ?>
+<tagfile>
+  <compound kind="class">
+    <name>{name}</name>
+    <filename>class{name}.html</filename>
+    <member kind="function">
+      <name>kill</name>
+      <anchorfile>class{name}.html</anchorfile>
+      <anchor>a1</anchor>
+    </member>
+  </compound>
+</tagfile>
+"""
+
+
+class _Library(object):
+    def __init__(self, root, name):
+        self.fancyname = name
+        self.outputdir = os.path.join(root, name)
+
+
+class CreateSymbolIndexTest(unittest.TestCase):
+    def setUp(self):
+        self._tmp = tempfile.TemporaryDirectory()
+        self.root = self._tmp.name
+        self.index_path = os.path.join(self.root, symbolindex.SYMBOL_INDEX)
+
+    def tearDown(self):
+        self._tmp.cleanup()
+
+    def _library(self, name, content):
+        lib = _Library(self.root, name)
+        os.makedirs(os.path.join(lib.outputdir, 'html'))
+        with open(os.path.join(lib.outputdir, 'html', name + '.tags'), 'w') as f:
+            f.write(content)
+        return lib
+
+    def test_index(self):
+        libraries = [self._library('KCore', TAGFILE.format(name='KJob'))]
+        index = symbolindex.create_symbol_index(libraries, [], self.index_path)
+        self.assertEqual(index.lookup('KJob::kill'),
+                         symbolindex.Symbol('KJob::kill', 'function', 'KCore',
+                                            os.path.join(libraries[0].outputdir,
+                                                         'html', 'classKJob.html#a1')))
+        loaded = symbolindex.SymbolIndex.load(self.index_path)
+        self.assertEqual(loaded.lookup('KJob::kill'), index.lookup('KJob::kill'))
+
+    def test_truncated_tagfile_is_skipped(self):
+        truncated = TAGFILE.format(name='KBroken')
+        truncated = truncated[:truncated.index('</compound>')]
+        libraries = [
+            self._library('KBroken', truncated),
+            self._library('KCore', TAGFILE.format(name='KJob')),
+            ]
+        with self.assertLogs(level='WARNING') as logs:
+            index = symbolindex.create_symbol_index(libraries, [], self.index_path)
+        self.assertIn('KBroken.tags', logs.output[0])
+        self.assertNotIn('KBroken', index)
+        self.assertNotIn('KBroken::kill', index)
+        self.assertEqual(index.lookup('KJob::kill').library, 'KCore')
+        self.assertTrue(os.path.exists(self.index_path))
+
+    def test_missing_external_tagfile_is_skipped(self):
+        tagfiles = [(os.path.join(self.root, 'qtcore.tags'), 'https://doc.qt.io/qt-5/')]
+        with self.assertLogs(level='WARNING'):
+            index = symbolindex.create_symbol_index([], tagfiles, self.index_path)
+        self.assertEqual(len(index), 0)
+        self.assertTrue(os.path.exists(self.index_path))
+
+
+if __name__ == '__main__':
+    unittest.main()
@@ -0,0 +1,119 @@
+# -*- coding: utf-8 -*-
+#
+# SPDX-License-Identifier: BSD-2-Clause
+
+import os
+import tempfile
+import types
+import unittest
+import xml.etree.ElementTree as ET
+
+from kapidox import generator
+
+TAGFILE = """<?xml version='1.0' encoding='UTF-8' standalone='yes' ?>
+<tagfile>
+  <compound kind="class">
+    <name>QString</name>
+    <filename>qstring.html</filename>
+    <member kind="function">
+      <name>size</name>
+      <anchorfile>qstring.html</anchorfile>
+      <anchor>size</anchor>
+      <arglist>() const</arglist>
+    </member>
+  </compound>
+  <compound kind="page">
+    <name>qtcore-index</name>
+    <filename>qtcore-index.html</filename>
+    <docanchor file="qtcore-index.html">getting-started</docanchor>
+  </compound>
+  <compound kind="dir">
+    <name>src/corelib</name>
+    <filename>dir_corelib.html</filename>
+  </compound>
+  <compound kind="example">
+    <name>tools/hello</name>
+    <filename>hello-example.html</filename>
+  </compound>
+</tagfile>
+"""
+
+
+class SlimTagfileTest(unittest.TestCase):
+    def setUp(self):
+        tmp_dir = tempfile.TemporaryDirectory()
+        self.addCleanup(tmp_dir.cleanup)
+        self.cachedir = os.path.join(tmp_dir.name, 'cache')
+        self.tagfile = os.path.join(tmp_dir.name, 'qtcore.tags')
+        self._write_tagfile(TAGFILE)
+
+    def _write_tagfile(self, content):
+        with open(self.tagfile, 'w') as f:
+            f.write(content)
+
+    def test_content(self):
+        root = ET.parse(generator.slim_tagfile(self.tagfile, self.cachedir)).getroot()
+        kinds = [x.get('kind') for x in root.findall('compound')]
+        self.assertEqual(kinds, ['class', 'page'])
+        self.assertEqual(root.find("compound/member/anchor").text, 'size')
+        self.assertEqual(root.find("compound/docanchor").text, 'getting-started')
+        self.assertIsNone(root.text)
+
+    def test_reused(self):
+        slim_path = generator.slim_tagfile(self.tagfile, self.cachedir)
+        os.utime(slim_path, (0, 0))
+        self.assertEqual(generator.slim_tagfile(self.tagfile, self.cachedir), slim_path)
+        self.assertEqual(os.stat(slim_path).st_mtime, 0)
+
+    def test_updated(self):
+        slim_path = generator.slim_tagfile(self.tagfile, self.cachedir)
+        self._write_tagfile(TAGFILE.replace('QString', 'QByteArray'))
+        self.assertEqual(generator.slim_tagfile(self.tagfile, self.cachedir), slim_path)
+        root = ET.parse(slim_path).getroot()
+        self.assertEqual(root.find('compound/name').text, 'QByteArray')
+        self.assertEqual(len(os.listdir(self.cachedir)), 1)
+
+    def test_prune(self):
+        slim_path = generator.slim_tagfile(self.tagfile, self.cachedir)
+        legacy = os.path.join(self.cachedir, '0123abcd-1')
+        os.makedirs(legacy)
+        generator.prune_slim_tagfiles(self.cachedir)
+        self.assertTrue(os.path.exists(slim_path))
+        self.assertFalse(os.path.exists(legacy))
+
+        os.unlink(self.tagfile)
+        generator.prune_slim_tagfiles(self.cachedir)
+        self.assertEqual(os.listdir(self.cachedir), [])
+
+
+class SnapshotTagfilesTest(unittest.TestCase):
+    def test_snapshot(self):
+        with tempfile.TemporaryDirectory() as tmp_dir:
+            cwd = os.getcwd()
+            os.chdir(tmp_dir)
+            self.addCleanup(os.chdir, cwd)
+            libs = [types.SimpleNamespace(outputdir=outputdir, fancyname=fancyname,
+                                          part_of_group=False)
+                    for outputdir, fancyname in (('kcoreaddons', 'KCoreAddons'),
+                                                 ('group/kio', 'KIO'),
+                                                 ('qdoclib', 'QDocLib'))]
+            for lib in libs[:2]:
+                os.makedirs(os.path.join(lib.outputdir, 'html'))
+                with open(os.path.join(lib.outputdir, 'html', lib.fancyname + '.tags'), 'w') as f:
+                    f.write(lib.fancyname)
+
+            snapshots = generator.snapshot_fw_tagfiles(libs, os.path.join(tmp_dir, 'copies'))
+
+            self.assertEqual(len(snapshots), 2)
+            for lib in libs[:2]:
+                tagfile = generator.create_fw_tagfile_tuple(lib)[0]
+                copy = snapshots[tagfile]
+                self.assertNotEqual(copy, tagfile)
+                # The copies survive the removal of the library output
+                os.remove(tagfile)
+                with open(copy) as f:
+                    self.assertEqual(f.read(), lib.fancyname)
+
+
+if __name__ == '__main__':
+    unittest.main()
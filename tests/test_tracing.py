@@ -0,0 +1,121 @@
+# -*- coding: utf-8 -*-
+#
+# SPDX-License-Identifier: BSD-2-Clause
+
+import os
+import pstats
+import signal
+import sys
+import tempfile
+import threading
+import unittest
+
+from kapidox import tracing
+
+
+def _python(code):
+    return [sys.executable, '-c', code]
+
+
+class CallTest(unittest.TestCase):
+    def test_exit_code(self):
+        self.assertEqual(tracing.call(_python('pass')), 0)
+        self.assertEqual(tracing.call(_python('raise SystemExit(3)')), 3)
+
+    @unittest.skipUnless(hasattr(os, 'wait4'), 'needs os.wait4()')
+    def test_exit_code_measured(self):
+        with tracing.measure() as measure:
+            self.assertEqual(tracing.call(_python('raise SystemExit(3)')), 3)
+            self.assertEqual(tracing.call(_python('pass')), 0)
+        self.assertGreater(measure.child_maxrss, 0)
+        self.assertGreater(measure.child_utime + measure.child_stime, 0.)
+
+    @unittest.skipUnless(hasattr(os, 'wait4'), 'needs os.wait4()')
+    def test_killed_measured(self):
+        with tracing.measure():
+            ret = tracing.call(_python('import os, signal; os.kill(os.getpid(), signal.SIGTERM)'))
+        self.assertEqual(ret, -signal.SIGTERM)
+
+
+@unittest.skipUnless(hasattr(os, 'WIFEXITED'), 'needs POSIX wait statuses')
+class ExitStatusTest(unittest.TestCase):
+    def test_exited(self):
+        self.assertEqual(tracing._exit_status(0), 0)
+        self.assertEqual(tracing._exit_status(1 << 8), 1)
+        self.assertEqual(tracing._exit_status(255 << 8), 255)
+
+    def test_signaled(self):
+        self.assertEqual(tracing._exit_status(signal.SIGKILL), -signal.SIGKILL)
+        self.assertEqual(tracing._exit_status(signal.SIGSEGV | 0x80), -signal.SIGSEGV)
+
+    def test_same_as_python(self):
+        if not hasattr(os, 'waitstatus_to_exitcode'):
+            self.skipTest('needs Python 3.9')
+        for status in (0, 2 << 8, signal.SIGINT, signal.SIGABRT | 0x80):
+            self.assertEqual(tracing._exit_status(status), os.waitstatus_to_exitcode(status))
+
+
+def _busy(n=20000):
+    return sum(x * x for x in range(n))
+
+
+def _functions(profile):
+    return {x[2] for x in pstats.Stats(profile).stats}
+
+
+class ProfilingTest(unittest.TestCase):
+    def setUp(self):
+        self.profiling = tracing.Profiling()
+
+    def _run(self, name, fct):
+        profile = self.profiling.start(name) if self.profiling.wants(name) else None
+        try:
+            fct()
+        finally:
+            if profile is not None:
+                self.profiling.stop(profile)
+        return profile
+
+    def test_nested(self):
+        self.profiling.names.update(['outer', 'inner'])
+        inner = []
+        outer = self._run('outer', lambda: inner.append(self._run('inner', _busy)))
+        self.assertIsNotNone(outer)
+        self.assertIsNotNone(inner[0])
+        self.assertIn('_busy', _functions(inner[0]))
+        self.assertNotIn('_busy', _functions(outer))
+
+    def test_all(self):
+        self.profiling.names.add('all')
+        inner = []
+        outer = self._run('outer', lambda: inner.append(self._run('inner', _busy)))
+        self.assertIsNone(inner[0])
+        self.assertIn('_busy', _functions(outer))
+
+    def test_other_thread(self):
+        self.profiling.names.update(['outer', 'worker'])
+        result = []
+
+        def run_worker():
+            thread = threading.Thread(target=lambda: result.append(self._run('worker', _busy)))
+            thread.start()
+            thread.join()
+
+        with self.assertLogs(level='WARNING') as logs:
+            self._run('outer', run_worker)
+        self.assertIsNone(result[0])
+        self.assertIn('Not profiling worker', logs.output[0])
+
+    def test_write(self):
+        self.profiling.names.update(['span', 'never'])
+        self._run('span', _busy)
+        with tempfile.TemporaryDirectory() as out_dir:
+            with self.assertLogs(level='WARNING') as logs:
+                report = self.profiling.write(out_dir, 10)
+            self.assertTrue(os.path.exists(os.path.join(out_dir, 'span.pstats')))
+            self.assertTrue(os.path.exists(report))
+        self.assertIn('never', logs.output[0])
+
+
+if __name__ == '__main__':
+    unittest.main()